@@ -0,0 +1,472 @@
+import asyncio
+import psycopg
+from psycopg.pq import TransactionStatus
+from psycopg.rows import dict_row, tuple_row
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from config import settings
+from database import PoolTimeoutError, PoolClosedError, _PooledConnection, slow_query_log, explain_statement
+from metrics import observe_query, observe_pool_acquire, register_pool
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+_plan_tasks = set()
+
+
+class InstrumentedCursor(psycopg.AsyncCursor):
+    """Курсор, передающий в metrics и журнал медленных запросов время и число строк."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            duration = time.perf_counter() - started
+            observe_query(duration, self.rowcount)
+            entry = slow_query_log.observe(query, params, duration, self.rowcount)
+            if entry is not None:
+                task = asyncio.get_running_loop().create_task(_capture_plan(entry, query, params))
+                _plan_tasks.add(task)
+                task.add_done_callback(_plan_tasks.discard)
+
+
+async def _capture_plan(entry, query, params):
+    """Асинхронный аналог database._capture_plan: план снимается фоновой задачей
+    на отдельном соединении пула, в read-only транзакции."""
+    try:
+        pool = await get_pool()
+        conn = await pool.getconn()
+        broken = False
+        try:
+            # Обычный курсор: сам EXPLAIN в метрики и журнал не попадает
+            async with psycopg.AsyncCursor(conn, row_factory=tuple_row) as cursor:
+                await cursor.execute("SET TRANSACTION READ ONLY")
+                await cursor.execute(f"SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}")
+                await cursor.execute(explain_statement(query), params)
+                plan = "\n".join(row[0] for row in await cursor.fetchall())
+        except psycopg.Error as e:
+            broken = isinstance(e, (psycopg.OperationalError, psycopg.InterfaceError))
+            logger.warning(f"EXPLAIN for slow query {entry['fingerprint']} failed: {e}")
+            return
+        finally:
+            await pool.putconn(conn, discard=broken)
+        slow_query_log.add_plan(entry, plan)
+    except Exception as e:
+        logger.warning(f"EXPLAIN for slow query {entry['fingerprint']} failed: {e}")
+    finally:
+        slow_query_log.finish_explain()
+
+
+class AsyncConnectionPool:
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, timeout: float = 30.0,
+                 max_age: float = 0, max_uses: int = 0, health_check_interval: float = 30.0):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+
+        self._cond = asyncio.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+    async def open(self):
+        # Слот резервируется на каждое соединение отдельно, как в синхронном пуле
+        while self._size < self.min_size:
+            self._size += 1
+            try:
+                item = await self._connect()
+            except Exception:
+                await self._release_slot()
+                raise
+            async with self._cond:
+                self._idle.append(item)
+                self._cond.notify()
+
+    async def getconn(self):
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            item = None
+            async with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosedError("Connection pool is closed")
+                    if self._idle:
+                        item = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.timeout}s waiting for a database connection "
+                            f"(pool size {self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    finally:
+                        self._waiting -= 1
+
+            if item is None:
+                try:
+                    item = await self._connect()
+                except Exception:
+                    await self._release_slot()
+                    raise
+            elif not await self._is_usable(item):
+                await self._discard(item)
+                continue
+
+            item.uses += 1
+            self._in_use[id(item.conn)] = item
+            observe_pool_acquire("async", time.perf_counter() - started)
+            return item.conn
+
+    async def putconn(self, conn, discard: bool = False):
+        item = self._in_use.pop(id(conn), None)
+        if item is None:
+            logger.warning("Returned connection does not belong to the pool, closing it")
+            await self._close_quietly(conn)
+            return
+
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == TransactionStatus.UNKNOWN or status == TransactionStatus.ACTIVE:
+                discard = True
+            elif status != TransactionStatus.IDLE:
+                try:
+                    await conn.rollback()
+                except psycopg.Error:
+                    discard = True
+
+        if discard or conn.closed or self._closed or self._is_expired(item):
+            await self._discard(item)
+            return
+
+        item.last_used = time.monotonic()
+        async with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self.getconn()
+        try:
+            yield conn
+        finally:
+            await self.putconn(conn)
+
+    async def close(self):
+        async with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for item in idle:
+            await self._discard(item)
+
+    def stats(self) -> dict:
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": len(self._in_use),
+            "waiting": self._waiting,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+        }
+
+    async def _connect(self) -> _PooledConnection:
+        # Подготовленные выражения psycopg хранит в LRU на каждом соединении (не больше
+        # DB_PREPARED_MAX, вытесненные освобождаются DEALLOCATE) и живут они столько же,
+        # сколько соединение: max_age/max_uses пула ограничивают и их
+        conn = await psycopg.AsyncConnection.connect(
+            self.dsn, autocommit=False, row_factory=dict_row, cursor_factory=InstrumentedCursor,
+            prepare_threshold=settings.DB_PREPARE_THRESHOLD if settings.DB_PREPARED_STATEMENTS else None,
+        )
+        conn.prepared_max = settings.DB_PREPARED_MAX
+        return _PooledConnection(conn)
+
+    def _is_expired(self, item: _PooledConnection) -> bool:
+        if self.max_age and time.monotonic() - item.created_at >= self.max_age:
+            return True
+        return bool(self.max_uses) and item.uses >= self.max_uses
+
+    async def _is_usable(self, item: _PooledConnection) -> bool:
+        if item.conn.closed or self._is_expired(item):
+            return False
+        if time.monotonic() - item.last_used < self.health_check_interval:
+            return True
+
+        try:
+            await item.conn.execute("SELECT 1")
+            await item.conn.rollback()
+            return True
+        except psycopg.Error as e:
+            logger.warning(f"Discarding broken pooled connection: {e}")
+            return False
+
+    async def _discard(self, item: _PooledConnection):
+        await self._close_quietly(item.conn)
+        await self._release_slot()
+
+    async def _release_slot(self):
+        async with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    async def _close_quietly(conn):
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[AsyncConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def init_pool() -> AsyncConnectionPool:
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = AsyncConnectionPool(
+                settings.DATABASE_URL,
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_POOL_MAX_SIZE,
+                timeout=settings.DB_POOL_TIMEOUT,
+                max_age=settings.DB_POOL_MAX_AGE,
+                max_uses=settings.DB_POOL_MAX_USES,
+                health_check_interval=settings.DB_POOL_HEALTH_CHECK_INTERVAL,
+            )
+            await pool.open()
+            _pool = pool
+        return _pool
+
+
+async def get_pool() -> AsyncConnectionPool:
+    return _pool or await init_pool()
+
+
+register_pool("async", lambda: _pool.stats() if _pool is not None else None)
+
+
+async def close_pool():
+    global _pool
+    async with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        await pool.close()
+
+
+class AsyncDBSession:
+    """Асинхронный аналог database.DBSession: одно соединение и одна транзакция на запрос."""
+
+    def __init__(self, pool: Optional[AsyncConnectionPool] = None):
+        self._pool = pool
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._broken = False
+        self._after_commit = []
+        self.rollback_only = False
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None
+
+    async def connection(self):
+        if self._conn is None:
+            async with self._lock:
+                if self._conn is None:
+                    self._pool = self._pool or await get_pool()
+                    self._conn = await self._pool.getconn()
+        return self._conn
+
+    def mark_failed(self, error: Exception):
+        self.rollback_only = True
+        if is_connection_error(error):
+            self._broken = True
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]):
+        self._after_commit.append(callback)
+
+    async def commit(self):
+        if self.rollback_only:
+            await self.rollback()
+            return
+        if self._conn is not None:
+            await self._conn.commit()
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            # Транзакция уже зафиксирована, поэтому ошибка колбэка только логируется
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"After-commit callback failed: {e}")
+
+    async def rollback(self):
+        if self._conn is not None and not self._conn.closed:
+            try:
+                await self._conn.rollback()
+            except psycopg.Error:
+                self._broken = True
+        self._after_commit = []
+        self.rollback_only = False
+
+    async def release(self):
+        """Фиксирует транзакцию и возвращает соединение в пул до следующего обращения к БД.
+
+        Нужен перед долгой работой без БД внутри запроса (например, проверкой пароля).
+        """
+        if self._conn is None:
+            return
+        await self.commit()
+        await self.close()
+
+    async def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        await self._pool.putconn(conn, discard=self._broken)
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Ошибка, после которой соединение не возвращается в пул.
+
+    Кроме обрыва связи это устаревшие подготовленные выражения: после изменения
+    схемы план с прежним типом результата не выполняется, а после DISCARD ALL
+    выражения на сервере уже нет. Кэш выражений принадлежит соединению, поэтому
+    вместе с ним заменяется и соединение.
+    """
+    if isinstance(error, (psycopg.OperationalError, psycopg.InterfaceError,
+                          psycopg.errors.InvalidSqlStatementName)):
+        return True
+    return isinstance(error, psycopg.errors.FeatureNotSupported) and "cached plan" in str(error)
+
+
+_current_session: ContextVar[Optional[AsyncDBSession]] = ContextVar("async_db_session", default=None)
+
+
+def get_current_session() -> Optional[AsyncDBSession]:
+    return _current_session.get()
+
+
+def set_current_session(session: Optional[AsyncDBSession]):
+    return _current_session.set(session)
+
+
+def reset_current_session(token):
+    _current_session.reset(token)
+
+
+async def run_after_commit(callback: Callable[[], Awaitable[None]]):
+    """Выполняет callback после фиксации транзакции текущей сессии, а без сессии - сразу.
+
+    Нужен для инвалидации кэшей: при откате сессии callback не вызывается.
+    """
+    session = _current_session.get()
+    if session is not None and session.active:
+        session.after_commit(callback)
+    else:
+        await callback()
+
+
+async def release_connection():
+    session = _current_session.get()
+    if session is not None:
+        await session.release()
+
+
+@asynccontextmanager
+async def db_session():
+    current = _current_session.get()
+    if current is not None:
+        yield current
+        return
+
+    session = AsyncDBSession()
+    token = _current_session.set(session)
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        _current_session.reset(token)
+        await session.close()
+
+
+@asynccontextmanager
+async def get_db_connection():
+    session = _current_session.get()
+    if session is not None:
+        conn = await session.connection()
+        try:
+            yield conn
+        except Exception as e:
+            session.mark_failed(e)
+            logger.error(f"Database error: {e}")
+            raise
+        return
+
+    pool = await get_pool()
+    conn = await pool.getconn()
+    broken = False
+    try:
+        yield conn
+        await conn.commit()
+    except Exception as e:
+        broken = is_connection_error(e)
+        if not conn.closed:
+            try:
+                await conn.rollback()
+            except psycopg.Error:
+                broken = True
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        await pool.putconn(conn, discard=broken)
+
+
+@asynccontextmanager
+async def get_db_cursor(commit=True):
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cursor:
+            yield cursor
+            if commit and _current_session.get() is None:
+                await conn.commit()
+
+
+async def execute_query(query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = True,
+                        prepare: bool = False):
+    """prepare=True готовит запрос на сервере с первого выполнения; иначе psycopg
+    готовит его сам после DB_PREPARE_THRESHOLD выполнений на соединении."""
+    async with get_db_cursor() as cursor:
+        await cursor.execute(query, params, prepare=True if prepare and settings.DB_PREPARED_STATEMENTS else None)
+        if fetch_one:
+            return await cursor.fetchone()
+        elif fetch_all:
+            return await cursor.fetchall()
+        return cursor.rowcount
\ No newline at end of file
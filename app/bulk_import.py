@@ -0,0 +1,357 @@
+"""Потоковый импорт каталога книг через COPY.
+
+Вход - CSV с заголовком или JSON Lines. Поля книги совпадают с BookBase
+(кроме publisher_id/series_id), плюс:
+  publisher - название издательства;
+  authors   - авторы "Имя Фамилия" (последнее слово - фамилия), в CSV через ";",
+              в JSONL - списком строк или объектов {"first_name", "last_name"};
+  genres    - названия жанров, первый считается основным; в CSV через ";".
+
+Издательства, авторы и жанры ищутся по естественному ключу и создаются, если их нет.
+Строки читаются и загружаются пачками по batch_size, каждая пачка - отдельная
+транзакция, поэтому память ограничена размером пачки, а не файла.
+
+    python bulk_import.py books.csv [--format csv|jsonl] [--batch-size 5000]
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+from datetime import date
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from pydantic import ValidationError
+from database import get_pool
+from schemas import BookBase
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+# Ключ advisory-блокировки: пачки параллельных импортов разрешают издательства и авторов
+# по очереди. В отличие от LOCK TABLE, запись через API при этом не блокируется
+IMPORT_LOCK = 0x494D50
+
+BOOK_FIELDS = (
+    "title", "isbn", "publication_year", "pages_count", "language", "description",
+    "storage_location", "acquisition_date", "price", "condition", "format", "status",
+    "series_number",
+)
+
+# Длины VARCHAR-колонок: строка с более длинным значением уронила бы всю пачку
+MAX_LENGTHS = {
+    "title": 255, "isbn": 17, "language": 50, "storage_location": 100,
+    "publisher": 200, "first_name": 100, "last_name": 100, "genre_name": 100,
+}
+
+STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS import_books (
+        row_num INTEGER PRIMARY KEY,
+        book_id INTEGER,
+        error TEXT,
+        title VARCHAR(255),
+        isbn VARCHAR(17),
+        publication_year INTEGER,
+        pages_count INTEGER,
+        language VARCHAR(50),
+        description TEXT,
+        storage_location VARCHAR(100),
+        acquisition_date DATE,
+        price NUMERIC(10,2),
+        condition VARCHAR(50),
+        format VARCHAR(50),
+        status VARCHAR(50),
+        series_number INTEGER,
+        publisher_name VARCHAR(200)
+    ) ON COMMIT DELETE ROWS;
+
+    CREATE TEMP TABLE IF NOT EXISTS import_book_authors (
+        row_num INTEGER,
+        position INTEGER,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100)
+    ) ON COMMIT DELETE ROWS;
+
+    CREATE TEMP TABLE IF NOT EXISTS import_book_genres (
+        row_num INTEGER,
+        position INTEGER,
+        genre_name VARCHAR(100)
+    ) ON COMMIT DELETE ROWS;
+"""
+
+RESOLVE_SQL = """
+    UPDATE import_books s SET error = 'ISBN already exists'
+    WHERE s.isbn IS NOT NULL AND EXISTS (SELECT 1 FROM books b WHERE b.isbn = s.isbn);
+
+    UPDATE import_books s SET error = 'Duplicate ISBN in import'
+    WHERE s.error IS NULL AND s.isbn IS NOT NULL AND EXISTS (
+        SELECT 1 FROM import_books d WHERE d.isbn = s.isbn AND d.row_num < s.row_num
+    );
+
+    INSERT INTO publishers (publisher_name)
+    SELECT DISTINCT s.publisher_name
+    FROM import_books s
+    WHERE s.error IS NULL AND s.publisher_name IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM publishers p WHERE p.publisher_name = s.publisher_name);
+
+    INSERT INTO authors (first_name, last_name)
+    SELECT DISTINCT ia.first_name, ia.last_name
+    FROM import_book_authors ia
+    JOIN import_books s ON s.row_num = ia.row_num AND s.error IS NULL
+    WHERE NOT EXISTS (
+        SELECT 1 FROM authors a
+        WHERE a.last_name = ia.last_name AND a.first_name IS NOT DISTINCT FROM ia.first_name
+    );
+
+    INSERT INTO genres (genre_name)
+    SELECT DISTINCT ig.genre_name
+    FROM import_book_genres ig
+    JOIN import_books s ON s.row_num = ig.row_num AND s.error IS NULL
+    ON CONFLICT (genre_name) DO NOTHING;
+
+    UPDATE import_books
+    SET book_id = nextval(pg_get_serial_sequence('books', 'book_id'))
+    WHERE error IS NULL;
+
+    INSERT INTO books (
+        book_id, title, isbn, publication_year, pages_count, language, description,
+        storage_location, acquisition_date, price, condition, format, status,
+        series_number, publisher_id
+    )
+    SELECT
+        s.book_id, s.title, s.isbn, s.publication_year, s.pages_count, s.language, s.description,
+        s.storage_location, s.acquisition_date, s.price, s.condition, s.format, s.status,
+        s.series_number,
+        (SELECT MIN(p.publisher_id) FROM publishers p WHERE p.publisher_name = s.publisher_name)
+    FROM import_books s
+    WHERE s.error IS NULL;
+
+    INSERT INTO books_authors (book_id, author_id)
+    SELECT s.book_id, a.author_id
+    FROM import_book_authors ia
+    JOIN import_books s ON s.row_num = ia.row_num AND s.error IS NULL
+    CROSS JOIN LATERAL (
+        SELECT MIN(a.author_id) as author_id FROM authors a
+        WHERE a.last_name = ia.last_name AND a.first_name IS NOT DISTINCT FROM ia.first_name
+    ) a
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO books_genres (book_id, genre_id, is_primary)
+    SELECT s.book_id, g.genre_id, ig.position = 0
+    FROM import_book_genres ig
+    JOIN import_books s ON s.row_num = ig.row_num AND s.error IS NULL
+    JOIN genres g ON g.genre_name = ig.genre_name
+    ON CONFLICT DO NOTHING;
+"""
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+
+    def add_error(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def iter_csv(stream: TextIO) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_jsonl(stream: TextIO) -> Iterator[Tuple[int, dict]]:
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, RowError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line_num, RowError("Expected a JSON object")
+            continue
+        yield line_num, row
+
+
+def _split(value) -> List:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(";") if part.strip()]
+    if isinstance(value, list):
+        return value
+    raise RowError("authors/genres must be a list or a ';'-separated string")
+
+
+def _check_length(field: str, value: Optional[str]):
+    if value is not None and len(value) > MAX_LENGTHS[field]:
+        raise RowError(f"{field}: longer than {MAX_LENGTHS[field]} characters")
+
+
+def _parse_author(value) -> Tuple[Optional[str], str]:
+    if isinstance(value, dict):
+        first_name = (value.get("first_name") or "").strip() or None
+        last_name = (value.get("last_name") or "").strip()
+    else:
+        parts = str(value).split()
+        first_name = " ".join(parts[:-1]) or None
+        last_name = parts[-1] if parts else ""
+    if not last_name:
+        raise RowError(f"author {value!r}: last name is required")
+    _check_length("first_name", first_name)
+    _check_length("last_name", last_name)
+    return first_name, last_name
+
+
+def parse_row(raw: dict) -> Tuple[dict, Optional[str], List[Tuple[Optional[str], str]], List[str]]:
+    fields = {
+        key: (None if raw.get(key) == "" else raw.get(key))
+        for key in BOOK_FIELDS if key in raw
+    }
+    try:
+        book = BookBase(**fields).dict(include=set(BOOK_FIELDS))
+    except ValidationError as e:
+        raise RowError("; ".join(
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+        ))
+
+    for field in ("title", "isbn", "language", "storage_location"):
+        _check_length(field, book[field])
+    if book["publication_year"] and book["publication_year"] > date.today().year:
+        raise RowError("publication_year: cannot be in the future")
+
+    publisher = str(raw.get("publisher") or "").strip() or None
+    _check_length("publisher", publisher)
+
+    authors = list(dict.fromkeys(_parse_author(author) for author in _split(raw.get("authors"))))
+    genres = list(dict.fromkeys(str(genre).strip() for genre in _split(raw.get("genres"))))
+    for genre in genres:
+        _check_length("genre_name", genre)
+
+    return book, publisher, authors, genres
+
+
+class _Batch:
+    def __init__(self):
+        self.books = io.StringIO()
+        self.authors = io.StringIO()
+        self.genres = io.StringIO()
+        self._books = csv.writer(self.books)
+        self._authors = csv.writer(self.authors)
+        self._genres = csv.writer(self.genres)
+        self.lines: List[int] = []
+
+    def add(self, line: int, book: dict, publisher: Optional[str], authors, genres):
+        self._books.writerow([line] + [book[field] for field in BOOK_FIELDS] + [publisher])
+        for position, (first_name, last_name) in enumerate(authors):
+            self._authors.writerow([line, position, first_name, last_name])
+        for position, genre in enumerate(genres):
+            self._genres.writerow([line, position, genre])
+        self.lines.append(line)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+
+def _load_batch(conn, batch: _Batch, report: ImportReport):
+    columns = ", ".join(BOOK_FIELDS)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(STAGING_DDL)
+            # Параллельный импорт не должен создать дубли издательств и авторов,
+            # у которых нет уникального ключа
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (IMPORT_LOCK,))
+            for table, columns_sql, buffer in (
+                ("import_books", f"row_num, {columns}, publisher_name", batch.books),
+                ("import_book_authors", "row_num, position, first_name, last_name", batch.authors),
+                ("import_book_genres", "row_num, position, genre_name", batch.genres),
+            ):
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({columns_sql}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+            cursor.execute(RESOLVE_SQL)
+            cursor.execute("SELECT row_num, error FROM import_books WHERE error IS NOT NULL ORDER BY row_num")
+            rejected = cursor.fetchall()
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Import batch failed: {e}")
+        for line in batch.lines:
+            report.add_error(line, f"Batch failed: {e}")
+        return
+
+    for line, error in rejected:
+        report.add_error(line, error)
+    report.imported += len(batch) - len(rejected)
+
+
+def import_books(stream: TextIO, fmt: str = "csv", batch_size: int = BATCH_SIZE) -> dict:
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Unsupported import format: {fmt}")
+    rows = iter_csv(stream) if fmt == "csv" else iter_jsonl(stream)
+    report = ImportReport()
+
+    with get_pool().connection() as conn:
+        batch = _Batch()
+        for line, raw in rows:
+            report.processed += 1
+            try:
+                if isinstance(raw, RowError):
+                    raise raw
+                batch.add(line, *parse_row(raw))
+            except RowError as e:
+                report.add_error(line, str(e))
+                continue
+
+            if len(batch) >= batch_size:
+                _load_batch(conn, batch, report)
+                batch = _Batch()
+
+        if len(batch):
+            _load_batch(conn, batch, report)
+
+    return report.as_dict()
+
+
+def detect_format(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import books from CSV or JSON Lines")
+    parser.add_argument("path", help="input file, '-' for stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if args.path == "-":
+        result = import_books(sys.stdin, fmt, args.batch_size)
+    else:
+        with open(args.path, encoding="utf-8-sig", newline="") as f:
+            result = import_books(f, fmt, args.batch_size)
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    print()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis нужен только для общего кэша между воркерами
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Ограниченный по числу записей LRU-кэш в памяти процесса.
+
+    С ttl записи старше ttl секунд считаются отсутствующими.
+    Операции не делают await, поэтому безопасны для кода в одном event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        expires_at, value = self._data[key]
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def values(self) -> list:
+        """Все значения без учета TTL и без изменения порядка вытеснения."""
+        return [value for _, value in self._data.values()]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedCache:
+    """Асинхронный кэш с TTL: общий Redis, если задан redis_url, иначе LRUCache процесса.
+
+    В Redis значения хранятся в JSON, поэтому кэшировать можно только JSON-совместимые
+    данные. Ошибки Redis не прерывают запрос: чтение считается промахом.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, ttl: float, redis_url: Optional[str] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._local = LRUCache(max_entries, ttl)
+        self._redis = None
+        if redis_url:
+            if redis is None:
+                logger.warning(f"redis is not installed, {namespace} cache stays in-process")
+            else:
+                self._redis = redis.from_url(redis_url)
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        if self._redis is None:
+            return self._local.get(key, default)
+        try:
+            raw = await self._redis.get(self._key(key))
+        except redis.RedisError as e:
+            logger.warning(f"Cache read failed: {e}")
+            return default
+        return default if raw is None else json.loads(raw)
+
+    async def set(self, key: Hashable, value: Any):
+        if self._redis is None:
+            self._local.set(key, value)
+            return
+        try:
+            await self._redis.set(self._key(key), json.dumps(value, default=str), ex=math.ceil(self.ttl))
+        except redis.RedisError as e:
+            logger.warning(f"Cache write failed: {e}")
+
+    async def pop(self, key: Hashable):
+        if self._redis is None:
+            self._local.pop(key)
+            return
+        try:
+            await self._redis.delete(self._key(key))
+        except redis.RedisError as e:
+            # Запись останется до истечения TTL
+            logger.warning(f"Cache invalidation failed: {e}")
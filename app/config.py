@@ -9,4 +9,76 @@ class Settings:
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Соединения старше DB_POOL_MAX_AGE секунд или отработавшие DB_POOL_MAX_USES выдач пересоздаются (0 - без ограничения)
+    DB_POOL_MAX_AGE: float = float(os.getenv("DB_POOL_MAX_AGE", "1800"))
+    DB_POOL_MAX_USES: int = int(os.getenv("DB_POOL_MAX_USES", "0"))
+    # Простаивавшее дольше этого соединение проверяется через SELECT 1 перед выдачей
+    DB_POOL_HEALTH_CHECK_INTERVAL: float = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+    # Серверные подготовленные выражения (psycopg 3). Выключаются для PgBouncer в режиме
+    # transaction pooling; THRESHOLD - после скольких выполнений запрос готовится автоматически
+    DB_PREPARED_STATEMENTS: bool = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+    DB_PREPARE_THRESHOLD: int = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+    DB_PREPARED_MAX: int = int(os.getenv("DB_PREPARED_MAX", "200"))
+    # Сколько текстов SQL по (операция, набор колонок) хранит каждый CRUD-объект
+    SQL_CACHE_SIZE: int = int(os.getenv("SQL_CACHE_SIZE", "256"))
+
+    MEDIA_CHUNK_SIZE: int = int(os.getenv("MEDIA_CHUNK_SIZE", str(256 * 1024)))
+    MEDIA_MAX_UPLOAD_BYTES: int = int(os.getenv("MEDIA_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+    MEDIA_THUMBNAIL_SIZE: int = int(os.getenv("MEDIA_THUMBNAIL_SIZE", "256"))
+    MEDIA_THUMBNAIL_CACHE_SIZE: int = int(os.getenv("MEDIA_THUMBNAIL_CACHE_SIZE", "512"))
+
+    # Период пересчета материализованной сводки /api/books/statistics/summary, секунды
+    LIBRARY_SUMMARY_REFRESH_INTERVAL: int = int(os.getenv("LIBRARY_SUMMARY_REFRESH_INTERVAL", "300"))
+
+    # Общий кэш между воркерами (redis://...); пустое значение - кэш в памяти процесса
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "")
+    READER_STATS_CACHE_TTL: float = float(os.getenv("READER_STATS_CACHE_TTL", "300"))
+    READER_STATS_CACHE_SIZE: int = int(os.getenv("READER_STATS_CACHE_SIZE", "10000"))
+
+    # Дерево жанров в памяти перечитывается не реже, чем раз в GENRE_TREE_TTL секунд
+    # (записи через этот процесс сбрасывают его сразу)
+    GENRE_TREE_TTL: float = float(os.getenv("GENRE_TREE_TTL", "60"))
+
+    # Число процессов uvicorn (uvicorn берет из WEB_CONCURRENCY значение --workers по умолчанию).
+    # Кэш ответов в памяти процесса включается только при одном воркере
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+    # Кэш JSON-ответов GET-маршрутов (response_cache.py); общий, если задан CACHE_REDIS_URL
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    RESPONSE_CACHE_MAX_BODY: int = int(os.getenv("RESPONSE_CACHE_MAX_BODY", str(1024 * 1024)))
+
+    # bcrypt: стоимость (log2 раундов) и отдельный пул процессов; 0 процессов - пул потоков
+    PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 1, 4))))
+    # Сколько операций одновременно принимается в работу/очередь и сколько секунд ждать места
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2"))
+
+    # Метрики Prometheus на /metrics; при false запросы и SQL не замеряются
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Журнал медленных запросов (/debug/slow-queries): порог в мс, 0 - журнал выключен
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+    SLOW_QUERY_LOG_SIZE: int = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+    SLOW_QUERY_MAX_FINGERPRINTS: int = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", "1000"))
+    # Параметры запросов в журнале: full, redacted (строки заменяются длиной) или none
+    SLOW_QUERY_PARAMS: str = os.getenv("SLOW_QUERY_PARAMS", "redacted")
+    # Доля медленных SELECT, для которых снимается EXPLAIN (ANALYZE, BUFFERS); 0 - не снимать.
+    # Запрос выполняется повторно, поэтому один отпечаток - не чаще раза в SLOW_QUERY_EXPLAIN_INTERVAL секунд
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0"))
+    SLOW_QUERY_EXPLAIN_INTERVAL: float = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS: int = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "30000"))
+    SLOW_QUERY_MAX_PLANS: int = int(os.getenv("SLOW_QUERY_MAX_PLANS", "50"))
+    # Значение заголовка X-Debug-Token для /debug/*; пустое значение отключает эти эндпоинты
+    DEBUG_TOKEN: str = os.getenv("DEBUG_TOKEN", "")
+
+    # Наибольшее число строк в одном запросе к /batch-эндпоинтам
+    BATCH_MAX_SIZE: int = int(os.getenv("BATCH_MAX_SIZE", "10000"))
+
 settings = Settings()
\ No newline at end of file
@@ -1,140 +1,499 @@
-from typing import List, Optional, Dict, Any
-from database import execute_query, get_db_cursor
+from typing import Callable, Hashable, List, Optional, Dict, Any, Sequence, Tuple
+from datetime import date
+from functools import partial
+import json
+from psycopg.types.json import Jsonb
+from async_database import execute_query, get_db_cursor, run_after_commit, release_connection
+from pagination import Page, keyset_condition
+from cache import LRUCache, SharedCache
+from genre_tree import get_genre_tree, invalidate_genre_tree
+from response_cache import entity_tag, invalidate_tags
+from passwords import password_hasher
+from metrics import instrument_operations
+from config import settings
 import logging
-from passlib.context import CryptContext
 
 logger = logging.getLogger(__name__)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Статистика читателя по reader_id; сбрасывается при записи его отзывов через CRUDReview
+reader_stats_cache = SharedCache(
+    "reader_stats", settings.READER_STATS_CACHE_SIZE, settings.READER_STATS_CACHE_TTL, settings.CACHE_REDIS_URL
+)
+
+# Коррелированные подзапросы, собирающие авторов и жанры книги `b` в JSON-массивы
+BOOK_AUTHORS_JSON = """
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'author_id', a.author_id,
+            'first_name', a.first_name,
+            'last_name', a.last_name,
+            'pseudonym', a.pseudonym,
+            'birth_date', a.birth_date,
+            'death_date', a.death_date,
+            'country', a.country,
+            'biography', a.biography,
+            'created_at', a.created_at
+        ) ORDER BY a.last_name, a.first_name)
+        FROM books_authors ba
+        JOIN authors a ON a.author_id = ba.author_id
+        WHERE ba.book_id = b.book_id
+    ), '[]'::json)
+"""
+
+BOOK_GENRES_JSON = """
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'genre_id', g.genre_id,
+            'genre_name', g.genre_name,
+            'description', g.description,
+            'parent_genre_id', g.parent_genre_id,
+            'created_at', g.created_at
+        ) ORDER BY bg.is_primary DESC, g.genre_name)
+        FROM books_genres bg
+        JOIN genres g ON g.genre_id = bg.genre_id
+        WHERE bg.book_id = b.book_id
+    ), '[]'::json)
+"""
+
+
+# Оценки берутся из book_rating_stats (поддерживается триггером на reviews), а не
+# агрегируются по отзывам при каждом чтении; ожидает LEFT JOIN book_rating_stats rs
+BOOK_RATING_COLUMNS = """
+    COALESCE(rs.rating_sum::numeric / NULLIF(rs.review_count, 0), 0) as avg_rating,
+    COALESCE(rs.review_count, 0) as review_count
+"""
+
+
+async def _invalidate_genre_tree():
+    invalidate_genre_tree()
+
+
+def like_escape(query: str) -> str:
+    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def like_pattern(query: str) -> str:
+    return f"%{like_escape(query)}%"
+
+
+def normalize_name(query: str) -> str:
+    # Так же нормализуется generated-колонка authors.search_name
+    return " ".join(query.lower().replace("ё", "е").split())
+
+
+def batch_param(rows: Sequence[Dict[str, Any]]) -> Jsonb:
+    # Даты и Decimal уходят в JSON строками, Postgres приводит их к типам колонок
+    return Jsonb(list(rows), dumps=partial(json.dumps, default=str))
 
 
 class CRUDBase:
+    # Колонки, которые нужны моделям ответа, - и в карточке, и в списках. BYTEA-колонки
+    # изображений в них не входят и читаются только через MediaStore
+    columns: Tuple[str, ...] = ()
+    # Карточки других сущностей, встраивающие строки таблицы: (колонки, SQL). SQL по массиву
+    # id строк возвращает теги карточек (tag); колонки - при изменении каких из них карточки
+    # устаревают (None - при любом изменении, () - только при вставке и удалении строки)
+    dependents: Tuple[Tuple[Optional[Tuple[str, ...]], str], ...] = ()
+
     def __init__(self, table: str, id_column: str = None):
         self.table = table
         self.id_column = id_column or f"{table[:-1]}_id"
+        self._statements = LRUCache(settings.SQL_CACHE_SIZE)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Запросы методов помечаются в метриках как "CRUDBook.get_with_details"
+        instrument_operations(cls)
+
+    @classmethod
+    def select_columns(cls, alias: str = "", columns: Optional[Sequence[str]] = None) -> str:
+        columns = columns or cls.columns
+        prefix = f"{alias}." if alias else ""
+        if not columns:
+            return f"{prefix}*"
+        return ", ".join(f"{prefix}{column}" for column in columns)
+
+    def statement(self, key: Hashable, build: Callable[[], str]) -> str:
+        """Текст SQL по ключу операции (с набором колонок, если он меняет текст);
+        build() вызывается только при промахе.
+
+        Одинаковый текст нужен и для подготовленных выражений: psycopg находит
+        выражение соединения по тексту запроса.
+        """
+        query = self._statements.get(key)
+        if query is None:
+            query = build()
+            self._statements.set(key, query)
+        return query
+
+    def _create_sql(self, columns: Tuple[str, ...]) -> str:
+        return f"""
+            INSERT INTO {self.table} ({", ".join(columns)})
+            VALUES ({", ".join(["%s"] * len(columns))})
+            RETURNING {self.select_columns()}
+        """
 
-    def create(self, **kwargs) -> Optional[Dict[str, Any]]:
-        columns = ", ".join(kwargs.keys())
-        placeholders = ", ".join(["%s"] * len(kwargs))
-        values = tuple(kwargs.values())
+    def _get_sql(self) -> str:
+        return f"SELECT {self.select_columns()} FROM {self.table} WHERE {self.id_column} = %s"
 
-        query = f"""
-            INSERT INTO {self.table} ({columns})
-            VALUES ({placeholders})
-            RETURNING *
+    def _get_all_sql(self, keyset: str) -> str:
+        return f"""
+            SELECT {self.select_columns()} FROM {self.table}
+            WHERE {keyset}
+            ORDER BY {self.id_column}
+            LIMIT %s OFFSET %s
         """
-        return execute_query(query, values, fetch_one=True)
 
-    def get(self, id: int) -> Optional[Dict[str, Any]]:
-        query = f"SELECT * FROM {self.table} WHERE {self.id_column} = %s"
-        return execute_query(query, (id,), fetch_one=True)
+    def _update_sql(self, columns: Tuple[str, ...]) -> str:
+        return f"""
+            UPDATE {self.table}
+            SET {", ".join(f"{column} = %s" for column in columns)}
+            WHERE {self.id_column} = %s
+            RETURNING {self.select_columns()}
+        """
+
+    def _delete_sql(self) -> str:
+        return f"DELETE FROM {self.table} WHERE {self.id_column} = %s"
+
+    def _count_sql(self) -> str:
+        return f"SELECT COUNT(*) as count FROM {self.table}"
+
+    # Однострочные операции по первичному ключу - самые частые запросы, поэтому
+    # выполняются как подготовленные выражения с первого вызова
+
+    async def create(self, **kwargs) -> Optional[Dict[str, Any]]:
+        columns = tuple(kwargs)
+        query = self.statement(("create", columns), partial(self._create_sql, columns))
+        row = await execute_query(query, tuple(kwargs.values()), fetch_one=True, prepare=True)
+        if row:
+            await self.after_write([row[self.id_column]])
+        return row
+
+    async def get(self, id: int) -> Optional[Dict[str, Any]]:
+        query = self.statement("get", self._get_sql)
+        return await execute_query(query, (id,), fetch_one=True, prepare=True)
 
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        query = f"SELECT * FROM {self.table} ORDER BY {self.id_column} LIMIT %s OFFSET %s"
-        return execute_query(query, (limit, skip))
+    async def get_all(self, skip: int = 0, limit: int = 100, after: Optional[str] = None) -> Page:
+        keys = (self.id_column,)
+        keyset, params = keyset_condition(after, keys)
+        # Текст условия зависит только от того, передан ли курсор; его значения - параметры
+        query = self.statement("get_all_after" if after else "get_all", partial(self._get_all_sql, keyset))
+        rows = await execute_query(query, (*params, limit, skip), prepare=True)
+        return Page.from_rows(rows, limit, keys)
 
-    def update(self, id: int, **kwargs) -> Optional[Dict[str, Any]]:
+    async def update(self, id: int, **kwargs) -> Optional[Dict[str, Any]]:
         if not kwargs:
-            return self.get(id)
+            return await self.get(id)
+
+        columns = tuple(kwargs)
+        before = await self.dependent_tags([id], columns)
+        query = self.statement(("update", columns), partial(self._update_sql, columns))
+        row = await execute_query(query, (*kwargs.values(), id), fetch_one=True, prepare=True)
+        if row:
+            await self.after_write([id], columns, before)
+        return row
+
+    async def delete(self, id: int) -> bool:
+        before = await self.dependent_tags([id])
+        query = self.statement("delete", self._delete_sql)
+        deleted = await execute_query(query, (id,), fetch_all=False, prepare=True) > 0
+        if deleted:
+            await self.after_write([id], tags=before)
+        return deleted
+
+    async def dependent_tags(self, ids: Sequence[int], columns: Optional[Sequence[str]] = None) -> List[str]:
+        """Теги карточек, зависящих от строк ids; columns - изменяемые колонки (None - вся строка).
+
+        Изменение или удаление может отвязать строку от карточки, поэтому теги
+        собираются и до записи, и после нее (в after_write).
+        """
+        queries = [
+            query for watched, query in self.dependents
+            if columns is None or watched is None or set(watched) & set(columns)
+        ]
+        if not ids or not queries:
+            return []
+        rows = await execute_query(" UNION ".join(queries), (list(ids),) * len(queries))
+        return [row['tag'] for row in rows]
+
+    async def after_write(self, ids: Sequence[int], columns: Optional[Sequence[str]] = None,
+                          tags: Sequence[str] = ()):
+        """Вызывается всеми методами записи с id измененных строк, измененными колонками
+        (None - вставка или удаление) и тегами зависимых карточек, собранными до записи;
+        переопределяется наследниками для сброса производных данных (кэшей, индексов в памяти)."""
+        if ids:
+            tags = [
+                self.table, *(entity_tag(self.table, id) for id in ids), *tags,
+                *await self.dependent_tags(ids, columns),
+            ]
+            await run_after_commit(partial(invalidate_tags, tags))
+
+    # Пакетные операции: весь пакет уходит одним запросом, массив id или jsonb-массив
+    # строк разворачивается на стороне Postgres
+
+    async def get_many(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns()} FROM {self.table}
+            WHERE {self.id_column} = ANY(%s::int[])
+            ORDER BY {self.id_column}
+        """
+        return await execute_query(query, (list(ids),))
 
-        set_clause = ", ".join([f"{k} = %s" for k in kwargs.keys()])
-        values = tuple(kwargs.values()) + (id,)
+    @staticmethod
+    def batch_columns(rows: Sequence[Dict[str, Any]], exclude: Sequence[str] = ()) -> List[str]:
+        # Объединение ключей всех строк; колонка, которой нет в строке, получит NULL
+        return [key for key in dict.fromkeys(key for row in rows for key in row) if key not in exclude]
 
+    async def create_many(self, rows: Sequence[Dict[str, Any]], on_conflict: str = "") -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        columns = ", ".join(self.batch_columns(rows))
         query = f"""
-            UPDATE {self.table}
+            INSERT INTO {self.table} ({columns})
+            SELECT {columns}
+            FROM jsonb_populate_recordset(NULL::{self.table}, %s)
+            {on_conflict}
+            RETURNING {self.select_columns()}
+        """
+        created = await execute_query(query, (batch_param(rows),))
+        await self.after_write([row[self.id_column] for row in created])
+        return created
+
+    async def update_many(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Каждая строка содержит id и только изменяемые поля. Колонка берется из строки,
+        # если ключ в ней есть (doc ? 'column'), иначе остается прежней
+        merged: Dict[Any, Dict[str, Any]] = {}
+        for row in rows:
+            merged.setdefault(row[self.id_column], {}).update(row)
+        if not merged:
+            return []
+
+        columns = self.batch_columns(merged.values(), exclude=(self.id_column,))
+        if not columns:
+            return await self.get_many(list(merged))
+        before = await self.dependent_tags(list(merged), columns)
+
+        set_clause = ", ".join(
+            f"{column} = CASE WHEN u.doc ? '{column}' THEN (u.rec).{column} ELSE t.{column} END"
+            for column in columns
+        )
+        query = f"""
+            UPDATE {self.table} t
             SET {set_clause}
-            WHERE {self.id_column} = %s
-            RETURNING *
+            FROM (
+                SELECT doc, jsonb_populate_record(NULL::{self.table}, doc) as rec
+                FROM jsonb_array_elements(%s) as e(doc)
+            ) u
+            WHERE t.{self.id_column} = (u.rec).{self.id_column}
+            RETURNING {self.select_columns("t")}
         """
-        return execute_query(query, values, fetch_one=True)
-
-    def delete(self, id: int) -> bool:
-        query = f"DELETE FROM {self.table} WHERE {self.id_column} = %s"
-        return execute_query(query, (id,), fetch_all=False) > 0
+        updated = await execute_query(query, (batch_param(list(merged.values())),))
+        await self.after_write([row[self.id_column] for row in updated], columns, before)
+        return updated
 
-    def count(self) -> int:
-        query = f"SELECT COUNT(*) as count FROM {self.table}"
-        result = execute_query(query, fetch_one=True)
+    async def delete_many(self, ids: Sequence[int]) -> List[int]:
+        before = await self.dependent_tags(ids)
+        query = f"""
+            DELETE FROM {self.table}
+            WHERE {self.id_column} = ANY(%s::int[])
+            RETURNING {self.id_column}
+        """
+        rows = await execute_query(query, (list(ids),))
+        deleted = [row[self.id_column] for row in rows]
+        await self.after_write(deleted, tags=before)
+        return deleted
+
+    async def count(self) -> int:
+        query = self.statement("count", self._count_sql)
+        result = await execute_query(query, fetch_one=True, prepare=True)
         return result['count'] if result else 0
 
 
+instrument_operations(CRUDBase)
+
+
 class CRUDBook(CRUDBase):
+    columns = (
+        "book_id", "title", "isbn", "publisher_id", "publication_year", "pages_count", "language",
+        "description", "storage_location", "acquisition_date", "price", "condition", "format",
+        "status", "series_id", "series_number", "created_at", "updated_at",
+    )
+    # Счетчики книг в карточках авторов, жанров и издательств, название книги в отзывах
+    dependents = (
+        (("author_ids",), "SELECT 'authors:' || author_id as tag FROM books_authors WHERE book_id = ANY(%s::int[])"),
+        (("genre_ids",), "SELECT 'genres:' || genre_id as tag FROM books_genres WHERE book_id = ANY(%s::int[])"),
+        (("publisher_id",), """
+            SELECT 'publishers:' || publisher_id as tag FROM books
+            WHERE book_id = ANY(%s::int[]) AND publisher_id IS NOT NULL
+        """),
+        (("title",), "SELECT 'reviews:' || review_id as tag FROM reviews WHERE book_id = ANY(%s::int[])"),
+    )
+
     def __init__(self):
         super().__init__("books", "book_id")
 
-    def create_with_relations(self, book_data: dict, author_ids: List[int], genre_ids: List[int]) -> Optional[
+    async def create_with_relations(self, book_data: dict, author_ids: List[int], genre_ids: List[int]) -> Optional[
         Dict[str, Any]]:
-        with get_db_cursor() as cursor:
+        async with get_db_cursor() as cursor:
             columns = ", ".join(book_data.keys())
             placeholders = ", ".join(["%s"] * len(book_data))
             values = tuple(book_data.values())
 
-            cursor.execute(f"""
+            await cursor.execute(f"""
                 INSERT INTO books ({columns})
                 VALUES ({placeholders})
-                RETURNING *
+                RETURNING {self.select_columns()}
             """, values)
-            book = cursor.fetchone()
+            book = await cursor.fetchone()
 
             if book and author_ids:
-                for author_id in author_ids:
-                    cursor.execute("""
-                        INSERT INTO books_authors (book_id, author_id)
-                        VALUES (%s, %s)
-                    """, (book['book_id'], author_id))
+                await self._set_authors(cursor, book['book_id'], author_ids, replace=False)
 
             if book and genre_ids:
-                for i, genre_id in enumerate(genre_ids):
-                    cursor.execute("""
-                        INSERT INTO books_genres (book_id, genre_id, is_primary)
-                        VALUES (%s, %s, %s)
-                    """, (book['book_id'], genre_id, i == 0))
+                await self._set_genres(cursor, book['book_id'], genre_ids, replace=False)
 
-            return book
+        if book:
+            await self.after_write([book['book_id']])
+        return book
 
-    def get_with_details(self, book_id: int) -> Optional[Dict[str, Any]]:
-        query = """
-            SELECT 
+    async def create_many_with_relations(self, books: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # id книг выделяются из последовательности заранее, поэтому книги и их связи
+        # вставляются одним запросом без сопоставления RETURNING с входными строками
+        if not books:
+            return []
+        columns = self.batch_columns(books, exclude=("author_ids", "genre_ids"))
+        query = f"""
+            WITH input AS (
+                SELECT nextval(pg_get_serial_sequence('books', 'book_id')) as book_id, doc
+                FROM jsonb_array_elements(%s) as e(doc)
+            ),
+            new_books AS (
+                INSERT INTO books (book_id, {", ".join(columns)})
+                SELECT i.book_id, {self.select_columns("r", columns)}
+                FROM input i
+                CROSS JOIN LATERAL jsonb_populate_record(NULL::books, i.doc) r
+                RETURNING {self.select_columns()}
+            ),
+            new_authors AS (
+                INSERT INTO books_authors (book_id, author_id)
+                SELECT DISTINCT i.book_id, a.author_id::int
+                FROM input i
+                CROSS JOIN LATERAL jsonb_array_elements_text(COALESCE(i.doc->'author_ids', '[]')) as a(author_id)
+            ),
+            new_genres AS (
+                INSERT INTO books_genres (book_id, genre_id, is_primary)
+                SELECT DISTINCT ON (i.book_id, g.genre_id::int) i.book_id, g.genre_id::int, g.position = 1
+                FROM input i
+                CROSS JOIN LATERAL jsonb_array_elements_text(COALESCE(i.doc->'genre_ids', '[]'))
+                    WITH ORDINALITY as g(genre_id, position)
+                ORDER BY i.book_id, g.genre_id::int, g.position
+            )
+            SELECT * FROM new_books ORDER BY book_id
+        """
+        created = await execute_query(query, (batch_param(books),))
+        await self.after_write([book['book_id'] for book in created])
+        return created
+
+    @staticmethod
+    async def _set_authors(cursor, book_id: int, author_ids: List[int], replace: bool = True):
+        # Набор авторов применяется как разница: лишние связи удаляются одним DELETE,
+        # новые добавляются одним INSERT, а совпадающие строки не трогаются вовсе
+        author_ids = list(dict.fromkeys(author_ids))
+        if replace:
+            await cursor.execute("""
+                DELETE FROM books_authors
+                WHERE book_id = %s AND author_id <> ALL(%s::int[])
+            """, (book_id, author_ids))
+        if author_ids:
+            await cursor.execute("""
+                INSERT INTO books_authors (book_id, author_id)
+                SELECT %s, unnest(%s::int[])
+                ON CONFLICT (book_id, author_id) DO NOTHING
+            """, (book_id, author_ids))
+
+    @staticmethod
+    async def _set_genres(cursor, book_id: int, genre_ids: List[int], replace: bool = True):
+        # Основным считается первый жанр списка; у существующих связей is_primary
+        # обновляется, только если порядок жанров действительно изменился
+        genre_ids = list(dict.fromkeys(genre_ids))
+        if replace:
+            await cursor.execute("""
+                DELETE FROM books_genres
+                WHERE book_id = %s AND genre_id <> ALL(%s::int[])
+            """, (book_id, genre_ids))
+        if genre_ids:
+            await cursor.execute("""
+                INSERT INTO books_genres (book_id, genre_id, is_primary)
+                SELECT %s, g.genre_id, g.position = 1
+                FROM unnest(%s::int[]) WITH ORDINALITY AS g(genre_id, position)
+                ON CONFLICT (book_id, genre_id) DO UPDATE
+                SET is_primary = EXCLUDED.is_primary
+                WHERE books_genres.is_primary IS DISTINCT FROM EXCLUDED.is_primary
+            """, (book_id, genre_ids))
+
+    @staticmethod
+    def _with_relations(books_sql: str, order_by: str) -> str:
+        # books_sql отбирает уже ограниченную страницу книг, поэтому авторы, жанры
+        # и рейтинги собираются только для неё, одним запросом
+        return f"""
+            SELECT
                 b.*,
+                {BOOK_RATING_COLUMNS},
+                {BOOK_AUTHORS_JSON} as authors,
+                {BOOK_GENRES_JSON} as genres
+            FROM ({books_sql}) b
+            LEFT JOIN book_rating_stats rs ON rs.book_id = b.book_id
+            ORDER BY {order_by}
+        """
+
+    async def get_all(self, skip: int = 0, limit: int = 100, after: Optional[str] = None) -> Page:
+        keys = ("book_id",)
+        keyset, params = keyset_condition(after, keys)
+        query = self._with_relations(f"""
+            SELECT {self.select_columns()} FROM books
+            WHERE {keyset}
+            ORDER BY book_id
+            LIMIT %s OFFSET %s
+        """, "b.book_id")
+        rows = await execute_query(query, (*params, limit, skip))
+        return Page.from_rows(rows, limit, keys)
+
+    async def get_many(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        query = self._with_relations(f"""
+            SELECT {self.select_columns()} FROM books
+            WHERE book_id = ANY(%s::int[])
+        """, "b.book_id")
+        return await execute_query(query, (list(ids),))
+
+    async def get_with_details(self, book_id: int) -> Optional[Dict[str, Any]]:
+        query = f"""
+            SELECT
+                {self.select_columns("b")},
                 p.publisher_name,
                 s.series_name,
-                COALESCE(AVG(r.rating), 0) as avg_rating,
-                COUNT(DISTINCT r.review_id) as review_count
+                {BOOK_RATING_COLUMNS},
+                {BOOK_AUTHORS_JSON} as authors,
+                {BOOK_GENRES_JSON} as genres
             FROM books b
             LEFT JOIN publishers p ON b.publisher_id = p.publisher_id
             LEFT JOIN series s ON b.series_id = s.series_id
-            LEFT JOIN reviews r ON b.book_id = r.book_id
+            LEFT JOIN book_rating_stats rs ON rs.book_id = b.book_id
             WHERE b.book_id = %s
-            GROUP BY b.book_id, p.publisher_name, s.series_name
         """
-        book = execute_query(query, (book_id,), fetch_one=True)
+        return await execute_query(query, (book_id,), fetch_one=True)
 
-        if book:
-            authors_query = """
-                SELECT a.* FROM authors a
-                JOIN books_authors ba ON a.author_id = ba.author_id
-                WHERE ba.book_id = %s
-            """
-            book['authors'] = execute_query(authors_query, (book_id,))
-
-            genres_query = """
-                SELECT g.* FROM genres g
-                JOIN books_genres bg ON g.genre_id = bg.genre_id
-                WHERE bg.book_id = %s
-                ORDER BY bg.is_primary DESC
-            """
-            book['genres'] = execute_query(genres_query, (book_id,))
-
-        return book
-
-    def search(self, query: str, author_id: Optional[int] = None,
-               genre_id: Optional[int] = None, year_from: Optional[int] = None,
-               year_to: Optional[int] = None) -> List[Dict[str, Any]]:
+    async def search(self, query: str, author_id: Optional[int] = None,
+                     genre_id: Optional[int] = None, year_from: Optional[int] = None,
+                     year_to: Optional[int] = None, skip: int = 0,
+                     limit: int = 100, after: Optional[str] = None) -> Page:
         where_clauses = []
         params = []
 
         if query:
-            where_clauses.append("(b.title ILIKE %s OR b.description ILIKE %s)")
-            params.extend([f"%{query}%", f"%{query}%"])
+            # Полнотекстовый поиск по search_vector (GIN); ILIKE по названию (trigram GIN)
+            # оставлен для совпадений по части слова
+            where_clauses.append("(b.search_vector @@ q.query OR b.title ILIKE %s)")
+            params.append(like_pattern(query))
 
         if author_id:
             where_clauses.append(
@@ -142,9 +501,11 @@ class CRUDBook(CRUDBase):
             params.append(author_id)
 
         if genre_id:
-            where_clauses.append(
-                "EXISTS (SELECT 1 FROM books_genres bg WHERE bg.book_id = b.book_id AND bg.genre_id = %s)")
-            params.append(genre_id)
+            # Жанр вместе со всеми поджанрами из дерева жанров в памяти
+            where_clauses.append("""EXISTS (
+                SELECT 1 FROM books_genres bg WHERE bg.book_id = b.book_id AND bg.genre_id = ANY(%s::int[])
+            )""")
+            params.append(await crud_genre.get_subtree_ids(genre_id))
 
         if year_from:
             where_clauses.append("b.publication_year >= %s")
@@ -154,211 +515,461 @@ class CRUDBook(CRUDBase):
             where_clauses.append("b.publication_year <= %s")
             params.append(year_to)
 
-        where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
-
-        query = f"""
-            SELECT b.*, 
-                   COALESCE(AVG(r.rating), 0) as avg_rating,
-                   COUNT(DISTINCT r.review_id) as review_count
-            FROM books b
-            LEFT JOIN reviews r ON b.book_id = r.book_id
-            WHERE {where_clause}
-            GROUP BY b.book_id
-            ORDER BY b.title
-        """
-
-        return execute_query(query, tuple(params))
-
-    def update_with_relations(self, book_id: int, book_data: dict,
-                              author_ids: Optional[List[int]] = None,
-                              genre_ids: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
-        with get_db_cursor() as cursor:
+        if query:
+            keys = ("rank", "book_id")
+            keyset, keyset_params = keyset_condition(after, keys, alias="b", descending=True)
+            where_clause = " AND ".join(where_clauses)
+            books_sql = f"""
+                SELECT * FROM (
+                    SELECT {self.select_columns("b")}, ts_rank_cd(b.search_vector, q.query) as rank
+                    FROM books b,
+                         (SELECT websearch_to_tsquery('russian', %s)
+                                 || websearch_to_tsquery('simple', %s) as query) q
+                    WHERE {where_clause}
+                ) b
+                WHERE {keyset}
+                ORDER BY b.rank DESC, b.book_id DESC
+                LIMIT %s OFFSET %s
+            """
+            order_by = "b.rank DESC, b.book_id DESC"
+            params = [query, query, *params, *keyset_params]
+        else:
+            keys = ("title", "book_id")
+            keyset, keyset_params = keyset_condition(after, keys, alias="b")
+            where_clause = " AND ".join(where_clauses + [keyset])
+            books_sql = f"""
+                SELECT {self.select_columns("b")} FROM books b
+                WHERE {where_clause}
+                ORDER BY b.title, b.book_id
+                LIMIT %s OFFSET %s
+            """
+            order_by = "b.title, b.book_id"
+            params.extend(keyset_params)
+
+        params.extend([limit, skip])
+        rows = await execute_query(self._with_relations(books_sql, order_by), tuple(params))
+        return Page.from_rows(rows, limit, keys)
+
+    async def update_with_relations(self, book_id: int, book_data: dict,
+                                    author_ids: Optional[List[int]] = None,
+                                    genre_ids: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+        columns = (*book_data, *(["author_ids"] if author_ids is not None else []),
+                   *(["genre_ids"] if genre_ids is not None else []))
+        before = await self.dependent_tags([book_id], columns)
+        async with get_db_cursor() as cursor:
             if book_data:
                 set_clause = ", ".join([f"{k} = %s" for k in book_data.keys()])
                 values = tuple(book_data.values()) + (book_id,)
 
-                cursor.execute(f"""
+                await cursor.execute(f"""
                     UPDATE books
                     SET {set_clause}
                     WHERE book_id = %s
-                    RETURNING *
+                    RETURNING {self.select_columns()}
                 """, values)
-                book = cursor.fetchone()
+                book = await cursor.fetchone()
             else:
-                cursor.execute("SELECT * FROM books WHERE book_id = %s", (book_id,))
-                book = cursor.fetchone()
+                await cursor.execute(f"SELECT {self.select_columns()} FROM books WHERE book_id = %s", (book_id,))
+                book = await cursor.fetchone()
 
             if book and author_ids is not None:
-                cursor.execute("DELETE FROM books_authors WHERE book_id = %s", (book_id,))
-                for author_id in author_ids:
-                    cursor.execute("""
-                        INSERT INTO books_authors (book_id, author_id)
-                        VALUES (%s, %s)
-                    """, (book_id, author_id))
+                await self._set_authors(cursor, book_id, author_ids)
 
             if book and genre_ids is not None:
-                cursor.execute("DELETE FROM books_genres WHERE book_id = %s", (book_id,))
-                for i, genre_id in enumerate(genre_ids):
-                    cursor.execute("""
-                        INSERT INTO books_genres (book_id, genre_id, is_primary)
-                        VALUES (%s, %s, %s)
-                    """, (book_id, genre_id, i == 0))
+                await self._set_genres(cursor, book_id, genre_ids)
 
-            return book
+        if book:
+            await self.after_write([book_id], columns, before)
+        return book
 
 
 class CRUDAuthor(CRUDBase):
+    columns = (
+        "author_id", "first_name", "last_name", "pseudonym", "birth_date", "death_date",
+        "country", "biography", "created_at",
+    )
+    # Карточки книг встраивают авторов целиком
+    dependents = (
+        (None, "SELECT 'books:' || book_id as tag FROM books_authors WHERE author_id = ANY(%s::int[])"),
+    )
+
     def __init__(self):
         super().__init__("authors", "author_id")
 
-    def get_with_books_count(self, author_id: int) -> Optional[Dict[str, Any]]:
-        query = """
-            SELECT a.*, COUNT(DISTINCT ba.book_id) as books_count
+    async def get_with_books_count(self, author_id: int) -> Optional[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns("a")}, COUNT(DISTINCT ba.book_id) as books_count
             FROM authors a
             LEFT JOIN books_authors ba ON a.author_id = ba.author_id
             WHERE a.author_id = %s
             GROUP BY a.author_id
         """
-        return execute_query(query, (author_id,), fetch_one=True)
+        return await execute_query(query, (author_id,), fetch_one=True)
 
-    def get_books(self, author_id: int) -> List[Dict[str, Any]]:
-        query = """
-            SELECT b.* FROM books b
+    async def get_many(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns("a")},
+                   (SELECT COUNT(*) FROM books_authors ba WHERE ba.author_id = a.author_id) as books_count
+            FROM authors a
+            WHERE a.author_id = ANY(%s::int[])
+            ORDER BY a.author_id
+        """
+        return await execute_query(query, (list(ids),))
+
+    async def get_books(self, author_id: int) -> List[Dict[str, Any]]:
+        query = CRUDBook._with_relations(f"""
+            SELECT {CRUDBook.select_columns("b")} FROM books b
             JOIN books_authors ba ON b.book_id = ba.book_id
             WHERE ba.author_id = %s
-            ORDER BY b.publication_year DESC
+        """, "b.publication_year DESC")
+        return await execute_query(query, (author_id,))
+
+    async def search(self, query: str, skip: int = 0, limit: int = 100,
+                     after: Optional[str] = None) -> Page:
+        # Совпадение по подстроке или по похожести слов (опечатки) через trigram GIN
+        # по search_name; результаты упорядочены по word_similarity
+        normalized = normalize_name(query)
+        keys = ("rank", "author_id")
+        keyset, keyset_params = keyset_condition(after, keys, alias="a", descending=True)
+        query_sql = f"""
+            SELECT a.*, (SELECT COUNT(*) FROM books_authors ba WHERE ba.author_id = a.author_id) as books_count
+            FROM (
+                SELECT * FROM (
+                    SELECT {self.select_columns()}, word_similarity(%s, search_name) as rank
+                    FROM authors
+                    WHERE search_name LIKE %s OR %s <%% search_name
+                ) a
+                WHERE {keyset}
+                ORDER BY a.rank DESC, a.author_id DESC
+                LIMIT %s OFFSET %s
+            ) a
+            ORDER BY a.rank DESC, a.author_id DESC
         """
-        return execute_query(query, (author_id,))
-
-    def search(self, query: str) -> List[Dict[str, Any]]:
-        query_sql = """
-            SELECT a.*, COUNT(DISTINCT ba.book_id) as books_count
-            FROM authors a
-            LEFT JOIN books_authors ba ON a.author_id = ba.author_id
-            WHERE a.first_name ILIKE %s OR a.last_name ILIKE %s OR a.pseudonym ILIKE %s
-            GROUP BY a.author_id
-            ORDER BY a.last_name, a.first_name
+        params = (normalized, like_pattern(normalized), normalized, *keyset_params, limit, skip)
+        rows = await execute_query(query_sql, params)
+        return Page.from_rows(rows, limit, keys)
+
+    async def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        # Префикс строки (фамилии) ищется по btree text_pattern_ops; префикс любого
+        # другого слова - по trigram-индексу, только если в запросе есть хотя бы
+        # одна полная триграмма
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        prefix = like_escape(normalized)
+        branches = ["""
+            (SELECT author_id, first_name, last_name, pseudonym, 0 as priority, search_name
+             FROM authors
+             WHERE search_name LIKE %s
+             ORDER BY search_name
+             LIMIT %s)
+        """]
+        params = [f"{prefix}%", limit]
+        if len(normalized) >= 3:
+            branches.append("""
+                (SELECT author_id, first_name, last_name, pseudonym, 1 as priority, search_name
+                 FROM authors
+                 WHERE search_name LIKE %s AND search_name NOT LIKE %s
+                 ORDER BY search_name
+                 LIMIT %s)
+            """)
+            params.extend([f"% {prefix}%", f"{prefix}%", limit])
+        query_sql = f"""
+            SELECT author_id, first_name, last_name, pseudonym
+            FROM ({" UNION ALL ".join(branches)}) s
+            ORDER BY priority, search_name
+            LIMIT %s
         """
-        search_pattern = f"%{query}%"
-        return execute_query(query_sql, (search_pattern, search_pattern, search_pattern))
+        return await execute_query(query_sql, (*params, limit))
 
 
 class CRUDGenre(CRUDBase):
+    columns = ("genre_id", "genre_name", "description", "parent_genre_id", "created_at")
+    dependents = (
+        (None, "SELECT 'books:' || book_id as tag FROM books_genres WHERE genre_id = ANY(%s::int[])"),
+    )
+
     def __init__(self):
         super().__init__("genres", "genre_id")
 
-    def get_with_books_count(self, genre_id: int) -> Optional[Dict[str, Any]]:
-        query = """
-            SELECT g.*, COUNT(DISTINCT bg.book_id) as books_count
+    async def get_with_books_count(self, genre_id: int) -> Optional[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns("g")}, COUNT(DISTINCT bg.book_id) as books_count
             FROM genres g
             LEFT JOIN books_genres bg ON g.genre_id = bg.genre_id
             WHERE g.genre_id = %s
             GROUP BY g.genre_id
         """
-        return execute_query(query, (genre_id,), fetch_one=True)
+        return await execute_query(query, (genre_id,), fetch_one=True)
 
-    def get_hierarchy(self) -> List[Dict[str, Any]]:
-        query = """
-            WITH RECURSIVE genre_tree AS (
-                SELECT *, 0 as level
-                FROM genres
-                WHERE parent_genre_id IS NULL
+    async def get_hierarchy(self) -> List[Dict[str, Any]]:
+        return (await get_genre_tree()).hierarchy()
 
-                UNION ALL
+    async def get_subtree_ids(self, genre_id: int) -> List[int]:
+        return (await get_genre_tree()).subtree_ids(genre_id)
 
-                SELECT g.*, gt.level + 1
-                FROM genres g
-                JOIN genre_tree gt ON g.parent_genre_id = gt.genre_id
-            )
-            SELECT * FROM genre_tree
-            ORDER BY level, genre_name
-        """
-        return execute_query(query)
+    async def after_write(self, ids: Sequence[int], columns: Optional[Sequence[str]] = None,
+                          tags: Sequence[str] = ()):
+        await super().after_write(ids, columns, tags)
+        if ids:
+            await run_after_commit(_invalidate_genre_tree)
 
 
 class CRUDReader(CRUDBase):
+    # password_hash читается только в authenticate
+    columns = (
+        "reader_id", "first_name", "last_name", "email", "registration_date", "preferences",
+        "is_active", "created_at",
+    )
+    # Имя читателя в карточках его отзывов
+    dependents = (
+        (("first_name", "last_name"),
+         "SELECT 'reviews:' || review_id as tag FROM reviews WHERE reader_id = ANY(%s::int[])"),
+    )
+
     def __init__(self):
         super().__init__("readers", "reader_id")
 
-    def create(self, **kwargs) -> Optional[Dict[str, Any]]:
+    async def create(self, **kwargs) -> Optional[Dict[str, Any]]:
         if 'password' in kwargs:
-            kwargs['password_hash'] = pwd_context.hash(kwargs.pop('password'))
-        return super().create(**kwargs)
-
-    def authenticate(self, email: str, password: str) -> Optional[Dict[str, Any]]:
-        query = "SELECT * FROM readers WHERE email = %s AND is_active = true"
-        reader = execute_query(query, (email,), fetch_one=True)
-
-        if reader and pwd_context.verify(password, reader['password_hash']):
-            return reader
-        return None
-
-    def get_statistics(self, reader_id: int) -> Dict[str, Any]:
-        stats_query = """
-            SELECT 
-                COUNT(DISTINCT r.book_id) as books_read,
-                AVG(r.rating) as avg_rating,
-                COUNT(DISTINCT EXTRACT(YEAR FROM r.end_date)) as years_active,
-                COUNT(DISTINCT bg.genre_id) as genres_read,
-                SUM(b.pages_count) as total_pages
-            FROM reviews r
-            JOIN books b ON r.book_id = b.book_id
-            LEFT JOIN books_genres bg ON b.book_id = bg.book_id
-            WHERE r.reader_id = %s AND r.end_date IS NOT NULL
-        """
-        stats = execute_query(stats_query, (reader_id,), fetch_one=True)
+            kwargs['password_hash'] = await self._hash_password(kwargs.pop('password'))
+        return await super().create(**kwargs)
 
-        genres_query = """
-            SELECT g.genre_name, COUNT(*) as count, AVG(r.rating) as avg_rating
-            FROM reviews r
-            JOIN books_genres bg ON r.book_id = bg.book_id
-            JOIN genres g ON bg.genre_id = g.genre_id
-            WHERE r.reader_id = %s
-            GROUP BY g.genre_id, g.genre_name
-            ORDER BY count DESC, avg_rating DESC
-            LIMIT 5
+    async def update(self, id: int, **kwargs) -> Optional[Dict[str, Any]]:
+        if 'password' in kwargs:
+            kwargs['password_hash'] = await self._hash_password(kwargs.pop('password'))
+        return await super().update(id, **kwargs)
+
+    @staticmethod
+    async def _hash_password(password: str) -> str:
+        # Соединение не удерживается, пока пароль хэшируется в пуле процессов
+        await release_connection()
+        return await password_hasher.hash(password)
+
+    async def authenticate(self, email: str, password: str) -> Optional[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns()}, password_hash
+            FROM readers
+            WHERE email = %s AND is_active = true
         """
-        stats['favorite_genres'] = execute_query(genres_query, (reader_id,))
+        reader = await execute_query(query, (email,), fetch_one=True)
+        if reader is None:
+            return None
+
+        await release_connection()
+        valid, new_hash = await password_hasher.verify_and_update(password, reader['password_hash'])
+        if not valid:
+            return None
+
+        if new_hash:
+            # Стоимость bcrypt изменилась - хэш обновляется прозрачно при входе
+            await execute_query(
+                "UPDATE readers SET password_hash = %s WHERE reader_id = %s AND password_hash = %s",
+                (new_hash, reader['reader_id'], reader['password_hash']),
+                fetch_all=False
+            )
+        return reader
 
-        authors_query = """
-            SELECT CONCAT(a.first_name, ' ', a.last_name) as author_name, 
-                   COUNT(*) as count, AVG(r.rating) as avg_rating
-            FROM reviews r
-            JOIN books_authors ba ON r.book_id = ba.book_id
-            JOIN authors a ON ba.author_id = a.author_id
-            WHERE r.reader_id = %s
-            GROUP BY a.author_id, author_name
-            ORDER BY count DESC, avg_rating DESC
-            LIMIT 5
+    async def get_statistics(self, reader_id: int) -> Dict[str, Any]:
+        stats = await reader_stats_cache.get(reader_id)
+        if stats is not None:
+            return stats
+
+        # Отзывы читателя читаются один раз (CTE материализуется); жанры и авторы
+        # присоединяются только в своих подзапросах, поэтому SUM(pages_count)
+        # не размножается по числу жанров книги
+        query = """
+            WITH r AS (
+                SELECT r.book_id, r.rating, r.end_date, b.pages_count
+                FROM reviews r
+                JOIN books b ON r.book_id = b.book_id
+                WHERE r.reader_id = %s
+            )
+            SELECT
+                COUNT(*) FILTER (WHERE r.end_date IS NOT NULL) as books_read,
+                AVG(r.rating) FILTER (WHERE r.end_date IS NOT NULL) as avg_rating,
+                COUNT(DISTINCT EXTRACT(YEAR FROM r.end_date)) as years_active,
+                (
+                    SELECT COUNT(DISTINCT bg.genre_id)
+                    FROM r
+                    JOIN books_genres bg ON r.book_id = bg.book_id
+                    WHERE r.end_date IS NOT NULL
+                ) as genres_read,
+                SUM(r.pages_count) FILTER (WHERE r.end_date IS NOT NULL) as total_pages,
+                (
+                    SELECT COALESCE(json_agg(fg ORDER BY fg.count DESC, fg.avg_rating DESC), '[]')
+                    FROM (
+                        SELECT g.genre_name, COUNT(*) as count, AVG(r.rating)::float as avg_rating
+                        FROM r
+                        JOIN books_genres bg ON r.book_id = bg.book_id
+                        JOIN genres g ON bg.genre_id = g.genre_id
+                        GROUP BY g.genre_id, g.genre_name
+                        ORDER BY count DESC, avg_rating DESC
+                        LIMIT 5
+                    ) fg
+                ) as favorite_genres,
+                (
+                    SELECT COALESCE(json_agg(fa ORDER BY fa.count DESC, fa.avg_rating DESC), '[]')
+                    FROM (
+                        SELECT CONCAT(a.first_name, ' ', a.last_name) as author_name,
+                               COUNT(*) as count, AVG(r.rating)::float as avg_rating
+                        FROM r
+                        JOIN books_authors ba ON r.book_id = ba.book_id
+                        JOIN authors a ON ba.author_id = a.author_id
+                        GROUP BY a.author_id, author_name
+                        ORDER BY count DESC, avg_rating DESC
+                        LIMIT 5
+                    ) fa
+                ) as favorite_authors
+            FROM r
         """
-        stats['favorite_authors'] = execute_query(authors_query, (reader_id,))
+        stats = await execute_query(query, (reader_id,), fetch_one=True)
+        if stats['avg_rating'] is not None:
+            stats['avg_rating'] = float(stats['avg_rating'])
 
+        await reader_stats_cache.set(reader_id, stats)
         return stats
 
 
 class CRUDReview(CRUDBase):
+    columns = (
+        "review_id", "book_id", "reader_id", "rating", "review_text", "start_date", "end_date",
+        "review_date", "notes", "favorite_quotes", "reading_status", "created_at",
+    )
+    # Рейтинг в карточке книги
+    dependents = (
+        (("rating",), "SELECT 'books:' || book_id as tag FROM reviews WHERE review_id = ANY(%s::int[])"),
+    )
+    review_keys = ("review_date", "review_id")
+
     def __init__(self):
         super().__init__("reviews", "review_id")
 
-    def create(self, **kwargs) -> Optional[Dict[str, Any]]:
-        check_query = """
-            SELECT review_id FROM reviews 
-            WHERE book_id = %s AND reader_id = %s
-        """
-        existing = execute_query(
-            check_query,
-            (kwargs.get('book_id'), kwargs.get('reader_id')),
-            fetch_one=True
+    @classmethod
+    def upsert_clause(cls, columns: Sequence[str]) -> str:
+        # Повторный отзыв читателя на ту же книгу перезаписывает существующий
+        updates = ", ".join(
+            f"{column} = EXCLUDED.{column}" for column in columns if column not in ("book_id", "reader_id")
         )
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        return f"ON CONFLICT (book_id, reader_id) {action}"
 
-        if existing:
-            return self.update(existing['review_id'], **kwargs)
-
-        return super().create(**kwargs)
-
-    def get_with_details(self, review_id: int) -> Optional[Dict[str, Any]]:
+    async def create(self, **kwargs) -> Optional[Dict[str, Any]]:
+        # Вставка и обновление - один атомарный запрос: конкурентные отправки отзыва
+        # не упираются в UNIQUE(book_id, reader_id), а детали отзыва приходят сразу
+        columns = ", ".join(kwargs.keys())
+        placeholders = ", ".join(["%s"] * len(kwargs))
+        query = f"""
+            WITH saved AS (
+                INSERT INTO reviews ({columns})
+                VALUES ({placeholders})
+                {self.upsert_clause(list(kwargs))}
+                RETURNING {self.select_columns()}
+            )
+            SELECT r.*,
+                   b.title as book_title,
+                   CONCAT(rd.first_name, ' ', rd.last_name) as reader_name
+            FROM saved r
+            JOIN books b ON r.book_id = b.book_id
+            JOIN readers rd ON r.reader_id = rd.reader_id
+        """
+        review = await execute_query(query, tuple(kwargs.values()), fetch_one=True)
+        if review:
+            await self.after_write([review['review_id']])
+            await self.invalidate_reader_stats([review['reader_id']])
+        return review
+
+    async def create_many(self, rows: Sequence[Dict[str, Any]], on_conflict: str = "") -> List[Dict[str, Any]]:
+        # Внутри пакета побеждает последняя строка для пары (book_id, reader_id)
+        latest = {(row['book_id'], row['reader_id']): row for row in rows}
+        rows = list(latest.values())
+        reviews = await super().create_many(rows, on_conflict or self.upsert_clause(self.batch_columns(rows)))
+        await self.invalidate_reader_stats(review['reader_id'] for review in reviews)
+        return reviews
+
+    async def update(self, id: int, **kwargs) -> Optional[Dict[str, Any]]:
+        review = await super().update(id, **kwargs)
+        if review and kwargs:
+            await self.invalidate_reader_stats([review['reader_id']])
+        return review
+
+    async def update_many(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        reviews = await super().update_many(rows)
+        await self.invalidate_reader_stats(review['reader_id'] for review in reviews)
+        return reviews
+
+    async def delete(self, id: int) -> bool:
+        deleted = await self._delete_returning_readers([id])
+        return bool(deleted)
+
+    async def delete_many(self, ids: Sequence[int]) -> List[int]:
+        return await self._delete_returning_readers(ids)
+
+    async def _delete_returning_readers(self, ids: Sequence[int]) -> List[int]:
+        before = await self.dependent_tags(ids)
         query = """
-            SELECT r.*, 
+            DELETE FROM reviews
+            WHERE review_id = ANY(%s::int[])
+            RETURNING review_id, reader_id
+        """
+        rows = await execute_query(query, (list(ids),))
+        deleted = [row['review_id'] for row in rows]
+        await self.after_write(deleted, tags=before)
+        await self.invalidate_reader_stats(row['reader_id'] for row in rows)
+        return deleted
+
+    @staticmethod
+    async def invalidate_reader_stats(reader_ids):
+        # Кэш сбрасывается после фиксации транзакции, иначе параллельный запрос
+        # успел бы закэшировать статистику по еще не зафиксированным данным
+        reader_ids = set(reader_ids)
+        if not reader_ids:
+            return
+
+        async def invalidate():
+            for reader_id in reader_ids:
+                await reader_stats_cache.pop(reader_id)
+
+        await run_after_commit(invalidate)
+
+    async def get_many(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns("r")},
+                   b.title as book_title,
+                   CONCAT(rd.first_name, ' ', rd.last_name) as reader_name
+            FROM reviews r
+            JOIN books b ON r.book_id = b.book_id
+            JOIN readers rd ON r.reader_id = rd.reader_id
+            WHERE r.review_id = ANY(%s::int[])
+            ORDER BY r.review_id
+        """
+        return await execute_query(query, (list(ids),))
+
+    async def get_reading_progress(self, date_from: date, date_to: date, granularity: str = "month",
+                                   reader_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        # Читаются только дневные корзины из диапазона, поэтому стоимость запроса
+        # зависит от длины периода, а не от всей истории отзывов
+        if reader_id:
+            source, condition, params = "reading_progress_daily", "reader_id = %s AND ", [reader_id]
+        else:
+            source, condition, params = "reading_progress_daily_global", "", []
+        query = f"""
+            SELECT
+                date_trunc(%s, day)::date as period_start,
+                SUM(books_read) as books_read,
+                SUM(pages_read) as pages_read,
+                SUM(rating_sum)::numeric / NULLIF(SUM(books_read), 0) as avg_rating
+            FROM {source}
+            WHERE {condition}day BETWEEN %s AND %s
+            GROUP BY period_start
+            HAVING SUM(books_read) > 0
+            ORDER BY period_start DESC
+        """
+        return await execute_query(query, (granularity, *params, date_from, date_to))
+
+    async def get_with_details(self, review_id: int) -> Optional[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns("r")},
                    b.title as book_title,
                    CONCAT(rd.first_name, ' ', rd.last_name) as reader_name
             FROM reviews r
@@ -366,57 +977,76 @@ class CRUDReview(CRUDBase):
             JOIN readers rd ON r.reader_id = rd.reader_id
             WHERE r.review_id = %s
         """
-        return execute_query(query, (review_id,), fetch_one=True)
+        return await execute_query(query, (review_id,), fetch_one=True)
 
-    def get_by_reader(self, reader_id: int, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        query = """
-            SELECT r.*, b.title as book_title
+    async def get_by_reader(self, reader_id: int, skip: int = 0, limit: int = 100,
+                            after: Optional[str] = None) -> Page:
+        keyset, params = keyset_condition(after, self.review_keys, alias="r", descending=True)
+        query = f"""
+            SELECT {self.select_columns("r")}, b.title as book_title
             FROM reviews r
             JOIN books b ON r.book_id = b.book_id
-            WHERE r.reader_id = %s
-            ORDER BY r.review_date DESC
+            WHERE r.reader_id = %s AND {keyset}
+            ORDER BY r.review_date DESC, r.review_id DESC
             LIMIT %s OFFSET %s
         """
-        return execute_query(query, (reader_id, limit, skip))
+        rows = await execute_query(query, (reader_id, *params, limit, skip))
+        return Page.from_rows(rows, limit, self.review_keys)
 
-    def get_by_book(self, book_id: int, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        query = """
-            SELECT r.*, CONCAT(rd.first_name, ' ', rd.last_name) as reader_name
+    async def get_by_book(self, book_id: int, skip: int = 0, limit: int = 100,
+                          after: Optional[str] = None) -> Page:
+        keyset, params = keyset_condition(after, self.review_keys, alias="r", descending=True)
+        query = f"""
+            SELECT {self.select_columns("r")}, CONCAT(rd.first_name, ' ', rd.last_name) as reader_name
             FROM reviews r
             JOIN readers rd ON r.reader_id = rd.reader_id
-            WHERE r.book_id = %s
-            ORDER BY r.review_date DESC
+            WHERE r.book_id = %s AND {keyset}
+            ORDER BY r.review_date DESC, r.review_id DESC
             LIMIT %s OFFSET %s
         """
-        return execute_query(query, (book_id, limit, skip))
+        rows = await execute_query(query, (book_id, *params, limit, skip))
+        return Page.from_rows(rows, limit, self.review_keys)
 
 
 class CRUDPublisher(CRUDBase):
+    columns = (
+        "publisher_id", "publisher_name", "country", "city", "founded_year", "website",
+        "contacts", "created_at",
+    )
+    dependents = (
+        (("publisher_name",), "SELECT 'books:' || book_id as tag FROM books WHERE publisher_id = ANY(%s::int[])"),
+    )
+
     def __init__(self):
         super().__init__("publishers", "publisher_id")
 
-    def get_with_books_count(self, publisher_id: int) -> Optional[Dict[str, Any]]:
-        query = """
-            SELECT p.*, COUNT(DISTINCT b.book_id) as books_count
+    async def get_with_books_count(self, publisher_id: int) -> Optional[Dict[str, Any]]:
+        query = f"""
+            SELECT {self.select_columns("p")}, COUNT(DISTINCT b.book_id) as books_count
             FROM publishers p
             LEFT JOIN books b ON p.publisher_id = b.publisher_id
             WHERE p.publisher_id = %s
             GROUP BY p.publisher_id
         """
-        return execute_query(query, (publisher_id,), fetch_one=True)
+        return await execute_query(query, (publisher_id,), fetch_one=True)
 
 
 class CRUDSeries(CRUDBase):
+    columns = ("series_id", "series_name", "description", "publisher_id", "created_at")
+    dependents = (
+        (("series_name",), "SELECT 'books:' || book_id as tag FROM books WHERE series_id = ANY(%s::int[])"),
+    )
+
     def __init__(self):
         super().__init__("series", "series_id")
 
-    def get_books(self, series_id: int) -> List[Dict[str, Any]]:
-        query = """
-            SELECT * FROM books
+    async def get_books(self, series_id: int) -> List[Dict[str, Any]]:
+        query = f"""
+            SELECT {CRUDBook.select_columns()} FROM books
             WHERE series_id = %s
             ORDER BY series_number, publication_year
         """
-        return execute_query(query, (series_id,))
+        return await execute_query(query, (series_id,))
 
 
 crud_book = CRUDBook()
@@ -1,41 +1,630 @@
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from cache import LRUCache
 from config import settings
+from metrics import observe_query, observe_pool_acquire, register_pool, current_operation
+import hashlib
+import random
+import re
+import threading
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+_SQL_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_PLACEHOLDER = re.compile(r"%(?:\(\w+\))?s")
+_SQL_NUMBER = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?\b")
+_SQL_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_SQL_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    """Текст запроса без комментариев и литералов: запросы, различающиеся только
+    значениями, получают один отпечаток."""
+    query = _SQL_COMMENT.sub(" ", query)
+    query = _SQL_STRING.sub("?", query)
+    query = _SQL_PLACEHOLDER.sub("?", query)
+    query = _SQL_NUMBER.sub("?", query)
+    query = _SQL_LIST.sub("?, ...", query)
+    return _SQL_SPACE.sub(" ", query).strip()
+
+
+def redact_params(params: Any, mode: str) -> Any:
+    """Параметры для журнала: full - как есть, redacted - строки заменяются длиной, none - не пишутся."""
+    if params is None or mode == "none":
+        return None
+    return _loggable(params, mode == "full")
+
+
+def _loggable(value: Any, full: bool) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (Decimal, date, datetime)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(value)}>"
+    if isinstance(value, str):
+        return value[:500] if full else f"<str:{len(value)}>"
+    if isinstance(value, dict):
+        return {key: _loggable(item, full) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_loggable(item, full) for item in value[:20]]
+        return items + [f"... {len(value) - 20} more"] if len(value) > 20 else items
+    return f"<{type(value).__name__}>"
+
+
+class SlowQueryLog:
+    """Статистика запросов по отпечаткам и кольцевой буфер медленных запросов.
+
+    Каждый выполненный запрос учитывается в статистике своего отпечатка (число
+    вызовов, суммарное и максимальное время). Запросы дольше threshold_ms
+    попадают в буфер и в лог; для доли explain_sample_rate из них (только
+    SELECT/WITH, не чаще раза в explain_interval секунд на отпечаток и не больше
+    одного одновременно) вызывающий слой снимает EXPLAIN (ANALYZE, BUFFERS).
+    Методы потокобезопасны: запросы синхронного пула идут из потоков.
+    """
+
+    def __init__(self, threshold_ms: float, max_entries: int, max_fingerprints: int, max_plans: int,
+                 params_mode: str = "redacted", explain_sample_rate: float = 0.0,
+                 explain_interval: float = 300.0):
+        self.threshold = threshold_ms / 1000
+        self.params_mode = params_mode
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval = explain_interval
+        self._entries = deque(maxlen=max_entries)
+        self._plans = deque(maxlen=max_plans)
+        self._stats = LRUCache(max_fingerprints)
+        self._normalized = LRUCache(max_fingerprints)
+        self._explained_at: Dict[str, float] = {}
+        self._explaining = False
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def observe(self, query, params: Any, duration: float, rowcount: int) -> Optional[Dict[str, Any]]:
+        """Учитывает выполненный запрос. Возвращает запись буфера, если для запроса нужно снять план."""
+        if not self.enabled:
+            return None
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        elif not isinstance(query, str):
+            query = str(query)
+
+        with self._lock:
+            normalized = self._normalized.get(query)
+        if normalized is None:
+            text = normalize_sql(query)
+            normalized = (hashlib.sha1(text.encode()).hexdigest()[:16], text)
+            with self._lock:
+                self._normalized.set(query, normalized)
+        fingerprint, text = normalized
+        slow = duration >= self.threshold
+
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                stats = {"fingerprint": fingerprint, "query": text, "calls": 0, "slow_calls": 0,
+                         "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+                self._stats.set(fingerprint, stats)
+            stats["calls"] += 1
+            stats["total_ms"] += duration * 1000
+            stats["max_ms"] = max(stats["max_ms"], duration * 1000)
+            stats["rows"] += max(rowcount, 0)
+            if not slow:
+                return None
+            stats["slow_calls"] += 1
+
+            entry = {
+                "id": self._next_id,
+                "fingerprint": fingerprint,
+                "operation": current_operation.get(),
+                "query": text,
+                "params": redact_params(params, self.params_mode),
+                "duration_ms": round(duration * 1000, 3),
+                "rows": rowcount,
+                "recorded_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._next_id += 1
+            self._entries.append(entry)
+            explain = self._should_explain(fingerprint, text)
+
+        logger.warning(
+            f"Slow query {fingerprint} ({entry['operation']}) took {entry['duration_ms']} ms, "
+            f"rows={rowcount}, params={entry['params']}: {text[:500]}"
+        )
+        return entry if explain else None
+
+    def _should_explain(self, fingerprint: str, text: str) -> bool:
+        if self._explaining or random.random() >= self.explain_sample_rate:
+            return False
+        if not text[:6].upper().startswith(("SELECT", "WITH")):
+            return False
+        now = time.monotonic()
+        if now - self._explained_at.get(fingerprint, float("-inf")) < self.explain_interval:
+            return False
+        if len(self._explained_at) >= self._stats.max_entries:
+            self._explained_at.clear()
+        self._explained_at[fingerprint] = now
+        self._explaining = True
+        return True
+
+    def add_plan(self, entry: Dict[str, Any], plan: str):
+        with self._lock:
+            self._plans.append({
+                "entry_id": entry["id"],
+                "fingerprint": entry["fingerprint"],
+                "operation": entry["operation"],
+                "query": entry["query"],
+                "params": entry["params"],
+                "duration_ms": entry["duration_ms"],
+                "plan": plan,
+                "captured_at": datetime.now(timezone.utc).isoformat(),
+            })
+
+    def finish_explain(self):
+        with self._lock:
+            self._explaining = False
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(reversed(self._entries))
+            plans = list(reversed(self._plans))
+            stats = [dict(item) for item in self._stats.values()]
+        stats.sort(key=lambda item: item["total_ms"], reverse=True)
+        for item in stats:
+            item["mean_ms"] = round(item["total_ms"] / item["calls"], 3)
+            item["total_ms"] = round(item["total_ms"], 3)
+            item["max_ms"] = round(item["max_ms"], 3)
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "entries": entries,
+            "top_fingerprints": stats[:top],
+            "plans": plans,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+            self._stats.clear()
+            self._explained_at.clear()
+
+
+slow_query_log = SlowQueryLog(
+    settings.SLOW_QUERY_THRESHOLD_MS,
+    settings.SLOW_QUERY_LOG_SIZE,
+    settings.SLOW_QUERY_MAX_FINGERPRINTS,
+    settings.SLOW_QUERY_MAX_PLANS,
+    settings.SLOW_QUERY_PARAMS,
+    settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    settings.SLOW_QUERY_EXPLAIN_INTERVAL,
+)
+
+
+def explain_statement(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode()
+    return f"EXPLAIN (ANALYZE, BUFFERS) {query}"
+
+
+def _capture_plan(entry: Dict[str, Any], query, params):
+    """Снимает план медленного запроса на отдельном соединении в read-only транзакции,
+    чтобы повторное выполнение не могло ничего изменить."""
+    try:
+        pool = get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            # Обычный курсор: сам EXPLAIN в метрики и журнал не попадает
+            with conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION READ ONLY")
+                cursor.execute(f"SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}")
+                cursor.execute(explain_statement(query), params)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+        except psycopg2.Error as e:
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            logger.warning(f"EXPLAIN for slow query {entry['fingerprint']} failed: {e}")
+            return
+        finally:
+            pool.putconn(conn, discard=broken)
+        slow_query_log.add_plan(entry, plan)
+    except Exception as e:
+        logger.warning(f"EXPLAIN for slow query {entry['fingerprint']} failed: {e}")
+    finally:
+        slow_query_log.finish_explain()
+
+
+class InstrumentedDictCursor(RealDictCursor):
+    """RealDictCursor, передающий в metrics и журнал медленных запросов время и число строк."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            duration = time.perf_counter() - started
+            observe_query(duration, self.rowcount)
+            entry = slow_query_log.observe(query, vars, duration, self.rowcount)
+            if entry is not None:
+                threading.Thread(target=_capture_plan, args=(entry, query, vars), daemon=True).start()
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeoutError(PoolError):
+    pass
+
+
+class PoolClosedError(PoolError):
+    pass
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used", "uses")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class ConnectionPool:
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, timeout: float = 30.0,
+                 max_age: float = 0, max_uses: int = 0, health_check_interval: float = 30.0):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+    def open(self):
+        # Слот резервируется на каждое соединение отдельно: при ошибке _connect()
+        # возвращается только он, а уже открытые соединения остаются в пуле
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                item = self._connect()
+            except Exception:
+                self._release_slot()
+                raise
+            with self._cond:
+                self._idle.append(item)
+                self._cond.notify()
+
+    def getconn(self):
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            item = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosedError("Connection pool is closed")
+                    if self._idle:
+                        item = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.timeout}s waiting for a database connection "
+                            f"(pool size {self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if item is None:
+                try:
+                    item = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+            elif not self._is_usable(item):
+                self._discard(item)
+                continue
+
+            item.uses += 1
+            with self._cond:
+                self._in_use[id(item.conn)] = item
+            observe_pool_acquire("sync", time.perf_counter() - started)
+            return item.conn
+
+    def putconn(self, conn, discard: bool = False):
+        with self._cond:
+            item = self._in_use.pop(id(conn), None)
+
+        if item is None:
+            logger.warning("Returned connection does not belong to the pool, closing it")
+            self._close_quietly(conn)
+            return
+
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        if discard or conn.closed or self._closed or self._is_expired(item):
+            self._discard(item)
+            return
+
+        item.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for item in idle:
+            self._discard(item)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+    def _connect(self) -> _PooledConnection:
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = False
+        return _PooledConnection(conn)
+
+    def _is_expired(self, item: _PooledConnection) -> bool:
+        if self.max_age and time.monotonic() - item.created_at >= self.max_age:
+            return True
+        return bool(self.max_uses) and item.uses >= self.max_uses
+
+    def _is_usable(self, item: _PooledConnection) -> bool:
+        if item.conn.closed or self._is_expired(item):
+            return False
+        if time.monotonic() - item.last_used < self.health_check_interval:
+            return True
+
+        try:
+            with item.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            item.conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding broken pooled connection: {e}")
+            return False
+
+    def _discard(self, item: _PooledConnection):
+        self._close_quietly(item.conn)
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool(
+                settings.DATABASE_URL,
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_POOL_MAX_SIZE,
+                timeout=settings.DB_POOL_TIMEOUT,
+                max_age=settings.DB_POOL_MAX_AGE,
+                max_uses=settings.DB_POOL_MAX_USES,
+                health_check_interval=settings.DB_POOL_HEALTH_CHECK_INTERVAL,
+            )
+            pool.open()
+            _pool = pool
+        return _pool
+
+
+def get_pool() -> ConnectionPool:
+    return _pool or init_pool()
+
+
+register_pool("sync", lambda: _pool.stats() if _pool is not None else None)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.close()
+
+
+class DBSession:
+    """Одно соединение и одна транзакция на всю единицу работы (обычно HTTP-запрос)."""
+
+    def __init__(self, pool: Optional[ConnectionPool] = None):
+        self._pool = pool
+        self._conn = None
+        self._broken = False
+        self.rollback_only = False
+
+    @property
+    def active(self) -> bool:
+        return self._conn is not None
+
+    @property
+    def connection(self):
+        if self._conn is None:
+            self._pool = self._pool or get_pool()
+            self._conn = self._pool.getconn()
+        return self._conn
+
+    def mark_failed(self, error: Exception):
+        self.rollback_only = True
+        if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            self._broken = True
+
+    def commit(self):
+        if self._conn is None:
+            return
+        if self.rollback_only:
+            self.rollback()
+            return
+        self._conn.commit()
+
+    def rollback(self):
+        if self._conn is not None and not self._conn.closed:
+            try:
+                self._conn.rollback()
+            except psycopg2.Error:
+                self._broken = True
+        self.rollback_only = False
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.putconn(conn, discard=self._broken)
+
+
+_current_session: ContextVar[Optional[DBSession]] = ContextVar("db_session", default=None)
+
+
+def get_current_session() -> Optional[DBSession]:
+    return _current_session.get()
+
+
+def set_current_session(session: Optional[DBSession]):
+    return _current_session.set(session)
+
+
+def reset_current_session(token):
+    _current_session.reset(token)
+
+
+@contextmanager
+def db_session():
+    current = _current_session.get()
+    if current is not None:
+        yield current
+        return
+
+    session = DBSession()
+    token = _current_session.set(session)
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        _current_session.reset(token)
+        session.close()
+
+
 @contextmanager
 def get_db_connection():
-    conn = None
+    session = _current_session.get()
+    if session is not None:
+        conn = session.connection
+        try:
+            yield conn
+        except Exception as e:
+            session.mark_failed(e)
+            logger.error(f"Database error: {e}")
+            raise
+        return
+
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
     try:
-        conn = psycopg2.connect(settings.DATABASE_URL)
-        conn.autocommit = False
         yield conn
         conn.commit()
     except Exception as e:
-        if conn:
-            conn.rollback()
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
         logger.error(f"Database error: {e}")
         raise
     finally:
-        if conn:
-            conn.close()
+        pool.putconn(conn, discard=broken)
 
 @contextmanager
 def get_db_cursor(commit=True):
     with get_db_connection() as conn:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(cursor_factory=InstrumentedDictCursor)
         try:
             yield cursor
-            if commit:
+            # Внутри сессии фиксацией транзакции управляет сама сессия
+            if commit and _current_session.get() is None:
                 conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Cursor error: {e}")
-            raise
         finally:
             cursor.close()
 
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from async_database import execute_query, set_current_session, reset_current_session
+from config import settings
+
+
+class GenreTree:
+    """Снимок дерева жанров в памяти процесса.
+
+    При обходе в глубину каждому жанру назначается интервал [tin, tout] (Euler tour):
+    жанр a лежит в поддереве b тогда и только тогда, когда tin[b] <= tin[a] <= tout[b].
+    Множества потомков считаются заранее, поэтому подбор поддерева для фильтра - O(1).
+    """
+
+    def __init__(self, genres: List[Dict[str, Any]]):
+        self.genres = {genre['genre_id']: genre for genre in genres}
+        self.parent: Dict[int, Optional[int]] = {}
+        self.children: Dict[Optional[int], List[int]] = defaultdict(list)
+        for genre in sorted(genres, key=lambda g: (g['genre_name'], g['genre_id'])):
+            self.parent[genre['genre_id']] = genre['parent_genre_id']
+            self.children[genre['parent_genre_id']].append(genre['genre_id'])
+
+        self.tin: Dict[int, int] = {}
+        self.tout: Dict[int, int] = {}
+        self.level: Dict[int, int] = {}
+        self.order: List[int] = []
+        # Как и рекурсивный CTE, обход начинается от корней: жанры в циклах
+        # parent_genre_id в дерево не попадают
+        stack = [(genre_id, 0, False) for genre_id in reversed(self.children[None])]
+        while stack:
+            genre_id, level, leaving = stack.pop()
+            if leaving:
+                self.tout[genre_id] = len(self.order) - 1
+                continue
+            self.tin[genre_id] = len(self.order)
+            self.level[genre_id] = level
+            self.order.append(genre_id)
+            stack.append((genre_id, level, True))
+            stack.extend((child, level + 1, False) for child in reversed(self.children[genre_id]))
+
+        self.descendants: Dict[int, List[int]] = {
+            genre_id: self.order[self.tin[genre_id]:self.tout[genre_id] + 1] for genre_id in self.order
+        }
+        self._hierarchy = [
+            {**self.genres[genre_id], "level": self.level[genre_id]}
+            for genre_id in sorted(self.order, key=lambda g: (self.level[g], self.genres[g]['genre_name']))
+        ]
+
+    def subtree_ids(self, genre_id: int) -> List[int]:
+        """Жанр и все его потомки; неизвестный жанр - только он сам."""
+        return self.descendants.get(genre_id, [genre_id])
+
+    def is_descendant(self, genre_id: int, ancestor_id: int) -> bool:
+        if genre_id not in self.tin or ancestor_id not in self.tin:
+            return False
+        return self.tin[ancestor_id] <= self.tin[genre_id] <= self.tout[ancestor_id]
+
+    def hierarchy(self) -> List[Dict[str, Any]]:
+        """Жанры в порядке уровня и названия - как в прежнем рекурсивном запросе."""
+        return self._hierarchy
+
+
+_tree: Optional[GenreTree] = None
+_loaded_at = 0.0
+_generation = 0
+_lock = asyncio.Lock()
+
+
+async def get_genre_tree() -> GenreTree:
+    # TTL нужен для остальных воркеров: invalidate_genre_tree сбрасывает дерево
+    # только в процессе, где прошла запись
+    if _tree is not None and time.monotonic() - _loaded_at < settings.GENRE_TREE_TTL:
+        return _tree
+
+    async with _lock:
+        if _tree is not None and time.monotonic() - _loaded_at < settings.GENRE_TREE_TTL:
+            return _tree
+        return await _load()
+
+
+async def _load() -> GenreTree:
+    global _tree, _loaded_at
+    generation = _generation
+    # Дерево читается вне сессии запроса, чтобы в общий снимок не попали
+    # незафиксированные изменения текущей транзакции
+    token = set_current_session(None)
+    try:
+        rows = await execute_query(
+            "SELECT genre_id, genre_name, description, parent_genre_id, created_at FROM genres"
+        )
+    finally:
+        reset_current_session(token)
+
+    tree = GenreTree(rows)
+    if generation == _generation:
+        _tree, _loaded_at = tree, time.monotonic()
+    return tree
+
+
+def invalidate_genre_tree():
+    global _tree, _generation
+    _tree = None
+    _generation += 1
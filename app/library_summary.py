@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any, Dict
+from async_database import execute_query, get_db_cursor
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки: из нескольких воркеров плановое обновление выполняет один
+SUMMARY_REFRESH_LOCK = 0x4C4942
+
+_refresh_lock = asyncio.Lock()
+
+
+async def refresh_library_summary(skip_if_busy: bool = False) -> bool:
+    """Пересчитывает library_summary без блокировки читателей (CONCURRENTLY).
+
+    С skip_if_busy обновление пропускается, если его уже выполняет другой процесс.
+    """
+    async with _refresh_lock:
+        async with get_db_cursor() as cursor:
+            if skip_if_busy:
+                await cursor.execute("SELECT pg_try_advisory_xact_lock(%s) as locked", (SUMMARY_REFRESH_LOCK,))
+                if not (await cursor.fetchone())['locked']:
+                    return False
+            else:
+                await cursor.execute("SELECT pg_advisory_xact_lock(%s)", (SUMMARY_REFRESH_LOCK,))
+            await cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY library_summary")
+    return True
+
+
+async def get_library_summary(fresh: bool = False) -> Dict[str, Any]:
+    if fresh:
+        await refresh_library_summary()
+
+    summary = await execute_query("SELECT * FROM library_summary", fetch_one=True)
+    refreshed_at = summary['refreshed_at']
+    return {
+        "total_books": summary['total_books'],
+        "books_by_status": {item['status']: item['count'] for item in summary['books_by_status']},
+        "top_genres": summary['top_genres'],
+        "top_authors": summary['top_authors'],
+        "average_rating": float(summary['average_rating'] or 0),
+        "total_reviews": summary['total_reviews'],
+        "refreshed_at": refreshed_at,
+        "stale_after": refreshed_at + timedelta(seconds=settings.LIBRARY_SUMMARY_REFRESH_INTERVAL),
+    }
+
+
+async def run_summary_refresher():
+    """Фоновая задача lifespan: обновляет сводку каждые LIBRARY_SUMMARY_REFRESH_INTERVAL секунд."""
+    while True:
+        await asyncio.sleep(settings.LIBRARY_SUMMARY_REFRESH_INTERVAL)
+        try:
+            await refresh_library_summary(skip_if_busy=True)
+        except Exception as e:
+            logger.error(f"Library summary refresh failed: {e}")
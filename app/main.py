@@ -1,6 +1,18 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import books, authors, genres, publishers, readers, reviews
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from routers import books, authors, genres, publishers, readers, reviews, debug
+from database import close_pool as close_sync_pool, PoolTimeoutError
+from async_database import init_pool, close_pool
+from pagination import InvalidCursorError
+from middleware import DBSessionMiddleware
+from response_cache import ResponseCacheMiddleware, log_backend_status
+from passwords import password_hasher, PasswordHasherBusyError
+from library_summary import run_summary_refresher
+from metrics import MetricsMiddleware, registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 import logging
 
 logging.basicConfig(
@@ -8,19 +20,42 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_backend_status()
+    await init_pool()
+    summary_refresher = asyncio.create_task(run_summary_refresher())
+    yield
+    summary_refresher.cancel()
+    with suppress(asyncio.CancelledError):
+        await summary_refresher
+    await close_pool()
+    # Синхронный пул открывается лениво, только если им воспользовались скрипты или фоновые задачи
+    await run_in_threadpool(close_sync_pool)
+    await run_in_threadpool(password_hasher.shutdown)
+
+
 app = FastAPI(
     title="Personal Library API",
     description="API для управления личной библиотекой",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+app.add_middleware(DBSessionMiddleware)
+# Снаружи сессии БД: попадания в кэш не открывают транзакцию
+app.add_middleware(ResponseCacheMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Cache"],
 )
+# Самый внешний слой: время ответа включает попадания в кэш и CORS
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(books.router, prefix="/api/books", tags=["books"])
 app.include_router(authors.router, prefix="/api/authors", tags=["authors"])
@@ -28,6 +63,23 @@ app.include_router(genres.router, prefix="/api/genres", tags=["genres"])
 app.include_router(publishers.router, prefix="/api/publishers", tags=["publishers"])
 app.include_router(readers.router, prefix="/api/readers", tags=["readers"])
 app.include_router(reviews.router, prefix="/api/reviews", tags=["reviews"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"], include_in_schema=False)
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": "Database is busy, try again later"})
+
+@app.exception_handler(PasswordHasherBusyError)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusyError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many authentication requests, try again later"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
 
 @app.get("/")
 async def root():
@@ -41,6 +93,10 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,261 @@
+import hashlib
+import io
+import logging
+import re
+from typing import AsyncIterator, Optional, Tuple
+from fastapi import HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from async_database import execute_query, release_connection
+from cache import LRUCache
+from config import settings
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow нужен только для миниатюр
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MediaStore:
+    """Бинарное изображение в BYTEA-колонке `blob_column` таблицы `table`.
+
+    Рядом хранятся sha256 (он же ETag), размер, content type и миниатюра:
+    <blob>_sha256, <blob>_size, <blob>_content_type, <blob>_thumbnail.
+    Содержимое читается и пишется окнами по MEDIA_CHUNK_SIZE байт.
+    """
+
+    def __init__(self, table: str, id_column: str, blob_column: str):
+        self.table = table
+        self.id_column = id_column
+        self.blob_column = blob_column
+
+    async def get_meta(self, entity_id: int) -> Optional[dict]:
+        query = f"""
+            SELECT {self.blob_column}_sha256 as sha256,
+                   {self.blob_column}_size as size,
+                   {self.blob_column}_content_type as content_type
+            FROM {self.table}
+            WHERE {self.id_column} = %s
+        """
+        return await execute_query(query, (entity_id,), fetch_one=True)
+
+    async def iter_content(self, entity_id: int, sha256: str, start: int, end: int) -> AsyncIterator[bytes]:
+        # Каждое окно читается отдельным запросом с проверкой хэша: если изображение
+        # заменили посреди передачи, поток обрывается, а не склеивает две версии
+        query = f"""
+            SELECT substring({self.blob_column} FROM %s FOR %s) as chunk
+            FROM {self.table}
+            WHERE {self.id_column} = %s AND {self.blob_column}_sha256 = %s
+        """
+        offset = start
+        while offset <= end:
+            length = min(settings.MEDIA_CHUNK_SIZE, end - offset + 1)
+            row = await execute_query(query, (offset + 1, length, entity_id, sha256), fetch_one=True)
+            if row is None or not row['chunk']:
+                logger.warning(f"{self.table}.{self.blob_column} #{entity_id} changed while streaming")
+                return
+            # Пока клиент читает окно, соединение не держится (idle in transaction)
+            await release_connection()
+            yield bytes(row['chunk'])
+            offset += length
+
+    async def store(self, entity_id: int, upload: UploadFile) -> Optional[dict]:
+        content_type = upload.content_type or "application/octet-stream"
+        if not content_type.startswith("image/"):
+            raise HTTPException(status_code=415, detail="Only image uploads are supported")
+
+        digest = hashlib.sha256()
+        size = 0
+        seq = 0
+
+        await execute_query("""
+            CREATE TEMP TABLE IF NOT EXISTS media_upload_chunks (
+                seq INTEGER PRIMARY KEY,
+                data BYTEA NOT NULL
+            ) ON COMMIT DROP
+        """, fetch_all=False)
+        await execute_query("TRUNCATE media_upload_chunks", fetch_all=False)
+
+        while True:
+            chunk = await upload.read(settings.MEDIA_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.MEDIA_MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Image exceeds {settings.MEDIA_MAX_UPLOAD_BYTES} bytes"
+                )
+            digest.update(chunk)
+            await execute_query(
+                "INSERT INTO media_upload_chunks (seq, data) VALUES (%s, %s)",
+                (seq, chunk),
+                fetch_all=False
+            )
+            seq += 1
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+
+        await upload.seek(0)
+        thumbnail = await run_in_threadpool(make_thumbnail, upload.file)
+
+        # Изображение собирается из кусков на стороне Postgres, в памяти процесса
+        # одновременно находится не больше одного окна
+        blob = self.blob_column
+        query = f"""
+            UPDATE {self.table}
+            SET {blob} = c.data,
+                {blob}_sha256 = %s,
+                {blob}_size = %s,
+                {blob}_content_type = %s,
+                {blob}_thumbnail = %s
+            FROM (SELECT string_agg(data, ''::bytea ORDER BY seq) as data FROM media_upload_chunks) c
+            WHERE {self.id_column} = %s
+            RETURNING {blob}_sha256 as sha256, {blob}_size as size, {blob}_content_type as content_type
+        """
+        meta = await execute_query(
+            query,
+            (digest.hexdigest(), size, content_type, thumbnail, entity_id),
+            fetch_one=True
+        )
+        await execute_query("DROP TABLE IF EXISTS media_upload_chunks", fetch_all=False)
+        return meta
+
+    async def delete(self, entity_id: int) -> bool:
+        blob = self.blob_column
+        query = f"""
+            UPDATE {self.table}
+            SET {blob} = NULL, {blob}_sha256 = NULL, {blob}_size = NULL,
+                {blob}_content_type = NULL, {blob}_thumbnail = NULL
+            WHERE {self.id_column} = %s
+        """
+        return await execute_query(query, (entity_id,), fetch_all=False) > 0
+
+    async def get_thumbnail(self, entity_id: int) -> Optional[Tuple[str, bytes]]:
+        query = f"""
+            SELECT {self.blob_column}_sha256 as sha256
+            FROM {self.table}
+            WHERE {self.id_column} = %s
+        """
+        row = await execute_query(query, (entity_id,), fetch_one=True)
+        if row is None or row['sha256'] is None:
+            return None
+
+        key = (self.table, self.blob_column, entity_id, row['sha256'])
+        thumbnail = _thumbnail_cache.get(key)
+        if thumbnail is None:
+            query = f"""
+                SELECT {self.blob_column}_thumbnail as thumbnail
+                FROM {self.table}
+                WHERE {self.id_column} = %s AND {self.blob_column}_sha256 = %s
+            """
+            row = await execute_query(query, (entity_id, key[-1]), fetch_one=True)
+            if row is None or row['thumbnail'] is None:
+                return None
+            thumbnail = bytes(row['thumbnail'])
+            _thumbnail_cache.set(key, thumbnail)
+        return key[-1], thumbnail
+
+
+_thumbnail_cache = LRUCache(settings.MEDIA_THUMBNAIL_CACHE_SIZE)
+
+book_covers = MediaStore("books", "book_id", "cover_image")
+author_photos = MediaStore("authors", "author_id", "photo")
+reader_avatars = MediaStore("readers", "reader_id", "avatar")
+
+
+def make_thumbnail(file) -> Optional[bytes]:
+    if Image is None:
+        return None
+    size = (settings.MEDIA_THUMBNAIL_SIZE, settings.MEDIA_THUMBNAIL_SIZE)
+    try:
+        with Image.open(file) as image:
+            image.draft("RGB", size)
+            image.thumbnail(size)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=85, optimize=True)
+            return output.getvalue()
+    except Exception as e:
+        logger.warning(f"Could not build thumbnail: {e}")
+        return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise HTTPException(
+            status_code=416, detail="Only single byte ranges are supported",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416, detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def serve_media(store: MediaStore, entity_id: int, request: Request) -> Response:
+    meta = await store.get_meta(entity_id)
+    if meta is None or meta['sha256'] is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{meta["sha256"]}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = meta['size']
+    byte_range = parse_range(request.headers.get("range"), size)
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        store.iter_content(entity_id, meta['sha256'], start, end),
+        status_code=status_code,
+        media_type=meta['content_type'],
+        headers=headers
+    )
+
+
+async def serve_thumbnail(store: MediaStore, entity_id: int, request: Request) -> Response:
+    result = await store.get_thumbnail(entity_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    sha256, thumbnail = result
+    etag = f'"{sha256}-t{settings.MEDIA_THUMBNAIL_SIZE}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=thumbnail, media_type="image/jpeg", headers=headers)
\ No newline at end of file
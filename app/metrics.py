@@ -0,0 +1,312 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import settings
+
+try:
+    from anyio.to_thread import current_default_thread_limiter
+except ImportError:  # anyio приходит вместе со Starlette, но метрика пула потоков необязательна
+    current_default_thread_limiter = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Метрика: (имя, тип, описание, [(суффикс, метки, значение), ...])
+Sample = Tuple[str, Dict[str, str], float]
+MetricFamily = Tuple[str, str, str, List[Sample]]
+
+# CRUD-операция, от имени которой сейчас выполняются запросы ("CRUDBook.get_with_details")
+current_operation: ContextVar[str] = ContextVar("db_operation", default="other")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if not labels:
+        return f"{name} {_format_value(value)}"
+    rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+    return f"{name}{{{rendered}}} {_format_value(value)}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            values = list(self._values.items())
+        samples = [("", dict(zip(self.labelnames, labels)), value) for labels, value in values]
+        return self.name, "counter", self.documentation, samples
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин.
+
+    observe - поиск корзины бинарным поиском и пара сложений под блокировкой:
+    запросы синхронного пула приходят из потоков, а не только из event loop.
+    Счетчики корзин хранятся некумулятивно и суммируются только при выдаче.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики корзин (+Inf последней), сумма]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+
+        samples: List[Sample] = []
+        for labels, counts, total in snapshot:
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", {**base, "le": _format_value(bound)}, cumulative))
+            samples.append(("_sum", base, total))
+            samples.append(("_count", base, cumulative))
+        return self.name, "histogram", self.documentation, samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """collector вызывается при каждом опросе и возвращает текущие значения (gauge и т.п.)."""
+        self._collectors.append(collector)
+        return collector
+
+    def collect(self) -> Iterable[MetricFamily]:
+        for metric in self._metrics:
+            yield metric.collect()
+        for collector in self._collectors:
+            yield from collector()
+
+    def render(self) -> str:
+        lines = []
+        for name, kind, documentation, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape(documentation)}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(_format_sample(name + suffix, labels, value) for suffix, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time by CRUD operation",
+    ("operation",), DB_BUCKETS,
+))
+db_query_rows = registry.register(Counter(
+    "db_query_rows_total", "Rows returned or affected by SQL statements by CRUD operation",
+    ("operation",),
+))
+db_pool_acquire_duration = registry.register(Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a pooled database connection",
+    ("pool",), DB_BUCKETS,
+))
+
+
+def observe_query(duration: float, rowcount: int):
+    if settings.METRICS_ENABLED:
+        labels = (current_operation.get(),)
+        db_query_duration.observe(duration, labels)
+        if rowcount > 0:
+            db_query_rows.inc(labels, rowcount)
+
+
+def observe_pool_acquire(pool: str, duration: float):
+    if settings.METRICS_ENABLED:
+        db_pool_acquire_duration.observe(duration, (pool,))
+
+
+def gauge(name: str, documentation: str, samples: List[Sample]) -> MetricFamily:
+    return name, "gauge", documentation, samples
+
+
+def counter(name: str, documentation: str, samples: List[Sample]) -> MetricFamily:
+    return name, "counter", documentation, samples
+
+
+_pool_stats: Dict[str, Callable[[], Optional[dict]]] = {}
+
+
+def register_pool(name: str, stats: Callable[[], Optional[dict]]):
+    """stats возвращает словарь ConnectionPool.stats() или None, если пул не открыт."""
+    _pool_stats[name] = stats
+
+
+@registry.register_collector
+def _pool_metrics() -> List[MetricFamily]:
+    connections: List[Sample] = []
+    max_size: List[Sample] = []
+    waiting: List[Sample] = []
+    for name, stats in _pool_stats.items():
+        current = stats()
+        if current is None:
+            continue
+        connections.append(("", {"pool": name, "state": "idle"}, current["idle"]))
+        connections.append(("", {"pool": name, "state": "in_use"}, current["in_use"]))
+        max_size.append(("", {"pool": name}, current["max_size"]))
+        waiting.append(("", {"pool": name}, current["waiting"]))
+    return [
+        gauge("db_pool_connections", "Open pooled connections by state", connections),
+        gauge("db_pool_max_size", "Configured maximum pool size", max_size),
+        gauge("db_pool_waiting", "Callers waiting for a pooled connection", waiting),
+    ]
+
+
+@registry.register_collector
+def _threadpool_metrics() -> List[MetricFamily]:
+    # Лимитер привязан к event loop, поэтому опрос возможен только из асинхронного обработчика
+    if current_default_thread_limiter is None:
+        return []
+    try:
+        stats = current_default_thread_limiter().statistics()
+    except Exception:
+        return []
+    return [
+        gauge("threadpool_tokens", "Starlette/anyio worker thread limit", [("", {}, stats.total_tokens)]),
+        gauge("threadpool_tokens_borrowed", "Worker threads currently busy", [("", {}, stats.borrowed_tokens)]),
+        gauge("threadpool_tasks_waiting", "Tasks queued for a worker thread", [("", {}, stats.tasks_waiting)]),
+    ]
+
+
+def instrument_operations(cls):
+    """Оборачивает публичные async-методы класса: запросы внутри них помечаются
+    меткой "Класс.метод" (по фактическому классу объекта, а не по месту определения).
+
+    Вложенный вызов переопределяет метку, поэтому запрос относится к методу, который его выполнил.
+    """
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(attr):
+            continue
+        if getattr(attr, "__instrumented__", False):
+            continue
+        setattr(cls, name, _with_operation(name, attr))
+    return cls
+
+
+def _with_operation(name: str, func):
+    labels: Dict[type, str] = {}
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        owner = type(self)
+        label = labels.get(owner)
+        if label is None:
+            label = labels[owner] = f"{owner.__name__}.{name}"
+        token = current_operation.set(label)
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            current_operation.reset(token)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+class MetricsMiddleware:
+    """Время обработки HTTP-запросов по шаблону маршрута ("/api/books/{book_id}").
+
+    Шаблон берется из endpoint, который роутер Starlette записывает в scope;
+    для ответов, не дошедших до роутера (попадания в кэш), маршрут подбирается
+    сопоставлением. Неизвестные пути собираются под меткой "unmatched", чтобы
+    число рядов не росло вместе с числом URL.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._templates: Optional[Dict[Callable, str]] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                (scope["method"], self._route(scope), f"{status // 100}xx"),
+            )
+
+    def _route(self, scope: Scope) -> str:
+        app = scope.get("app")
+        routes = getattr(app, "routes", None)
+        if routes is None:
+            return "unmatched"
+        if self._templates is None:
+            self._templates = {
+                route.endpoint: route.path for route in routes if hasattr(route, "endpoint")
+            }
+
+        endpoint = scope.get("endpoint")
+        if endpoint in self._templates:
+            return self._templates[endpoint]
+
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
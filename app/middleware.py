@@ -0,0 +1,43 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from async_database import AsyncDBSession, set_current_session, reset_current_session
+
+
+class DBSessionMiddleware:
+    """Привязывает к каждому HTTP-запросу одну сессию БД.
+
+    Транзакция фиксируется до отправки заголовков ответа (read-after-write
+    для клиента) и откатывается, если ответ имеет статус >= 400 или
+    обработчик завершился исключением.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        session = AsyncDBSession()
+        token = set_current_session(session)
+        finished = False
+
+        async def send_wrapper(message: Message):
+            nonlocal finished
+            if message["type"] == "http.response.start" and not finished:
+                finished = True
+                if message["status"] < 400:
+                    await session.commit()
+                else:
+                    await session.rollback()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not finished:
+                await session.rollback()
+            raise
+        finally:
+            reset_current_session(token)
+            await session.close()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from fastapi import Response
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class Page(list):
+    """Строки одной страницы; next_cursor указывает на следующую (None - страниц больше нет)."""
+
+    def __init__(self, rows=(), next_cursor: Optional[str] = None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], limit: int, keys: Sequence[str]) -> "Page":
+        next_cursor = None
+        if rows and len(rows) >= limit:
+            next_cursor = encode_cursor([rows[-1][key] for key in keys])
+        return cls(rows, next_cursor)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Malformed pagination cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError("Pagination cursor does not match this listing")
+    return values
+
+
+def keyset_condition(after: Optional[str], keys: Sequence[str], alias: str = "",
+                     descending: bool = False) -> Tuple[str, list]:
+    # Ключи сортировки сравниваются как кортеж, чтобы Postgres мог дойти до
+    # следующей страницы по индексу, не пропуская OFFSET строк
+    if not after:
+        return "TRUE", []
+    prefix = f"{alias}." if alias else ""
+    columns = ", ".join(f"{prefix}{key}" for key in keys)
+    placeholders = ", ".join(["%s"] * len(keys))
+    operator = "<" if descending else ">"
+    return f"({columns}) {operator} ({placeholders})", decode_cursor(after, len(keys))
+
+
+def set_next_cursor(response: Response, page: List[Any]):
+    next_cursor = getattr(page, "next_cursor", None)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
\ No newline at end of file
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from metrics import registry, gauge, counter
+
+logger = logging.getLogger(__name__)
+
+# min/max совпадают с default, поэтому хэш с любой другой стоимостью считается
+# устаревшим и перехэшируется при следующем входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
+
+
+class PasswordHasherBusyError(Exception):
+    pass
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+class PasswordHasher:
+    """Выполняет bcrypt в отдельном пуле процессов, не занимая event loop и пул потоков.
+
+    Одновременно принимается не больше max_pending задач; следующая ждет места
+    до queue_timeout секунд, после чего получает PasswordHasherBusyError (503).
+    При workers = 0 работа идет в пуле потоков Starlette.
+    """
+
+    def __init__(self, workers: int, max_pending: int, queue_timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+        self._waiting = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._work_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: fork процесса с работающим event loop и открытыми соединениями небезопасен
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func, *args) -> Any:
+        queued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise PasswordHasherBusyError("Password hashing queue is full")
+        finally:
+            self._waiting -= 1
+
+        started_at = time.monotonic()
+        self._wait_seconds += started_at - queued_at
+        self._in_flight += 1
+        try:
+            if self.workers > 0:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_executor(), func, *args)
+            return await run_in_threadpool(func, *args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            self._work_seconds += time.monotonic() - started_at
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """(пароль верен, новый хэш или None, если перехэширование не нужно)"""
+        return await self._run(_verify_and_update, password, password_hash)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "waiting": self._waiting,
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "wait_seconds_total": self._wait_seconds,
+            "work_seconds_total": self._work_seconds,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_MAX_PENDING,
+    settings.PASSWORD_HASH_QUEUE_TIMEOUT,
+)
+
+
+@registry.register_collector
+def _password_hasher_metrics():
+    stats = password_hasher.stats()
+    return [
+        gauge("password_hash_queue_waiting", "bcrypt operations waiting for a slot", [("", {}, stats["waiting"])]),
+        gauge("password_hash_in_flight", "bcrypt operations running", [("", {}, stats["in_flight"])]),
+        gauge("password_hash_max_pending", "bcrypt operations admitted at once", [("", {}, stats["max_pending"])]),
+        counter("password_hash_completed_total", "Finished bcrypt operations", [("", {}, stats["completed"])]),
+        counter("password_hash_rejected_total", "bcrypt operations rejected with 503", [("", {}, stats["rejected"])]),
+        counter("password_hash_wait_seconds_total", "Time bcrypt operations spent queued",
+                [("", {}, stats["wait_seconds_total"])]),
+        counter("password_hash_work_seconds_total", "Time bcrypt operations spent running",
+                [("", {}, stats["work_seconds_total"])]),
+    ]
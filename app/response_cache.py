@@ -0,0 +1,286 @@
+import base64
+import hashlib
+import json
+import logging
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from cache import LRUCache
+from config import settings
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis нужен только для общего кэша между воркерами
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# От каких таблиц зависят списки и поиск роутера. Теги публикуют методы записи CRUD
+# (CRUDBase.after_write): имя таблицы - для списков, "<таблица>:<id>" - для карточек
+ROUTE_TAGS = {
+    "/api/books": ("books", "authors", "genres", "publishers", "series", "reviews"),
+    "/api/authors": ("authors", "books", "genres", "reviews"),
+    "/api/genres": ("genres", "books"),
+    "/api/publishers": ("publishers", "books"),
+    "/api/reviews": ("reviews", "books", "readers"),
+}
+
+# Карточка /api/books/5 зависит только от тега books:5: запись в другие таблицы, меняющая
+# встроенные в карточку данные, публикует его сама (CRUDBase.dependents). Тег "<таблица>:*"
+# сбрасывает все карточки таблицы - для записи мимо CRUD, например импорта
+ROUTE_ENTITIES = {
+    "/api/books": "books",
+    "/api/authors": "authors",
+    "/api/genres": "genres",
+    "/api/publishers": "publishers",
+    "/api/reviews": "reviews",
+}
+
+# Ответы, свежесть которых не определяется тегами
+UNCACHED_PATH_PARTS = ("/statistics/", "/import")
+
+
+class MemoryBackend:
+    """Кэш ответов и версии тегов в памяти процесса.
+
+    Сброс тега виден только этому процессу, поэтому бэкенд используется лишь при
+    одном воркере (WEB_CONCURRENCY = 1); при нескольких нужен RedisBackend.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._entries = LRUCache(max_entries, ttl)
+        self._versions: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, entry: Dict[str, Any]):
+        self._entries.set(key, entry)
+
+    async def get_versions(self, tags: Sequence[str]) -> List[int]:
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    async def bump(self, tags: Iterable[str]):
+        for tag in tags:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+class RedisBackend:
+    """Общий для всех воркеров кэш ответов в Redis."""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "response_cache"):
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(f"{self.prefix}:entry:{key}")
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        entry['body'] = base64.b64decode(entry['body'])
+        return entry
+
+    async def set(self, key: str, entry: Dict[str, Any]):
+        raw = json.dumps({**entry, 'body': base64.b64encode(entry['body']).decode()})
+        await self._redis.set(f"{self.prefix}:entry:{key}", raw, ex=math.ceil(self.ttl))
+
+    async def get_versions(self, tags: Sequence[str]) -> List[int]:
+        values = await self._redis.mget([f"{self.prefix}:tag:{tag}" for tag in tags])
+        return [int(value or 0) for value in values]
+
+    async def bump(self, tags: Iterable[str]):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(f"{self.prefix}:tag:{tag}")
+            await pipe.execute()
+
+
+def _create_backend():
+    if settings.CACHE_REDIS_URL and redis is not None:
+        return RedisBackend(settings.CACHE_REDIS_URL, settings.RESPONSE_CACHE_TTL)
+    if settings.WEB_CONCURRENCY > 1:
+        # Остальные воркеры не узнали бы о записи и отдавали бы устаревшие 200 и 304
+        return None
+    return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL)
+
+
+_backend = _create_backend()
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def log_backend_status():
+    """Вызывается при старте приложения, когда логирование уже настроено."""
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return
+    if settings.CACHE_REDIS_URL and redis is None:
+        logger.warning("redis is not installed, CACHE_REDIS_URL is ignored by the response cache")
+    if _backend is None:
+        logger.warning(
+            f"Response cache is disabled: {settings.WEB_CONCURRENCY} workers (WEB_CONCURRENCY) "
+            f"need the shared backend, set CACHE_REDIS_URL"
+        )
+
+
+async def invalidate_tags(tags: Iterable[str]):
+    if _backend is None:
+        return
+    try:
+        await _backend.bump(list(tags))
+    except Exception as e:
+        # Ответы по этим тегам останутся в кэше до истечения TTL
+        logger.error(f"Response cache invalidation failed: {e}")
+
+
+def entity_tag(table: str, entity_id: Any) -> str:
+    return f"{table}:{entity_id}"
+
+
+def route_tags(path: str) -> Optional[Sequence[str]]:
+    if any(part in path for part in UNCACHED_PATH_PARTS):
+        return None
+    for prefix, tags in ROUTE_TAGS.items():
+        if path == prefix or path.startswith(prefix + "/"):
+            entity_id = path[len(prefix) + 1:]
+            if entity_id.isdecimal():
+                table = ROUTE_ENTITIES[prefix]
+                return entity_tag(table, int(entity_id)), entity_tag(table, "*")
+            return tags
+    return None
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCacheMiddleware:
+    """Кэширует JSON-ответы GET-маршрутов из ROUTE_TAGS и отвечает 304 по If-None-Match.
+
+    Запись в кэше хранит версии тегов на момент начала запроса: если во время
+    его выполнения тег сбросили, запись уже устарела и при следующем чтении
+    будет пропущена. Попадания не доходят до DBSessionMiddleware и не берут
+    соединение из пула.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        tags = None
+        backend = get_backend()
+        if (scope["type"] == "http" and scope["method"] == "GET" and settings.RESPONSE_CACHE_ENABLED
+                and backend is not None):
+            tags = route_tags(scope["path"])
+        if tags is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        if_none_match = headers.get("if-none-match")
+        key = self._key(scope)
+
+        try:
+            versions = await backend.get_versions(tags)
+            entry = None
+            if "no-cache" not in headers.get("cache-control", ""):
+                entry = await backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            await self.app(scope, receive, send)
+            return
+
+        if entry is not None and entry['versions'] == versions:
+            await self._send(send, entry['status'], entry['headers'], entry['body'], entry['etag'],
+                             if_none_match, "HIT")
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if message["status"] != 200 or not content_type.startswith(b"application/json"):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > settings.RESPONSE_CACHE_MAX_BODY:
+                # Слишком большой ответ отдается как есть, без ETag и без кэширования
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks),
+                            "more_body": message.get("more_body", False)})
+                return
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            etag = make_etag(body)
+            response_headers = [
+                [name.decode("latin-1"), value.decode("latin-1")]
+                for name, value in start.get("headers", [])
+                if name.lower() not in (b"content-length", b"etag")
+            ]
+            await self._send(send, start["status"], response_headers, body, etag, if_none_match, "MISS")
+            try:
+                await backend.set(key, {
+                    "versions": versions,
+                    "status": start["status"],
+                    "headers": response_headers,
+                    "body": body,
+                    "etag": etag,
+                })
+            except Exception as e:
+                logger.warning(f"Response cache write failed: {e}")
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _key(scope: Scope) -> str:
+        query = scope.get("query_string", b"").decode("latin-1")
+        params = "&".join(sorted(query.split("&"))) if query else ""
+        return f"{scope['path']}?{params}"
+
+    @staticmethod
+    async def _send(send: Send, status: int, headers: List[List[str]], body: bytes, etag: str,
+                    if_none_match: Optional[str], cache_status: str):
+        raw_headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        raw_headers += [(b"etag", etag.encode()), (b"x-cache", cache_status.encode())]
+        if etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
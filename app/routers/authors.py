@@ -1,47 +1,101 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Body, Response, Request, UploadFile, File
 from typing import List, Optional
-from schemas import Author, AuthorCreate, AuthorUpdate, Book
+from schemas import Author, AuthorCreate, AuthorUpdate, AuthorBatchUpdate, AuthorSuggestion, Book
 from crud import crud_author
+from pagination import set_next_cursor
+from config import settings
+from media import author_photos, serve_media, serve_thumbnail
 
 router = APIRouter()
 
 @router.post("/", response_model=Author)
-def create_author(author: AuthorCreate):
-    db_author = crud_author.create(**author.dict())
+async def create_author(author: AuthorCreate):
+    db_author = await crud_author.create(**author.dict())
     if db_author:
-        return crud_author.get_with_books_count(db_author['author_id'])
+        return await crud_author.get_with_books_count(db_author['author_id'])
     raise HTTPException(status_code=400, detail="Failed to create author")
 
 @router.get("/", response_model=List[Author])
-def read_authors(
+async def read_authors(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
     search: Optional[str] = None
 ):
     if search:
-        return crud_author.search(search)
-    return crud_author.get_all(skip=skip, limit=limit)
+        authors = await crud_author.search(search, skip=skip, limit=limit, after=after)
+    else:
+        authors = await crud_author.get_all(skip=skip, limit=limit, after=after)
+    set_next_cursor(response, authors)
+    return authors
+
+@router.get("/suggest", response_model=List[AuthorSuggestion])
+async def suggest_authors(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50)
+):
+    return await crud_author.suggest(q, limit)
+
+# Пакетные маршруты объявлены до /{author_id}, иначе "batch" попадет в параметр пути
+@router.get("/batch", response_model=List[Author])
+async def read_authors_batch(ids: List[int] = Query(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_author.get_many(ids)
+
+@router.post("/batch", response_model=List[Author])
+async def create_authors_batch(authors: List[AuthorCreate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_author.create_many([author.dict() for author in authors])
+
+@router.put("/batch", response_model=List[Author])
+async def update_authors_batch(authors: List[AuthorBatchUpdate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    updated = await crud_author.update_many([author.dict(exclude_unset=True) for author in authors])
+    return await crud_author.get_many([row['author_id'] for row in updated])
+
+@router.delete("/batch")
+async def delete_authors_batch(ids: List[int] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return {"deleted_ids": await crud_author.delete_many(ids)}
 
 @router.get("/{author_id}", response_model=Author)
-def read_author(author_id: int):
-    db_author = crud_author.get_with_books_count(author_id)
+async def read_author(author_id: int):
+    db_author = await crud_author.get_with_books_count(author_id)
     if db_author is None:
         raise HTTPException(status_code=404, detail="Author not found")
     return db_author
 
 @router.get("/{author_id}/books", response_model=List[Book])
-def read_author_books(author_id: int):
-    return crud_author.get_books(author_id)
+async def read_author_books(author_id: int):
+    return await crud_author.get_books(author_id)
 
 @router.put("/{author_id}", response_model=Author)
-def update_author(author_id: int, author: AuthorUpdate):
-    db_author = crud_author.update(author_id, **author.dict(exclude_unset=True))
+async def update_author(author_id: int, author: AuthorUpdate):
+    db_author = await crud_author.update(author_id, **author.dict(exclude_unset=True))
     if db_author:
-        return crud_author.get_with_books_count(author_id)
+        return await crud_author.get_with_books_count(author_id)
     raise HTTPException(status_code=404, detail="Author not found")
 
 @router.delete("/{author_id}")
-def delete_author(author_id: int):
-    if crud_author.delete(author_id):
+async def delete_author(author_id: int):
+    if await crud_author.delete(author_id):
         return {"message": "Author deleted successfully"}
+    raise HTTPException(status_code=404, detail="Author not found")
+
+@router.get("/{author_id}/photo")
+async def read_author_photo(author_id: int, request: Request):
+    return await serve_media(author_photos, author_id, request)
+
+@router.get("/{author_id}/photo/thumbnail")
+async def read_author_photo_thumbnail(author_id: int, request: Request):
+    return await serve_thumbnail(author_photos, author_id, request)
+
+@router.put("/{author_id}/photo")
+async def upload_author_photo(author_id: int, file: UploadFile = File(...)):
+    meta = await author_photos.store(author_id, file)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Author not found")
+    return meta
+
+@router.delete("/{author_id}/photo")
+async def delete_author_photo(author_id: int):
+    if await author_photos.delete(author_id):
+        return {"message": "Photo deleted successfully"}
     raise HTTPException(status_code=404, detail="Author not found")
\ No newline at end of file
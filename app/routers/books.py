@@ -1,28 +1,59 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Body, Response, Request, UploadFile, File
 from typing import List, Optional
-from schemas import Book, BookCreate, BookUpdate
+from starlette.concurrency import run_in_threadpool
+import io
+from schemas import Book, BookCreate, BookUpdate, BookBatchUpdate
 from crud import crud_book
+from pagination import set_next_cursor
+from config import settings
+from media import book_covers, serve_media, serve_thumbnail
+from bulk_import import BATCH_SIZE, detect_format, import_books
+from library_summary import get_library_summary
+from response_cache import entity_tag, invalidate_tags
+from genre_tree import invalidate_genre_tree
 
 router = APIRouter()
 
 
 @router.post("/", response_model=Book)
-def create_book(book: BookCreate):
+async def create_book(book: BookCreate):
     book_data = book.dict(exclude={'author_ids', 'genre_ids'})
-    db_book = crud_book.create_with_relations(
+    db_book = await crud_book.create_with_relations(
         book_data,
         book.author_ids,
         book.genre_ids
     )
     if db_book:
-        return crud_book.get_with_details(db_book['book_id'])
+        return await crud_book.get_with_details(db_book['book_id'])
     raise HTTPException(status_code=400, detail="Failed to create book")
 
 
+@router.post("/import")
+async def import_books_file(
+        file: UploadFile = File(...),
+        input_format: Optional[str] = Query(None, alias="format", pattern="^(csv|jsonl)$"),
+        batch_size: int = Query(BATCH_SIZE, ge=1, le=50000)
+):
+    # Импорт идет через COPY синхронным драйвером, поэтому выполняется в пуле потоков
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    fmt = input_format or detect_format(file.filename)
+    report = await run_in_threadpool(import_books, stream, fmt, batch_size)
+    # Импорт пишет мимо CRUD и фиксирует пакеты сам, поэтому кэши сбрасываются здесь;
+    # RESOLVE_SQL создает недостающие жанры, так что дерево жанров тоже устаревает
+    if report["imported"]:
+        invalidate_genre_tree()
+    # Новые книги меняют счетчики в карточках уже существующих авторов, жанров и издательств
+    await invalidate_tags(["books", "authors", "genres", "publishers", "series",
+                           *(entity_tag(table, "*") for table in ("authors", "genres", "publishers"))])
+    return report
+
+
 @router.get("/", response_model=List[Book])
-def read_books(
+async def read_books(
+        response: Response,
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
+        after: Optional[str] = None,
         search: Optional[str] = None,
         author_id: Optional[int] = None,
         genre_id: Optional[int] = None,
@@ -30,83 +61,91 @@ def read_books(
         year_to: Optional[int] = None
 ):
     if any([search, author_id, genre_id, year_from, year_to]):
-        return crud_book.search(search, author_id, genre_id, year_from, year_to)
-    return crud_book.get_all(skip=skip, limit=limit)
+        books = await crud_book.search(search, author_id, genre_id, year_from, year_to,
+                                       skip=skip, limit=limit, after=after)
+    else:
+        books = await crud_book.get_all(skip=skip, limit=limit, after=after)
+    set_next_cursor(response, books)
+    return books
+
+
+# Пакетные маршруты объявлены до /{book_id}, иначе "batch" попадет в параметр пути
+@router.get("/batch", response_model=List[Book])
+async def read_books_batch(ids: List[int] = Query(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_book.get_many(ids)
+
+
+@router.post("/batch", response_model=List[Book])
+async def create_books_batch(books: List[BookCreate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    created = await crud_book.create_many_with_relations([book.dict() for book in books])
+    return await crud_book.get_many([row['book_id'] for row in created])
+
+
+@router.put("/batch", response_model=List[Book])
+async def update_books_batch(books: List[BookBatchUpdate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    updated = await crud_book.update_many([book.dict(exclude_unset=True) for book in books])
+    return await crud_book.get_many([row['book_id'] for row in updated])
+
+
+@router.delete("/batch")
+async def delete_books_batch(ids: List[int] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return {"deleted_ids": await crud_book.delete_many(ids)}
 
 
 @router.get("/{book_id}", response_model=Book)
-def read_book(book_id: int):
-    db_book = crud_book.get_with_details(book_id)
+async def read_book(book_id: int):
+    db_book = await crud_book.get_with_details(book_id)
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
     return db_book
 
 
 @router.put("/{book_id}", response_model=Book)
-def update_book(book_id: int, book: BookUpdate):
+async def update_book(book_id: int, book: BookUpdate):
     book_data = book.dict(exclude={'author_ids', 'genre_ids'}, exclude_unset=True)
-    db_book = crud_book.update_with_relations(
+    db_book = await crud_book.update_with_relations(
         book_id,
         book_data,
         book.author_ids,
         book.genre_ids
     )
     if db_book:
-        return crud_book.get_with_details(book_id)
+        return await crud_book.get_with_details(book_id)
     raise HTTPException(status_code=404, detail="Book not found")
 
 
 @router.delete("/{book_id}")
-def delete_book(book_id: int):
-    if crud_book.delete(book_id):
+async def delete_book(book_id: int):
+    if await crud_book.delete(book_id):
         return {"message": "Book deleted successfully"}
     raise HTTPException(status_code=404, detail="Book not found")
 
 
 @router.get("/statistics/summary")
-def get_statistics():
-    total_books = crud_book.count()
-
-    status_query = """
-        SELECT status, COUNT(*) as count
-        FROM books
-        GROUP BY status
-    """
-    from database import execute_query
-    books_by_status = execute_query(status_query)
-
-    genre_query = """
-        SELECT g.genre_name, COUNT(DISTINCT bg.book_id) as count
-        FROM genres g
-        JOIN books_genres bg ON g.genre_id = bg.genre_id
-        GROUP BY g.genre_id, g.genre_name
-        ORDER BY count DESC
-        LIMIT 10
-    """
-    top_genres = execute_query(genre_query)
-
-    author_query = """
-        SELECT CONCAT(a.first_name, ' ', a.last_name) as author_name, 
-               COUNT(DISTINCT ba.book_id) as count
-        FROM authors a
-        JOIN books_authors ba ON a.author_id = ba.author_id
-        GROUP BY a.author_id, author_name
-        ORDER BY count DESC
-        LIMIT 10
-    """
-    top_authors = execute_query(author_query)
-
-    rating_query = """
-        SELECT AVG(rating) as avg_rating, COUNT(*) as total_reviews
-        FROM reviews
-    """
-    rating_stats = execute_query(rating_query, fetch_one=True)
-
-    return {
-        "total_books": total_books,
-        "books_by_status": {item['status']: item['count'] for item in books_by_status},
-        "top_genres": top_genres,
-        "top_authors": top_authors,
-        "average_rating": float(rating_stats['avg_rating'] or 0),
-        "total_reviews": rating_stats['total_reviews']
-    }
\ No newline at end of file
+async def get_statistics(fresh: bool = False):
+    return await get_library_summary(fresh)
+
+
+@router.get("/{book_id}/cover")
+async def read_book_cover(book_id: int, request: Request):
+    return await serve_media(book_covers, book_id, request)
+
+
+@router.get("/{book_id}/cover/thumbnail")
+async def read_book_cover_thumbnail(book_id: int, request: Request):
+    return await serve_thumbnail(book_covers, book_id, request)
+
+
+@router.put("/{book_id}/cover")
+async def upload_book_cover(book_id: int, file: UploadFile = File(...)):
+    meta = await book_covers.store(book_id, file)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return meta
+
+
+@router.delete("/{book_id}/cover")
+async def delete_book_cover(book_id: int):
+    if await book_covers.delete(book_id):
+        return {"message": "Cover deleted successfully"}
+    raise HTTPException(status_code=404, detail="Book not found")
\ No newline at end of file
@@ -0,0 +1,26 @@
+import secrets
+from fastapi import APIRouter, HTTPException, Query, Depends, Header
+from typing import Optional
+from database import slow_query_log
+from config import settings
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    # Без настроенного токена эндпоинты не существуют
+    if not settings.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_debug_token is None or not secrets.compare_digest(x_debug_token, settings.DEBUG_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+router = APIRouter(dependencies=[Depends(require_debug_token)])
+
+@router.get("/slow-queries")
+async def read_slow_queries(top: int = Query(20, ge=1, le=1000)):
+    """Последние медленные запросы, top отпечатков по суммарному времени и снятые планы."""
+    return slow_query_log.snapshot(top)
+
+@router.delete("/slow-queries")
+async def reset_slow_queries():
+    slow_query_log.reset()
+    return {"message": "Slow query log cleared"}
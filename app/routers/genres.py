@@ -1,44 +1,67 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
-from schemas import Genre, GenreCreate, GenreUpdate
+from fastapi import APIRouter, HTTPException, Query, Body, Response
+from typing import List, Optional
+from schemas import Genre, GenreCreate, GenreUpdate, GenreBatchUpdate
 from crud import crud_genre
+from pagination import set_next_cursor
+from config import settings
 
 router = APIRouter()
 
 @router.post("/", response_model=Genre)
-def create_genre(genre: GenreCreate):
-    db_genre = crud_genre.create(**genre.dict())
+async def create_genre(genre: GenreCreate):
+    db_genre = await crud_genre.create(**genre.dict())
     if db_genre:
         return db_genre
     raise HTTPException(status_code=400, detail="Failed to create genre")
 
 @router.get("/", response_model=List[Genre])
-def read_genres(
+async def read_genres(
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None
 ):
-    return crud_genre.get_all(skip=skip, limit=limit)
+    genres = await crud_genre.get_all(skip=skip, limit=limit, after=after)
+    set_next_cursor(response, genres)
+    return genres
 
 @router.get("/hierarchy", response_model=List[Genre])
-def read_genres_hierarchy():
-    return crud_genre.get_hierarchy()
+async def read_genres_hierarchy():
+    return await crud_genre.get_hierarchy()
+
+# Пакетные маршруты объявлены до /{genre_id}, иначе "batch" попадет в параметр пути
+@router.get("/batch", response_model=List[Genre])
+async def read_genres_batch(ids: List[int] = Query(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_genre.get_many(ids)
+
+@router.post("/batch", response_model=List[Genre])
+async def create_genres_batch(genres: List[GenreCreate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_genre.create_many([genre.dict() for genre in genres])
+
+@router.put("/batch", response_model=List[Genre])
+async def update_genres_batch(genres: List[GenreBatchUpdate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_genre.update_many([genre.dict(exclude_unset=True) for genre in genres])
+
+@router.delete("/batch")
+async def delete_genres_batch(ids: List[int] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return {"deleted_ids": await crud_genre.delete_many(ids)}
 
 @router.get("/{genre_id}", response_model=Genre)
-def read_genre(genre_id: int):
-    db_genre = crud_genre.get_with_books_count(genre_id)
+async def read_genre(genre_id: int):
+    db_genre = await crud_genre.get_with_books_count(genre_id)
     if db_genre is None:
         raise HTTPException(status_code=404, detail="Genre not found")
     return db_genre
 
 @router.put("/{genre_id}", response_model=Genre)
-def update_genre(genre_id: int, genre: GenreUpdate):
-    db_genre = crud_genre.update(genre_id, **genre.dict(exclude_unset=True))
+async def update_genre(genre_id: int, genre: GenreUpdate):
+    db_genre = await crud_genre.update(genre_id, **genre.dict(exclude_unset=True))
     if db_genre is None:
         raise HTTPException(status_code=404, detail="Genre not found")
     return db_genre
 
 @router.delete("/{genre_id}")
-def delete_genre(genre_id: int):
-    if crud_genre.delete(genre_id):
+async def delete_genre(genre_id: int):
+    if await crud_genre.delete(genre_id):
         return {"message": "Genre deleted successfully"}
     raise HTTPException(status_code=404, detail="Genre not found")
\ No newline at end of file
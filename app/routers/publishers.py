@@ -1,40 +1,63 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
-from schemas import Publisher, PublisherCreate, PublisherUpdate
+from fastapi import APIRouter, HTTPException, Query, Body, Response
+from typing import List, Optional
+from schemas import Publisher, PublisherCreate, PublisherUpdate, PublisherBatchUpdate
 from crud import crud_publisher
+from pagination import set_next_cursor
+from config import settings
 
 router = APIRouter()
 
 @router.post("/", response_model=Publisher)
-def create_publisher(publisher: PublisherCreate):
-    db_publisher = crud_publisher.create(**publisher.dict())
+async def create_publisher(publisher: PublisherCreate):
+    db_publisher = await crud_publisher.create(**publisher.dict())
     if db_publisher:
         return db_publisher
     raise HTTPException(status_code=400, detail="Failed to create publisher")
 
 @router.get("/", response_model=List[Publisher])
-def read_publishers(
+async def read_publishers(
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None
 ):
-    return crud_publisher.get_all(skip=skip, limit=limit)
+    publishers = await crud_publisher.get_all(skip=skip, limit=limit, after=after)
+    set_next_cursor(response, publishers)
+    return publishers
+
+# Пакетные маршруты объявлены до /{publisher_id}, иначе "batch" попадет в параметр пути
+@router.get("/batch", response_model=List[Publisher])
+async def read_publishers_batch(ids: List[int] = Query(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_publisher.get_many(ids)
+
+@router.post("/batch", response_model=List[Publisher])
+async def create_publishers_batch(publishers: List[PublisherCreate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_publisher.create_many([publisher.dict() for publisher in publishers])
+
+@router.put("/batch", response_model=List[Publisher])
+async def update_publishers_batch(publishers: List[PublisherBatchUpdate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_publisher.update_many([publisher.dict(exclude_unset=True) for publisher in publishers])
+
+@router.delete("/batch")
+async def delete_publishers_batch(ids: List[int] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return {"deleted_ids": await crud_publisher.delete_many(ids)}
 
 @router.get("/{publisher_id}", response_model=Publisher)
-def read_publisher(publisher_id: int):
-    db_publisher = crud_publisher.get_with_books_count(publisher_id)
+async def read_publisher(publisher_id: int):
+    db_publisher = await crud_publisher.get_with_books_count(publisher_id)
     if db_publisher is None:
         raise HTTPException(status_code=404, detail="Publisher not found")
     return db_publisher
 
 @router.put("/{publisher_id}", response_model=Publisher)
-def update_publisher(publisher_id: int, publisher: PublisherUpdate):
-    db_publisher = crud_publisher.update(publisher_id, **publisher.dict(exclude_unset=True))
+async def update_publisher(publisher_id: int, publisher: PublisherUpdate):
+    db_publisher = await crud_publisher.update(publisher_id, **publisher.dict(exclude_unset=True))
     if db_publisher is None:
         raise HTTPException(status_code=404, detail="Publisher not found")
     return db_publisher
 
 @router.delete("/{publisher_id}")
-def delete_publisher(publisher_id: int):
-    if crud_publisher.delete(publisher_id):
+async def delete_publisher(publisher_id: int):
+    if await crud_publisher.delete(publisher_id):
         return {"message": "Publisher deleted successfully"}
     raise HTTPException(status_code=404, detail="Publisher not found")
\ No newline at end of file
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Depends, Response, Request, UploadFile, File
+from typing import List, Optional
 from schemas import Reader, ReaderCreate, ReaderUpdate
 from crud import crud_reader
-from database import execute_query
+from pagination import set_next_cursor
+from async_database import execute_query
+from media import reader_avatars, serve_media, serve_thumbnail
 
 router = APIRouter()
 
 
 @router.post("/register", response_model=Reader)
-def register_reader(reader: ReaderCreate):
-    existing = execute_query(
+async def register_reader(reader: ReaderCreate):
+    existing = await execute_query(
         "SELECT reader_id FROM readers WHERE email = %s",
         (reader.email,),
         fetch_one=True
@@ -17,7 +19,7 @@ def register_reader(reader: ReaderCreate):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    db_reader = crud_reader.create(**reader.dict())
+    db_reader = await crud_reader.create(**reader.dict())
     if db_reader:
         db_reader.pop('password_hash', None)
         return db_reader
@@ -25,8 +27,8 @@ def register_reader(reader: ReaderCreate):
 
 
 @router.post("/login")
-def login(email: str, password: str):
-    reader = crud_reader.authenticate(email, password)
+async def login(email: str, password: str):
+    reader = await crud_reader.authenticate(email, password)
     if not reader:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -38,19 +40,22 @@ def login(email: str, password: str):
 
 
 @router.get("/", response_model=List[Reader])
-def read_readers(
+async def read_readers(
+        response: Response,
         skip: int = Query(0, ge=0),
-        limit: int = Query(100, ge=1, le=1000)
+        limit: int = Query(100, ge=1, le=1000),
+        after: Optional[str] = None
 ):
-    readers = crud_reader.get_all(skip=skip, limit=limit)
+    readers = await crud_reader.get_all(skip=skip, limit=limit, after=after)
     for reader in readers:
         reader.pop('password_hash', None)
+    set_next_cursor(response, readers)
     return readers
 
 
 @router.get("/{reader_id}", response_model=Reader)
-def read_reader(reader_id: int):
-    db_reader = crud_reader.get(reader_id)
+async def read_reader(reader_id: int):
+    db_reader = await crud_reader.get(reader_id)
     if db_reader is None:
         raise HTTPException(status_code=404, detail="Reader not found")
     db_reader.pop('password_hash', None)
@@ -58,18 +63,14 @@ def read_reader(reader_id: int):
 
 
 @router.get("/{reader_id}/statistics")
-def read_reader_statistics(reader_id: int):
-    return crud_reader.get_statistics(reader_id)
+async def read_reader_statistics(reader_id: int):
+    return await crud_reader.get_statistics(reader_id)
 
 
 @router.put("/{reader_id}", response_model=Reader)
-def update_reader(reader_id: int, reader: ReaderUpdate):
+async def update_reader(reader_id: int, reader: ReaderUpdate):
     update_data = reader.dict(exclude_unset=True)
-    if 'password' in update_data:
-        from crud import pwd_context
-        update_data['password_hash'] = pwd_context.hash(update_data.pop('password'))
-
-    db_reader = crud_reader.update(reader_id, **update_data)
+    db_reader = await crud_reader.update(reader_id, **update_data)
     if db_reader is None:
         raise HTTPException(status_code=404, detail="Reader not found")
     db_reader.pop('password_hash', None)
@@ -77,8 +78,33 @@ def update_reader(reader_id: int, reader: ReaderUpdate):
 
 
 @router.delete("/{reader_id}")
-def delete_reader(reader_id: int):
-    db_reader = crud_reader.update(reader_id, is_active=False)
+async def delete_reader(reader_id: int):
+    db_reader = await crud_reader.update(reader_id, is_active=False)
     if db_reader:
         return {"message": "Reader deactivated successfully"}
+    raise HTTPException(status_code=404, detail="Reader not found")
+
+
+@router.get("/{reader_id}/avatar")
+async def read_reader_avatar(reader_id: int, request: Request):
+    return await serve_media(reader_avatars, reader_id, request)
+
+
+@router.get("/{reader_id}/avatar/thumbnail")
+async def read_reader_avatar_thumbnail(reader_id: int, request: Request):
+    return await serve_thumbnail(reader_avatars, reader_id, request)
+
+
+@router.put("/{reader_id}/avatar")
+async def upload_reader_avatar(reader_id: int, file: UploadFile = File(...)):
+    meta = await reader_avatars.store(reader_id, file)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Reader not found")
+    return meta
+
+
+@router.delete("/{reader_id}/avatar")
+async def delete_reader_avatar(reader_id: int):
+    if await reader_avatars.delete(reader_id):
+        return {"message": "Avatar deleted successfully"}
     raise HTTPException(status_code=404, detail="Reader not found")
\ No newline at end of file
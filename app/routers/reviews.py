@@ -1,82 +1,89 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Body, Response
 from typing import List, Optional
-from schemas import Review, ReviewCreate, ReviewUpdate
+from datetime import date
+from schemas import Review, ReviewCreate, ReviewUpdate, ReviewBatchUpdate
 from crud import crud_review
-from database import execute_query
+from pagination import set_next_cursor
+from config import settings
 
 router = APIRouter()
 
 @router.post("/", response_model=Review)
-def create_review(review: ReviewCreate):
-    db_review = crud_review.create(**review.dict())
+async def create_review(review: ReviewCreate):
+    db_review = await crud_review.create(**review.dict())
     if db_review:
-        return crud_review.get_with_details(db_review['review_id'])
+        return db_review
     raise HTTPException(status_code=400, detail="Failed to create review")
 
 @router.get("/", response_model=List[Review])
-def read_reviews(
+async def read_reviews(
+        response: Response,
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
+        after: Optional[str] = None,
         book_id: Optional[int] = None,
         reader_id: Optional[int] = None
 ):
     if book_id:
-        return crud_review.get_by_book(book_id, skip, limit)
+        reviews = await crud_review.get_by_book(book_id, skip, limit, after)
     elif reader_id:
-        return crud_review.get_by_reader(reader_id, skip, limit)
-    return crud_review.get_all(skip=skip, limit=limit)
+        reviews = await crud_review.get_by_reader(reader_id, skip, limit, after)
+    else:
+        reviews = await crud_review.get_all(skip=skip, limit=limit, after=after)
+    set_next_cursor(response, reviews)
+    return reviews
+
+# Пакетные маршруты объявлены до /{review_id}, иначе "batch" попадет в параметр пути
+@router.get("/batch", response_model=List[Review])
+async def read_reviews_batch(ids: List[int] = Query(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return await crud_review.get_many(ids)
+
+@router.post("/batch", response_model=List[Review])
+async def create_reviews_batch(reviews: List[ReviewCreate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    created = await crud_review.create_many([review.dict() for review in reviews])
+    return await crud_review.get_many([row['review_id'] for row in created])
+
+@router.put("/batch", response_model=List[Review])
+async def update_reviews_batch(reviews: List[ReviewBatchUpdate] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    updated = await crud_review.update_many([review.dict(exclude_unset=True) for review in reviews])
+    return await crud_review.get_many([row['review_id'] for row in updated])
+
+@router.delete("/batch")
+async def delete_reviews_batch(ids: List[int] = Body(..., min_length=1, max_length=settings.BATCH_MAX_SIZE)):
+    return {"deleted_ids": await crud_review.delete_many(ids)}
 
 @router.get("/{review_id}", response_model=Review)
-def read_review(review_id: int):
-    db_review = crud_review.get_with_details(review_id)
+async def read_review(review_id: int):
+    db_review = await crud_review.get_with_details(review_id)
     if db_review is None:
         raise HTTPException(status_code=404, detail="Review not found")
     return db_review
 
 @router.put("/{review_id}", response_model=Review)
-def update_review(review_id: int, review: ReviewUpdate):
-    db_review = crud_review.update(review_id, **review.dict(exclude_unset=True))
+async def update_review(review_id: int, review: ReviewUpdate):
+    db_review = await crud_review.update(review_id, **review.dict(exclude_unset=True))
     if db_review:
-        return crud_review.get_with_details(review_id)
+        return await crud_review.get_with_details(review_id)
     raise HTTPException(status_code=404, detail="Review not found")
 
 @router.delete("/{review_id}")
-def delete_review(review_id: int):
-    if crud_review.delete(review_id):
+async def delete_review(review_id: int):
+    if await crud_review.delete(review_id):
         return {"message": "Review deleted successfully"}
     raise HTTPException(status_code=404, detail="Review not found")
 
 @router.get("/statistics/reading-progress")
-def get_reading_progress(reader_id: Optional[int] = None):
-    if reader_id:
-        query = """
-            SELECT 
-                EXTRACT(YEAR FROM r.end_date) as year,
-                EXTRACT(MONTH FROM r.end_date) as month,
-                COUNT(*) as books_read,
-                SUM(b.pages_count) as pages_read,
-                AVG(r.rating) as avg_rating
-            FROM reviews r
-            JOIN books b ON r.book_id = b.book_id
-            WHERE r.reader_id = %s AND r.end_date IS NOT NULL
-            GROUP BY year, month
-            ORDER BY year DESC, month DESC
-            LIMIT 12
-        """
-        return execute_query(query, (reader_id,))
-    else:
-        query = """
-            SELECT 
-                EXTRACT(YEAR FROM r.end_date) as year,
-                EXTRACT(MONTH FROM r.end_date) as month,
-                COUNT(*) as books_read,
-                SUM(b.pages_count) as pages_read,
-                AVG(r.rating) as avg_rating
-            FROM reviews r
-            JOIN books b ON r.book_id = b.book_id
-            WHERE r.end_date IS NOT NULL
-            GROUP BY year, month
-            ORDER BY year DESC, month DESC
-            LIMIT 12
-        """
-        return execute_query(query)
\ No newline at end of file
+async def get_reading_progress(
+        reader_id: Optional[int] = None,
+        date_from: Optional[date] = Query(None, alias="from"),
+        date_to: Optional[date] = Query(None, alias="to"),
+        granularity: str = Query("month", pattern="^(day|week|month)$")
+):
+    date_to = date_to or date.today()
+    if date_from is None:
+        # По умолчанию - последние 12 календарных месяцев, включая текущий
+        month_index = date_to.year * 12 + date_to.month - 12
+        date_from = date(month_index // 12, month_index % 12 + 1, 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    return await crud_review.get_reading_progress(date_from, date_to, granularity, reader_id)
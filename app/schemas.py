@@ -20,6 +20,9 @@ class PublisherCreate(PublisherBase):
 class PublisherUpdate(PublisherBase):
     publisher_name: Optional[str] = None
 
+class PublisherBatchUpdate(PublisherUpdate):
+    publisher_id: int
+
 class Publisher(PublisherBase):
     publisher_id: int
     created_at: datetime
@@ -67,6 +70,15 @@ class AuthorCreate(AuthorBase):
 class AuthorUpdate(AuthorBase):
     last_name: Optional[str] = None
 
+class AuthorBatchUpdate(AuthorUpdate):
+    author_id: int
+
+class AuthorSuggestion(BaseModel):
+    author_id: int
+    first_name: Optional[str] = None
+    last_name: str
+    pseudonym: Optional[str] = None
+
 class Author(AuthorBase):
     author_id: int
     created_at: datetime
@@ -86,6 +98,9 @@ class GenreCreate(GenreBase):
 class GenreUpdate(GenreBase):
     genre_name: Optional[str] = None
 
+class GenreBatchUpdate(GenreUpdate):
+    genre_id: int
+
 class Genre(GenreBase):
     genre_id: int
     created_at: datetime
@@ -120,6 +135,12 @@ class BookUpdate(BookBase):
     author_ids: Optional[List[int]] = None
     genre_ids: Optional[List[int]] = None
 
+class BookBatchUpdate(BookBase):
+    # Пакетное обновление меняет только поля книг, связи обновляются через PUT /{book_id}
+    book_id: int
+    title: Optional[str] = None
+    status: Optional[str] = None
+
 class Book(BookBase):
     book_id: int
     created_at: datetime
@@ -186,6 +207,9 @@ class ReviewUpdate(BaseModel):
     favorite_quotes: Optional[str] = None
     reading_status: Optional[str] = None
 
+class ReviewBatchUpdate(ReviewUpdate):
+    review_id: int
+
 class Review(ReviewBase):
     review_id: int
     reader_id: int
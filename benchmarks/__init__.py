@@ -0,0 +1,17 @@
+"""Нагрузочные тесты API на синтетической библиотеке.
+
+Порядок работы (из корня репозитория):
+
+    # 1. Пересоздать базу из database/init.sql и заполнить ее
+    python -m benchmarks seed --scale large
+
+    # 2. Прогнать сценарий против запущенного приложения (или с --start-app)
+    python -m benchmarks run --duration 60 --concurrency 32 --output benchmarks/results/run.json
+
+    # 3. Сравнить с сохраненным базовым прогоном; код выхода 1 - есть регрессия
+    python -m benchmarks compare benchmarks/results/run.json benchmarks/baselines/large.json
+
+База по умолчанию - personal_library_bench из BENCH_DATABASE_URL; рабочая база
+приложения не затрагивается. Зависимости сверх requirements.txt - в
+benchmarks/requirements.txt.
+"""
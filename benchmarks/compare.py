@@ -0,0 +1,60 @@
+"""Сравнение результата прогона с базовым.
+
+Сценарий считается регрессией, если по сравнению с базовым прогоном:
+  - p95 вырос больше чем на tolerance (и больше чем на min_delta_ms - шум на
+    быстрых запросах в доли миллисекунды не считается);
+  - пропускная способность упала больше чем на tolerance;
+  - доля ошибок выросла больше чем на max_error_increase.
+Сравнение имеет смысл только для прогонов на одном объеме данных и с одинаковыми
+concurrency/сценарием - иначе выводится предупреждение.
+"""
+from typing import Any, Dict, List
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.15,
+            min_delta_ms: float = 2.0, max_error_increase: float = 0.01) -> List[Dict[str, Any]]:
+    rows = []
+    for name, current in result["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if base is None:
+            rows.append({"workload": name, "status": "new", "problems": []})
+            continue
+
+        problems = []
+        p95_delta = current["p95_ms"] - base["p95_ms"]
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and p95_delta > min_delta_ms:
+            problems.append(f"p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            problems.append(f"throughput {base['throughput']:.1f} -> {current['throughput']:.1f} rps")
+        if current["error_rate"] - base["error_rate"] > max_error_increase:
+            problems.append(f"error rate {base['error_rate']:.2%} -> {current['error_rate']:.2%}")
+
+        rows.append({
+            "workload": name,
+            "status": "regression" if problems else "ok",
+            "problems": problems,
+            "p95_change": _change(base["p95_ms"], current["p95_ms"]),
+            "throughput_change": _change(base["throughput"], current["throughput"]),
+        })
+    return rows
+
+
+def _change(before: float, after: float) -> float:
+    return round((after - before) / before, 4) if before else 0.0
+
+
+def comparability_warnings(result: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    warnings = []
+    for key in ("concurrency", "dataset", "mix", "bypass_cache"):
+        if result["meta"].get(key) != baseline["meta"].get(key):
+            warnings.append(f"{key} differs from baseline: {result['meta'].get(key)} vs {baseline['meta'].get(key)}")
+    return warnings
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'workload':<20} {'status':<11} {'p95':>8} {'rps':>8}  details"]
+    for row in rows:
+        p95 = f"{row['p95_change']:+.1%}" if "p95_change" in row else "-"
+        rps = f"{row['throughput_change']:+.1%}" if "throughput_change" in row else "-"
+        lines.append(f"{row['workload']:<20} {row['status']:<11} {p95:>8} {rps:>8}  {'; '.join(row['problems'])}")
+    return "\n".join(lines)
@@ -0,0 +1,191 @@
+"""Прогон сценария нагрузки против запущенного приложения.
+
+Замкнутая модель: concurrency виртуальных клиентов без пауз шлют запросы по
+весам сценария, пока не истечет duration. Запросы первых warmup секунд не
+учитываются (прогрев пулов, кэшей и shared_buffers). Для каждого сценария
+считаются пропускная способность, доля ошибок (статус >= 400 или сбой
+соединения) и перцентили задержки p50/p95/p99.
+"""
+import asyncio
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from benchmarks.workloads import WORKLOADS, Dataset
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу; sorted_values отсортированы по возрастанию."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput": round(count / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / count * 1000, 2) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if count else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def add(self, name: str, latency: float, status: Optional[int]):
+        self.latencies.setdefault(name, []).append(latency)
+        key = str(status) if status is not None else "connection_error"
+        statuses = self.statuses.setdefault(name, {})
+        statuses[key] = statuses.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+async def _client(index: int, client: httpx.AsyncClient, data: Dataset, mix: Dict[str, float],
+                  seed: int, warmup_until: float, deadline: float, recorder: Recorder, headers: Dict[str, str]):
+    rng = random.Random(seed * 1000 + index)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            return
+        name = rng.choices(names, weights)[0]
+        request = WORKLOADS[name](rng, data)
+        started = time.perf_counter()
+        status = None
+        try:
+            response = await client.request(request.method, request.url, params=request.params,
+                                            json=request.json, headers=headers)
+            await response.aread()
+            status = response.status_code
+        except httpx.HTTPError as e:
+            logger.debug(f"{name} failed: {e}")
+        finished = time.perf_counter()
+        if started >= warmup_until:
+            recorder.add(name, finished - started, status)
+
+
+async def run_workload(base_url: str, data: Dataset, mix: Dict[str, float], duration: float,
+                       concurrency: int, warmup: float = 10.0, seed: int = 1,
+                       bypass_cache: bool = True, timeout: float = 30.0) -> Dict[str, Any]:
+    # no-cache: ResponseCacheMiddleware не отдает сохраненный ответ, и замеряется сам обработчик
+    headers = {"Cache-Control": "no-cache"} if bypass_cache else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    recorder = Recorder()
+    started_at = datetime.now(timezone.utc)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        warmup_until = start + warmup
+        deadline = warmup_until + duration
+        await asyncio.gather(*(
+            _client(index, client, data, mix, seed, warmup_until, deadline, recorder, headers)
+            for index in range(concurrency)
+        ))
+        # Запросы, начатые до конца окна, могли завершиться позже него
+        elapsed = max(time.perf_counter() - warmup_until, 1e-9)
+
+    endpoints = {
+        name: {**summarize(latencies, recorder.errors.get(name, 0), elapsed),
+               "statuses": recorder.statuses.get(name, {})}
+        for name, latencies in sorted(recorder.latencies.items())
+    }
+    all_latencies = [value for latencies in recorder.latencies.values() for value in latencies]
+    return {
+        "meta": {
+            "started_at": started_at.isoformat(),
+            "git_commit": git_commit(),
+            "base_url": base_url,
+            "duration": duration,
+            "warmup": warmup,
+            "concurrency": concurrency,
+            "seed": seed,
+            "bypass_cache": bypass_cache,
+            "mix": mix,
+            "dataset": data.info,
+        },
+        "endpoints": endpoints,
+        "total": summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=APP_DIR.parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def app_server(database_url: str, port: int, workers: int = 1, env: Optional[Dict[str, str]] = None):
+    """Запускает приложение uvicorn'ом на базе бенчмарка и ждет /health."""
+    # WEB_CONCURRENCY сообщает приложению число воркеров (от него зависит кэш ответов)
+    process_env = {**os.environ, **(env or {}), "DATABASE_URL": database_url, "WEB_CONCURRENCY": str(workers)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--no-access-log"],
+        cwd=APP_DIR, env=process_env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_for_health(base_url, process)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _wait_for_health(base_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Application exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Application did not become healthy within {timeout}s")
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    rows: List[Tuple[str, Dict[str, Any]]] = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    lines = [f"{'workload':<20} {'req':>8} {'rps':>9} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9}"]
+    for name, stats in rows:
+        lines.append(
+            f"{name:<20} {stats['requests']:>8} {stats['throughput']:>9.1f} {stats['error_rate'] * 100:>6.2f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+        )
+    return "\n".join(lines)
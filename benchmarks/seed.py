@@ -0,0 +1,384 @@
+"""Создание и заполнение базы для нагрузочных тестов.
+
+База пересоздается по database/init.sql, затем заполняется синтетическими данными
+set-based запросами (generate_series) пачками по chunk_size строк. Популярность
+книг, авторов и активность читателей неравномерна: id выбирается как
+1 + floor(n * random() ^ skew), поэтому при skew = 3 на первый 1% id приходится
+около 20% выборок. Генератор инициализируется setseed, так что при одинаковых
+параметрах данные повторяются.
+
+Триггеры reviews на время загрузки отключаются, агрегаты (book_rating_stats,
+reading_progress_daily*) и сводка library_summary пересчитываются одним проходом
+после нее - так же, как в миграциях 004 и 006.
+"""
+import logging
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, Optional
+import psycopg2
+from psycopg2.extensions import make_dsn, parse_dsn
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+INIT_SQL = Path(__file__).resolve().parent.parent / "database" / "init.sql"
+
+# Пароль всех сгенерированных читателей (email: reader<N>@bench.local)
+READER_PASSWORD = "benchmark"
+
+
+@dataclass
+class Scale:
+    books: int
+    authors: int
+    readers: int
+    reviews: int
+    publishers: int
+    series: int
+    genres: int
+
+
+SCALES = {
+    "small": Scale(books=10_000, authors=2_000, readers=1_000, reviews=100_000,
+                   publishers=50, series=200, genres=40),
+    "medium": Scale(books=100_000, authors=20_000, readers=10_000, reviews=1_000_000,
+                    publishers=200, series=2_000, genres=100),
+    "large": Scale(books=1_000_000, authors=200_000, readers=100_000, reviews=10_000_000,
+                   publishers=500, series=20_000, genres=200),
+}
+
+FIRST_NAMES = [
+    "Александр", "Алексей", "Анна", "Борис", "Валентина", "Виктор", "Галина", "Дмитрий",
+    "Евгений", "Екатерина", "Елена", "Иван", "Ирина", "Константин", "Лев", "Мария",
+    "Михаил", "Наталья", "Николай", "Ольга", "Павел", "Пётр", "Сергей", "Софья",
+    "Татьяна", "Фёдор", "Юлия", "Юрий",
+]
+LAST_NAME_STEMS = [
+    "Иван", "Петр", "Сидор", "Смирн", "Кузнец", "Попов", "Соколов", "Лебед", "Козл",
+    "Новик", "Морозов", "Волков", "Соловь", "Васильев", "Зайц", "Павлов", "Семён",
+    "Голубев", "Виноград", "Богдан", "Воробь", "Фёдор", "Михайл", "Беляев", "Тарас",
+    "Белов", "Комар", "Орлов", "Киселёв", "Макар", "Андре", "Ковал", "Ильин", "Гусев",
+]
+LAST_NAME_ENDINGS = ["ов", "ев", "ин", "ский", "цкий", "ых", "енко", "ук", ""]
+WORDS = [
+    "тайна", "дорога", "время", "война", "мир", "город", "море", "звезда", "сад", "дом",
+    "ночь", "свет", "тень", "память", "история", "путь", "остров", "ветер", "зима", "лето",
+    "сердце", "океан", "гора", "река", "поле", "небо", "огонь", "камень", "ключ", "письмо",
+    "последний", "первый", "тихий", "тёмный", "белый", "северный", "забытый", "новый",
+    "старый", "далекий", "золотой", "красный", "вечный", "странный", "большой", "малый",
+    "приключения", "хроника", "легенда", "записки", "сказание", "повесть", "дневник",
+    "algorithm", "data", "system", "theory", "practice", "design", "python", "network",
+]
+CITIES = ["Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань", "Нижний Новгород"]
+
+
+def bench_dsn(database_url: str, dbname: Optional[str] = None) -> str:
+    return make_dsn(database_url, dbname=dbname) if dbname else make_dsn(database_url)
+
+
+def recreate_database(database_url: str, locale: Optional[str] = None):
+    dbname = parse_dsn(database_url)["dbname"]
+    conn = psycopg2.connect(bench_dsn(database_url, "postgres"))
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+            options = " ENCODING 'UTF8' TEMPLATE template0"
+            if locale:
+                options += f" LC_COLLATE '{locale}' LC_CTYPE '{locale}'"
+            cursor.execute(f'CREATE DATABASE "{dbname}"{options}')
+    finally:
+        conn.close()
+
+
+def schema_sql() -> str:
+    """init.sql без CREATE DATABASE и \\c: база создается и выбирается отдельно."""
+    text = INIT_SQL.read_text(encoding="utf-8")
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        if line.startswith("\\c"):
+            return "\n".join(lines[index + 1:])
+    return text
+
+
+class Seeder:
+    def __init__(self, conn, scale: Scale, skew: float = 3.0, seed: float = 0.42,
+                 chunk_size: int = 100_000, bcrypt_rounds: int = 12):
+        self.conn = conn
+        self.scale = scale
+        self.skew = skew
+        self.seed = seed
+        self.chunk_size = chunk_size
+        # Один хэш на всех: bcrypt с боевой стоимостью для 100k читателей занял бы часы
+        self.password_hash = CryptContext(schemes=["bcrypt"]).hash(READER_PASSWORD, rounds=bcrypt_rounds)
+
+    def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT setseed(%s)", (self.seed,))
+            cursor.execute("""
+                CREATE FUNCTION pg_temp.skewed(n BIGINT, skew FLOAT8) RETURNS INTEGER AS $$
+                    SELECT (1 + floor(n * power(random(), skew)))::int
+                $$ LANGUAGE sql VOLATILE
+            """)
+        self.conn.commit()
+
+        self._step("publishers", self._publishers)
+        self._step("genres", self._genres)
+        self._step("series", self._series)
+        self._chunked("authors", self.scale.authors, self._authors)
+        self._chunked("books", self.scale.books, self._books)
+        self._chunked("books_authors", self.scale.books, self._books_authors)
+        self._chunked("books_genres", self.scale.books, self._books_genres)
+        self._chunked("readers", self.scale.readers, self._readers)
+        reviews = self._step("reviews", self._reviews)
+        self._step("aggregates", self._aggregates)
+        self._analyze()
+
+        summary = {**asdict(self.scale), "reviews": reviews, "skew": self.skew, "seed": self.seed,
+                   "seconds": round(time.monotonic() - started, 1)}
+        logger.info(f"Seeding finished: {summary}")
+        return summary
+
+    def _step(self, name: str, func):
+        started = time.monotonic()
+        with self.conn.cursor() as cursor:
+            result = func(cursor)
+        self.conn.commit()
+        logger.info(f"{name}: {time.monotonic() - started:.1f}s")
+        return result
+
+    def _chunked(self, name: str, total: int, func):
+        started = time.monotonic()
+        for first in range(1, total + 1, self.chunk_size):
+            last = min(first + self.chunk_size - 1, total)
+            with self.conn.cursor() as cursor:
+                func(cursor, first, last)
+            self.conn.commit()
+            logger.info(f"{name}: {last}/{total}")
+        logger.info(f"{name}: {time.monotonic() - started:.1f}s")
+
+    def _publishers(self, cursor):
+        cursor.execute("""
+            INSERT INTO publishers (publisher_name, country, city, founded_year)
+            SELECT 'Издательство ' || i, 'Россия', (%(cities)s::text[])[1 + i %% %(cities_count)s], 1900 + i %% 120
+            FROM generate_series(1, %(count)s) i
+        """, {"cities": CITIES, "cities_count": len(CITIES), "count": self.scale.publishers})
+
+    def _genres(self, cursor):
+        # Два уровня поддеревьев под корневыми жанрами из init.sql
+        half = self.scale.genres // 2
+        for level, count in ((1, half), (2, self.scale.genres - half)):
+            cursor.execute("""
+                WITH parents AS (
+                    SELECT array_agg(genre_id ORDER BY genre_id) as ids
+                    FROM genres
+                    WHERE (%(level)s = 1 AND parent_genre_id IS NULL)
+                       OR (%(level)s = 2 AND parent_genre_id IS NOT NULL)
+                )
+                INSERT INTO genres (genre_name, description, parent_genre_id)
+                SELECT 'Жанр ' || %(level)s || '.' || i, 'Синтетический жанр', p.ids[1 + i %% cardinality(p.ids)]
+                FROM generate_series(1, %(count)s) i, parents p
+            """, {"level": level, "count": count})
+
+    def _series(self, cursor):
+        cursor.execute("""
+            INSERT INTO series (series_name, publisher_id)
+            SELECT 'Серия ' || i, pg_temp.skewed((SELECT max(publisher_id) FROM publishers), 1)
+            FROM generate_series(1, %(count)s) i
+        """, {"count": self.scale.series})
+
+    def _authors(self, cursor, first: int, last: int):
+        cursor.execute("""
+            INSERT INTO authors (first_name, last_name, pseudonym, birth_date, country, biography)
+            SELECT
+                (%(first_names)s::text[])[1 + floor(random() * %(first_count)s)::int],
+                (%(stems)s::text[])[1 + floor(random() * %(stems_count)s)::int]
+                    || (%(endings)s::text[])[1 + floor(random() * %(endings_count)s)::int],
+                CASE WHEN random() < 0.05 THEN 'Псевдоним ' || i END,
+                DATE '1800-01-01' + floor(random() * 73000)::int,
+                CASE WHEN random() < 0.8 THEN 'Россия' ELSE 'США' END,
+                'Биография автора ' || i
+            FROM generate_series(%(first)s, %(last)s) i
+        """, {
+            "first_names": FIRST_NAMES, "first_count": len(FIRST_NAMES),
+            "stems": LAST_NAME_STEMS, "stems_count": len(LAST_NAME_STEMS),
+            "endings": LAST_NAME_ENDINGS, "endings_count": len(LAST_NAME_ENDINGS),
+            "first": first, "last": last,
+        })
+
+    def _books(self, cursor, first: int, last: int):
+        # Подзапрос описания ссылается на i, иначе random() в нем вычислился бы один раз.
+        # ORDER BY g делает string_agg агрегатом подзапроса: аргумент из одних внешних
+        # колонок (w, nw) превратил бы его в агрегат внешнего INSERT ... SELECT
+        cursor.execute("""
+            INSERT INTO books (
+                title, isbn, publisher_id, publication_year, pages_count, language, description,
+                acquisition_date, price, condition, format, status, series_id, series_number
+            )
+            SELECT
+                initcap(w[1 + floor(random() * nw)::int]) || ' ' || w[1 + floor(random() * nw)::int]
+                    || ' ' || w[1 + floor(random() * nw)::int],
+                '978' || lpad(i::text, 10, '0'),
+                pg_temp.skewed(%(publishers)s, %(skew)s),
+                1900 + floor(random() * (EXTRACT(YEAR FROM CURRENT_DATE) - 1899))::int,
+                50 + floor(random() * 950)::int,
+                CASE WHEN random() < 0.85 THEN 'Русский' ELSE 'English' END,
+                (SELECT string_agg(w[1 + floor(random() * nw)::int], ' ' ORDER BY g)
+                 FROM generate_series(1, 10 + i %% 40) g),
+                CURRENT_DATE - floor(random() * 3650)::int,
+                round((100 + random() * 2900)::numeric, 2),
+                (ARRAY['новая', 'хорошее', 'хорошее', 'удовлетворительное'])[1 + floor(random() * 4)::int],
+                (ARRAY['твердый переплет', 'твердый переплет', 'мягкая обложка', 'электронная'])[1 + floor(random() * 4)::int],
+                (ARRAY['в библиотеке', 'в библиотеке', 'в библиотеке', 'в библиотеке', 'в библиотеке',
+                       'в библиотеке', 'в библиотеке', 'в библиотеке', 'одолжена', 'утеряна'])[1 + i %% 10],
+                CASE WHEN i %% 10 = 0 THEN pg_temp.skewed(%(series)s, 1) END,
+                CASE WHEN i %% 10 = 0 THEN 1 + i %% 12 END
+            FROM generate_series(%(first)s, %(last)s) i,
+                 (SELECT %(words)s::text[] as w, %(words_count)s as nw) words
+        """, {
+            "publishers": self.scale.publishers + 5, "series": self.scale.series, "skew": self.skew,
+            "words": WORDS, "words_count": len(WORDS), "first": first, "last": last,
+        })
+
+    def _books_authors(self, cursor, first: int, last: int):
+        # 85% книг с одним автором, 12% с двумя, 3% с тремя
+        cursor.execute("""
+            INSERT INTO books_authors (book_id, author_id)
+            SELECT b.book_id, pg_temp.skewed(%(authors)s, %(skew)s)
+            FROM books b
+            CROSS JOIN LATERAL generate_series(
+                1, CASE WHEN b.book_id * 7919 %% 100 < 85 THEN 1 WHEN b.book_id * 7919 %% 100 < 97 THEN 2 ELSE 3 END
+            ) k
+            WHERE b.book_id BETWEEN %(first)s AND %(last)s
+            ON CONFLICT DO NOTHING
+        """, {"authors": self.scale.authors, "skew": self.skew, "first": first, "last": last})
+
+    def _books_genres(self, cursor, first: int, last: int):
+        params = {"first": first, "last": last}
+        cursor.execute("""
+            INSERT INTO books_genres (book_id, genre_id, is_primary)
+            SELECT b.book_id, g.ids[pg_temp.skewed(cardinality(g.ids), 1.5)], TRUE
+            FROM books b, (SELECT array_agg(genre_id ORDER BY genre_id) as ids FROM genres) g
+            WHERE b.book_id BETWEEN %(first)s AND %(last)s
+        """, params)
+        cursor.execute("""
+            INSERT INTO books_genres (book_id, genre_id, is_primary)
+            SELECT b.book_id, g.ids[pg_temp.skewed(cardinality(g.ids), 1)], FALSE
+            FROM books b, (SELECT array_agg(genre_id ORDER BY genre_id) as ids FROM genres) g
+            WHERE b.book_id BETWEEN %(first)s AND %(last)s AND random() < 0.3
+            ON CONFLICT DO NOTHING
+        """, params)
+
+    def _readers(self, cursor, first: int, last: int):
+        cursor.execute("""
+            INSERT INTO readers (first_name, last_name, email, password_hash, registration_date)
+            SELECT
+                (%(first_names)s::text[])[1 + i %% %(first_count)s],
+                'Читатель' || i,
+                'reader' || i || '@bench.local',
+                %(password_hash)s,
+                CURRENT_DATE - floor(random() * 2000)::int
+            FROM generate_series(%(first)s, %(last)s) i
+        """, {
+            "first_names": FIRST_NAMES, "first_count": len(FIRST_NAMES),
+            "password_hash": self.password_hash, "first": first, "last": last,
+        })
+
+    def _reviews(self, cursor) -> int:
+        # Пары (книга, читатель) уникальны: дубли отбрасываются, и пачки догружаются до нужного числа
+        cursor.execute("ALTER TABLE reviews DISABLE TRIGGER USER")
+        self.conn.commit()
+        target = self.scale.reviews
+        total = 0
+        idle_rounds = 0
+        try:
+            while total < target and idle_rounds < 3:
+                cursor.execute("""
+                    INSERT INTO reviews (book_id, reader_id, rating, review_text, start_date, end_date,
+                                         review_date, reading_status)
+                    SELECT book_id, reader_id, rating, 'Отзыв', COALESCE(end_date, CURRENT_DATE) - span,
+                           end_date, COALESCE(end_date, CURRENT_DATE),
+                           CASE WHEN end_date IS NULL THEN 'читаю' ELSE 'прочитано' END
+                    FROM (
+                        SELECT
+                            pg_temp.skewed(%(books)s, %(skew)s) as book_id,
+                            pg_temp.skewed(%(readers)s, %(skew)s) as reader_id,
+                            (ARRAY[1, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 5, 5, 5, 5, 5, 5, 5])
+                                [1 + floor(random() * 20)::int] as rating,
+                            CASE WHEN random() < 0.9
+                                THEN CURRENT_DATE - floor(power(random(), 1.5) * 1095)::int
+                            END as end_date,
+                            1 + floor(random() * 60)::int as span
+                        FROM generate_series(1, %(count)s) i
+                    ) r
+                    ON CONFLICT (book_id, reader_id) DO NOTHING
+                """, {
+                    "books": self.scale.books, "readers": self.scale.readers, "skew": self.skew,
+                    "count": min(self.chunk_size, target - total),
+                })
+                inserted = cursor.rowcount
+                total += inserted
+                idle_rounds = idle_rounds + 1 if inserted == 0 else 0
+                self.conn.commit()
+                logger.info(f"reviews: {total}/{target}")
+        finally:
+            cursor.execute("ALTER TABLE reviews ENABLE TRIGGER USER")
+        if total < target:
+            logger.warning(f"Only {total} unique reviews fit the readers x books space")
+        return total
+
+    def _aggregates(self, cursor):
+        cursor.execute("""
+            INSERT INTO book_rating_stats (book_id, rating_sum, review_count, rating_1, rating_2, rating_3, rating_4, rating_5)
+            SELECT
+                book_id,
+                SUM(rating),
+                COUNT(*),
+                COUNT(*) FILTER (WHERE rating = 1),
+                COUNT(*) FILTER (WHERE rating = 2),
+                COUNT(*) FILTER (WHERE rating = 3),
+                COUNT(*) FILTER (WHERE rating = 4),
+                COUNT(*) FILTER (WHERE rating = 5)
+            FROM reviews
+            GROUP BY book_id
+        """)
+        cursor.execute("""
+            INSERT INTO reading_progress_daily (reader_id, day, books_read, pages_read, rating_sum)
+            SELECT r.reader_id, r.end_date, COUNT(*), COALESCE(SUM(b.pages_count), 0), SUM(r.rating)
+            FROM reviews r
+            JOIN books b ON r.book_id = b.book_id
+            WHERE r.end_date IS NOT NULL
+            GROUP BY r.reader_id, r.end_date
+        """)
+        cursor.execute("""
+            INSERT INTO reading_progress_daily_global (day, books_read, pages_read, rating_sum)
+            SELECT day, SUM(books_read), SUM(pages_read), SUM(rating_sum)
+            FROM reading_progress_daily
+            GROUP BY day
+        """)
+        cursor.execute("REFRESH MATERIALIZED VIEW library_summary")
+
+    def _analyze(self):
+        started = time.monotonic()
+        self.conn.autocommit = True
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("VACUUM ANALYZE")
+        finally:
+            self.conn.autocommit = False
+        logger.info(f"vacuum analyze: {time.monotonic() - started:.1f}s")
+
+
+def seed(database_url: str, scale: Scale, skew: float = 3.0, seed_value: float = 0.42,
+         chunk_size: int = 100_000, bcrypt_rounds: int = 12, locale: Optional[str] = None) -> Dict[str, Any]:
+    recreate_database(database_url, locale)
+    conn = psycopg2.connect(bench_dsn(database_url))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(schema_sql())
+        conn.commit()
+        return Seeder(conn, scale, skew, seed_value, chunk_size, bcrypt_rounds).run()
+    finally:
+        conn.close()
@@ -0,0 +1,190 @@
+"""Сценарии нагрузки: каждый сценарий по генератору случайных чисел и сведениям
+о засеянной базе строит один HTTP-запрос к API.
+
+id выбираются с тем же перекосом, что и при заполнении (seed.py), поэтому
+популярные книги и активные читатели запрашиваются чаще - как в реальной работе,
+где горячие строки лежат в shared_buffers, а хвост читается с диска.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import psycopg2
+from benchmarks.seed import READER_PASSWORD
+
+
+@dataclass
+class Request:
+    method: str
+    url: str
+    params: Optional[Dict[str, Any]] = None
+    json: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class Dataset:
+    """Границы id и словари для запросов, прочитанные из засеянной базы."""
+    max_book_id: int
+    max_author_id: int
+    max_reader_id: int
+    genre_ids: List[int]
+    title_words: List[str]
+    author_names: List[str]
+    skew: float = 3.0
+    info: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, dsn: str, skew: float = 3.0, sample_size: int = 1000) -> "Dataset":
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT
+                        (SELECT COALESCE(max(book_id), 0) FROM books),
+                        (SELECT COALESCE(max(author_id), 0) FROM authors),
+                        (SELECT COALESCE(max(reader_id), 0) FROM readers)
+                """)
+                max_book_id, max_author_id, max_reader_id = cursor.fetchone()
+                cursor.execute("SELECT genre_id FROM genres ORDER BY genre_id")
+                genre_ids = [row[0] for row in cursor.fetchall()]
+                cursor.execute("""
+                    SELECT DISTINCT word
+                    FROM (SELECT title FROM books TABLESAMPLE SYSTEM (1) LIMIT %s) b,
+                         regexp_split_to_table(lower(b.title), '\\s+') word
+                    WHERE length(word) >= 3
+                """, (sample_size,))
+                title_words = [row[0] for row in cursor.fetchall()]
+                cursor.execute("""
+                    SELECT DISTINCT last_name FROM (SELECT last_name FROM authors LIMIT %s) a
+                """, (sample_size,))
+                author_names = [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+        if not max_book_id or not max_reader_id:
+            raise RuntimeError("Benchmark database is empty, run `python -m benchmarks seed` first")
+        return cls(
+            max_book_id=max_book_id,
+            max_author_id=max_author_id,
+            max_reader_id=max_reader_id,
+            genre_ids=genre_ids,
+            title_words=title_words or ["тайна"],
+            author_names=author_names or ["Иванов"],
+            skew=skew,
+            info={"books": max_book_id, "authors": max_author_id, "readers": max_reader_id,
+                  "genres": len(genre_ids)},
+        )
+
+    def skewed_id(self, rng: random.Random, n: int) -> int:
+        return 1 + int(n * rng.random() ** self.skew)
+
+
+Workload = Callable[[random.Random, Dataset], Request]
+
+
+def book_detail(rng: random.Random, data: Dataset) -> Request:
+    return Request("GET", f"/api/books/{data.skewed_id(rng, data.max_book_id)}")
+
+
+def book_list(rng: random.Random, data: Dataset) -> Request:
+    return Request("GET", "/api/books/", {"limit": 20})
+
+
+def book_search(rng: random.Random, data: Dataset) -> Request:
+    words = rng.sample(data.title_words, min(len(data.title_words), rng.choice((1, 2))))
+    return Request("GET", "/api/books/", {"search": " ".join(words), "limit": 20})
+
+
+def book_filter(rng: random.Random, data: Dataset) -> Request:
+    year_from = rng.randint(1900, date.today().year - 10)
+    return Request("GET", "/api/books/", {
+        "genre_id": rng.choice(data.genre_ids),
+        "year_from": year_from,
+        "year_to": year_from + 10,
+        "limit": 20,
+    })
+
+
+def author_search(rng: random.Random, data: Dataset) -> Request:
+    return Request("GET", "/api/authors/", {"search": rng.choice(data.author_names), "limit": 20})
+
+
+def author_suggest(rng: random.Random, data: Dataset) -> Request:
+    name = rng.choice(data.author_names)
+    return Request("GET", "/api/authors/suggest", {"q": name[:rng.randint(1, min(len(name), 5))]})
+
+
+def review_upsert(rng: random.Random, data: Dataset) -> Request:
+    end_date = date.today() - timedelta(days=rng.randint(0, 365))
+    return Request("POST", "/api/reviews/", json={
+        "book_id": data.skewed_id(rng, data.max_book_id),
+        "reader_id": data.skewed_id(rng, data.max_reader_id),
+        "rating": rng.randint(1, 5),
+        "review_text": "Отзыв из нагрузочного теста",
+        "start_date": (end_date - timedelta(days=rng.randint(1, 60))).isoformat(),
+        "end_date": end_date.isoformat(),
+    })
+
+
+def reader_statistics(rng: random.Random, data: Dataset) -> Request:
+    return Request("GET", f"/api/readers/{data.skewed_id(rng, data.max_reader_id)}/statistics")
+
+
+def library_summary(rng: random.Random, data: Dataset) -> Request:
+    return Request("GET", "/api/books/statistics/summary")
+
+
+def reading_progress(rng: random.Random, data: Dataset) -> Request:
+    params = {"granularity": rng.choice(("day", "week", "month"))}
+    if rng.random() < 0.7:
+        params["reader_id"] = data.skewed_id(rng, data.max_reader_id)
+    return Request("GET", "/api/reviews/statistics/reading-progress", params)
+
+
+def login(rng: random.Random, data: Dataset) -> Request:
+    reader_id = data.skewed_id(rng, data.max_reader_id)
+    return Request("POST", "/api/readers/login",
+                   {"email": f"reader{reader_id}@bench.local", "password": READER_PASSWORD})
+
+
+WORKLOADS: Dict[str, Workload] = {
+    "book_detail": book_detail,
+    "book_list": book_list,
+    "book_search": book_search,
+    "book_filter": book_filter,
+    "author_search": author_search,
+    "author_suggest": author_suggest,
+    "review_upsert": review_upsert,
+    "reader_statistics": reader_statistics,
+    "library_summary": library_summary,
+    "reading_progress": reading_progress,
+    "login": login,
+}
+
+# Смешанный сценарий по умолчанию: веса - доля запросов каждого типа
+MIXED = {
+    "book_detail": 30,
+    "book_list": 8,
+    "book_search": 10,
+    "book_filter": 5,
+    "author_search": 7,
+    "author_suggest": 10,
+    "review_upsert": 10,
+    "reader_statistics": 6,
+    "library_summary": 2,
+    "reading_progress": 6,
+    "login": 6,
+}
+
+
+def parse_mix(spec: Optional[List[str]]) -> Dict[str, float]:
+    """["book_detail:3", "login"] -> {"book_detail": 3.0, "login": 1.0}; пусто - MIXED."""
+    if not spec:
+        return dict(MIXED)
+    mix = {}
+    for item in spec:
+        name, _, weight = item.partition(":")
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown workload '{name}', expected one of: {', '.join(WORKLOADS)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
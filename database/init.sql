@@ -49,8 +49,18 @@ CREATE TABLE books (
     series_id INTEGER REFERENCES series(series_id),
     series_number INTEGER,
     cover_image BYTEA,
+    cover_image_sha256 CHAR(64),
+    cover_image_size INTEGER,
+    cover_image_content_type VARCHAR(100),
+    cover_image_thumbnail BYTEA,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(description, '')), 'B') ||
+        setweight(to_tsvector('simple', COALESCE(description, '')), 'B')
+    ) STORED
 );
 
 CREATE TABLE authors (
@@ -63,7 +73,16 @@ CREATE TABLE authors (
     country VARCHAR(100),
     biography TEXT,
     photo BYTEA,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    photo_sha256 CHAR(64),
+    photo_size INTEGER,
+    photo_content_type VARCHAR(100),
+    photo_thumbnail BYTEA,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    search_name TEXT GENERATED ALWAYS AS (
+        replace(lower(regexp_replace(trim(
+            COALESCE(last_name, '') || ' ' || COALESCE(first_name, '') || ' ' || COALESCE(pseudonym, '')
+        ), '\s+', ' ', 'g')), 'ё', 'е')
+    ) STORED
 );
 
 CREATE TABLE genres (
@@ -83,6 +102,10 @@ CREATE TABLE readers (
     registration_date DATE DEFAULT CURRENT_DATE,
     preferences TEXT,
     avatar BYTEA,
+    avatar_sha256 CHAR(64),
+    avatar_size INTEGER,
+    avatar_content_type VARCHAR(100),
+    avatar_thumbnail BYTEA,
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -117,16 +140,53 @@ CREATE TABLE books_genres (
     PRIMARY KEY (book_id, genre_id)
 );
 
+CREATE TABLE book_rating_stats (
+    book_id INTEGER PRIMARY KEY REFERENCES books(book_id) ON DELETE CASCADE,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE reading_progress_daily (
+    reader_id INTEGER NOT NULL REFERENCES readers(reader_id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    books_read INTEGER NOT NULL DEFAULT 0,
+    pages_read BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (reader_id, day)
+);
+
+CREATE TABLE reading_progress_daily_global (
+    day DATE PRIMARY KEY,
+    books_read INTEGER NOT NULL DEFAULT 0,
+    pages_read BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0
+);
+
 CREATE INDEX idx_books_title ON books USING gin (title gin_trgm_ops);
+CREATE INDEX idx_books_title_id ON books(title, book_id);
+CREATE INDEX idx_books_search ON books USING gin (search_vector);
 CREATE INDEX idx_books_isbn ON books(isbn);
 CREATE INDEX idx_books_publisher ON books(publisher_id);
 CREATE INDEX idx_books_series ON books(series_id);
 CREATE INDEX idx_books_status ON books(status);
 CREATE INDEX idx_authors_name ON authors(last_name, first_name);
-CREATE INDEX idx_reviews_book ON reviews(book_id);
-CREATE INDEX idx_reviews_reader ON reviews(reader_id);
+CREATE INDEX idx_authors_search_name ON authors USING gin (search_name gin_trgm_ops);
+CREATE INDEX idx_authors_search_name_prefix ON authors(search_name text_pattern_ops);
+CREATE INDEX idx_reviews_book ON reviews(book_id, review_date DESC, review_id DESC);
+CREATE INDEX idx_reviews_reader ON reviews(reader_id, review_date DESC, review_id DESC);
 CREATE INDEX idx_reviews_rating ON reviews(rating);
 
+-- Изображения уже сжаты: EXTERNAL хранит их в TOAST без сжатия, и substring()
+-- при потоковой отдаче читает только нужные куски
+ALTER TABLE books ALTER COLUMN cover_image SET STORAGE EXTERNAL;
+ALTER TABLE authors ALTER COLUMN photo SET STORAGE EXTERNAL;
+ALTER TABLE readers ALTER COLUMN avatar SET STORAGE EXTERNAL;
+
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -138,6 +198,160 @@ $$ language 'plpgsql';
 CREATE TRIGGER update_books_updated_at BEFORE UPDATE ON books
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Агрегаты оценок книги поддерживаются триггером на reviews: каждая вставка,
+-- изменение оценки или удаление отзыва меняет одну строку book_rating_stats
+CREATE OR REPLACE FUNCTION apply_book_rating(p_book_id INTEGER, p_rating INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_delta > 0 THEN
+        INSERT INTO book_rating_stats AS s
+            (book_id, rating_sum, review_count, rating_1, rating_2, rating_3, rating_4, rating_5)
+        VALUES (
+            p_book_id, p_rating, 1,
+            (p_rating = 1)::int, (p_rating = 2)::int, (p_rating = 3)::int,
+            (p_rating = 4)::int, (p_rating = 5)::int
+        )
+        ON CONFLICT (book_id) DO UPDATE SET
+            rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+            review_count = s.review_count + 1,
+            rating_1 = s.rating_1 + EXCLUDED.rating_1,
+            rating_2 = s.rating_2 + EXCLUDED.rating_2,
+            rating_3 = s.rating_3 + EXCLUDED.rating_3,
+            rating_4 = s.rating_4 + EXCLUDED.rating_4,
+            rating_5 = s.rating_5 + EXCLUDED.rating_5;
+    ELSE
+        -- Только UPDATE: при каскадном удалении книги её строка уже удалена
+        UPDATE book_rating_stats SET
+            rating_sum = rating_sum - p_rating,
+            review_count = review_count - 1,
+            rating_1 = rating_1 - (p_rating = 1)::int,
+            rating_2 = rating_2 - (p_rating = 2)::int,
+            rating_3 = rating_3 - (p_rating = 3)::int,
+            rating_4 = rating_4 - (p_rating = 4)::int,
+            rating_5 = rating_5 - (p_rating = 5)::int
+        WHERE book_id = p_book_id;
+    END IF;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_book_rating_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.book_id = NEW.book_id AND OLD.rating = NEW.rating THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_book_rating(OLD.book_id, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_book_rating(NEW.book_id, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER update_reviews_rating_stats
+    AFTER INSERT OR DELETE OR UPDATE OF book_id, rating ON reviews
+    FOR EACH ROW EXECUTE FUNCTION update_book_rating_stats();
+
+-- Дневные корзины прочитанного (по end_date отзыва) для графиков прогресса чтения:
+-- отдельно по читателю и по всей библиотеке. Поддерживаются триггерами на reviews и books
+CREATE OR REPLACE FUNCTION apply_reading_progress(p_reader_id INTEGER, p_book_id INTEGER, p_day DATE,
+                                                  p_rating INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_pages INTEGER;
+BEGIN
+    IF p_day IS NULL THEN
+        RETURN;
+    END IF;
+    SELECT COALESCE(pages_count, 0) INTO v_pages FROM books WHERE book_id = p_book_id;
+    v_pages := COALESCE(v_pages, 0);
+
+    INSERT INTO reading_progress_daily AS p (reader_id, day, books_read, pages_read, rating_sum)
+    VALUES (p_reader_id, p_day, p_delta, v_pages * p_delta, p_rating * p_delta)
+    ON CONFLICT (reader_id, day) DO UPDATE SET
+        books_read = p.books_read + EXCLUDED.books_read,
+        pages_read = p.pages_read + EXCLUDED.pages_read,
+        rating_sum = p.rating_sum + EXCLUDED.rating_sum;
+
+    INSERT INTO reading_progress_daily_global AS p (day, books_read, pages_read, rating_sum)
+    VALUES (p_day, p_delta, v_pages * p_delta, p_rating * p_delta)
+    ON CONFLICT (day) DO UPDATE SET
+        books_read = p.books_read + EXCLUDED.books_read,
+        pages_read = p.pages_read + EXCLUDED.pages_read,
+        rating_sum = p.rating_sum + EXCLUDED.rating_sum;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_reading_progress()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.reader_id = NEW.reader_id AND OLD.book_id = NEW.book_id
+            AND OLD.end_date IS NOT DISTINCT FROM NEW.end_date AND OLD.rating = NEW.rating THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_reading_progress(OLD.reader_id, OLD.book_id, OLD.end_date, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_reading_progress(NEW.reader_id, NEW.book_id, NEW.end_date, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER update_reviews_reading_progress
+    AFTER INSERT OR DELETE OR UPDATE OF reader_id, book_id, end_date, rating ON reviews
+    FOR EACH ROW EXECUTE FUNCTION update_reading_progress();
+
+-- Изменение числа страниц книги переносится на все корзины, где она учтена
+CREATE OR REPLACE FUNCTION update_reading_progress_pages()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF COALESCE(OLD.pages_count, 0) = COALESCE(NEW.pages_count, 0) THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE reading_progress_daily p
+    SET pages_read = p.pages_read + d.books * (COALESCE(NEW.pages_count, 0) - COALESCE(OLD.pages_count, 0))
+    FROM (
+        SELECT reader_id, end_date as day, COUNT(*) as books
+        FROM reviews
+        WHERE book_id = NEW.book_id AND end_date IS NOT NULL
+        GROUP BY reader_id, end_date
+    ) d
+    WHERE p.reader_id = d.reader_id AND p.day = d.day;
+
+    UPDATE reading_progress_daily_global p
+    SET pages_read = p.pages_read + d.books * (COALESCE(NEW.pages_count, 0) - COALESCE(OLD.pages_count, 0))
+    FROM (
+        SELECT end_date as day, COUNT(*) as books
+        FROM reviews
+        WHERE book_id = NEW.book_id AND end_date IS NOT NULL
+        GROUP BY end_date
+    ) d
+    WHERE p.day = d.day;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER update_books_reading_progress AFTER UPDATE OF pages_count ON books
+    FOR EACH ROW EXECUTE FUNCTION update_reading_progress_pages();
+
+-- Отзывы удаляются до самой книги, а не каскадом после неё: триггер reviews
+-- должен еще видеть pages_count удаляемой книги
+CREATE OR REPLACE FUNCTION delete_book_reviews()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM reviews WHERE book_id = OLD.book_id;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER delete_books_reviews BEFORE DELETE ON books
+    FOR EACH ROW EXECUTE FUNCTION delete_book_reviews();
+
 CREATE VIEW v_books_full AS
 SELECT
     b.book_id,
@@ -156,13 +370,50 @@ SELECT
     b.series_number,
     p.publisher_name,
     s.series_name,
-    COALESCE(AVG(r.rating), 0) as avg_rating,
-    COUNT(DISTINCT r.review_id) as review_count
+    COALESCE(rs.rating_sum::numeric / NULLIF(rs.review_count, 0), 0) as avg_rating,
+    COALESCE(rs.review_count, 0)::bigint as review_count
 FROM books b
 LEFT JOIN publishers p ON b.publisher_id = p.publisher_id
 LEFT JOIN series s ON b.series_id = s.series_id
-LEFT JOIN reviews r ON b.book_id = r.book_id
-GROUP BY b.book_id, p.publisher_name, s.series_name;
+LEFT JOIN book_rating_stats rs ON b.book_id = rs.book_id;
+
+-- Сводка для /api/books/statistics/summary. Пересчитывается приложением по
+-- расписанию (REFRESH ... CONCURRENTLY требует уникального индекса)
+CREATE MATERIALIZED VIEW library_summary AS
+SELECT
+    1 as summary_id,
+    (SELECT COUNT(*) FROM books) as total_books,
+    (
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('status', status, 'count', count) ORDER BY count DESC), '[]')
+        FROM (SELECT status, COUNT(*) as count FROM books GROUP BY status) s
+    ) as books_by_status,
+    (
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('genre_name', genre_name, 'count', count) ORDER BY count DESC), '[]')
+        FROM (
+            SELECT g.genre_name, COUNT(DISTINCT bg.book_id) as count
+            FROM genres g
+            JOIN books_genres bg ON g.genre_id = bg.genre_id
+            GROUP BY g.genre_id, g.genre_name
+            ORDER BY count DESC
+            LIMIT 10
+        ) tg
+    ) as top_genres,
+    (
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('author_name', author_name, 'count', count) ORDER BY count DESC), '[]')
+        FROM (
+            SELECT CONCAT(a.first_name, ' ', a.last_name) as author_name, COUNT(DISTINCT ba.book_id) as count
+            FROM authors a
+            JOIN books_authors ba ON a.author_id = ba.author_id
+            GROUP BY a.author_id, author_name
+            ORDER BY count DESC
+            LIMIT 10
+        ) ta
+    ) as top_authors,
+    (SELECT SUM(rating_sum)::numeric / NULLIF(SUM(review_count), 0) FROM book_rating_stats) as average_rating,
+    (SELECT COALESCE(SUM(review_count), 0) FROM book_rating_stats) as total_reviews,
+    CURRENT_TIMESTAMP as refreshed_at;
+
+CREATE UNIQUE INDEX idx_library_summary ON library_summary(summary_id);
 
 INSERT INTO genres (genre_name, description) VALUES
 ('Художественная литература', 'Произведения, созданные воображением автора'),
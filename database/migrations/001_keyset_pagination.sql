@@ -0,0 +1,10 @@
+-- Индексы под keyset-пагинацию списков (после init.sql ранних версий).
+-- Новые установки получают их из init.sql.
+
+CREATE INDEX IF NOT EXISTS idx_books_title_id ON books(title, book_id);
+
+DROP INDEX IF EXISTS idx_reviews_book;
+CREATE INDEX idx_reviews_book ON reviews(book_id, review_date DESC, review_id DESC);
+
+DROP INDEX IF EXISTS idx_reviews_reader;
+CREATE INDEX idx_reviews_reader ON reviews(reader_id, review_date DESC, review_id DESC);
@@ -0,0 +1,11 @@
+-- Поддерживаемый Postgres tsvector для полнотекстового поиска книг.
+-- Добавление STORED-колонки переписывает таблицу books.
+
+ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('simple', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('russian', COALESCE(description, '')), 'B') ||
+    setweight(to_tsvector('simple', COALESCE(description, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_books_search ON books USING gin (search_vector);
@@ -0,0 +1,25 @@
+-- Метаданные изображений для потоковой отдачи с ETag/Range и миниатюры.
+-- SET STORAGE влияет только на новые значения; существующие изображения
+-- нужно перезагрузить через API, чтобы у них появились хэш и миниатюра.
+
+ALTER TABLE books
+    ADD COLUMN IF NOT EXISTS cover_image_sha256 CHAR(64),
+    ADD COLUMN IF NOT EXISTS cover_image_size INTEGER,
+    ADD COLUMN IF NOT EXISTS cover_image_content_type VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS cover_image_thumbnail BYTEA;
+
+ALTER TABLE authors
+    ADD COLUMN IF NOT EXISTS photo_sha256 CHAR(64),
+    ADD COLUMN IF NOT EXISTS photo_size INTEGER,
+    ADD COLUMN IF NOT EXISTS photo_content_type VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS photo_thumbnail BYTEA;
+
+ALTER TABLE readers
+    ADD COLUMN IF NOT EXISTS avatar_sha256 CHAR(64),
+    ADD COLUMN IF NOT EXISTS avatar_size INTEGER,
+    ADD COLUMN IF NOT EXISTS avatar_content_type VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS avatar_thumbnail BYTEA;
+
+ALTER TABLE books ALTER COLUMN cover_image SET STORAGE EXTERNAL;
+ALTER TABLE authors ALTER COLUMN photo SET STORAGE EXTERNAL;
+ALTER TABLE readers ALTER COLUMN avatar SET STORAGE EXTERNAL;
@@ -0,0 +1,115 @@
+-- Денормализованные агрегаты оценок книг вместо AVG/COUNT по всем отзывам
+-- при каждом чтении. Заполнение выполняется под блокировкой reviews, чтобы
+-- отзывы, записанные во время миграции, не потерялись между backfill и триггером.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS book_rating_stats (
+    book_id INTEGER PRIMARY KEY REFERENCES books(book_id) ON DELETE CASCADE,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0
+);
+
+LOCK TABLE reviews IN SHARE MODE;
+
+CREATE OR REPLACE FUNCTION apply_book_rating(p_book_id INTEGER, p_rating INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_delta > 0 THEN
+        INSERT INTO book_rating_stats AS s
+            (book_id, rating_sum, review_count, rating_1, rating_2, rating_3, rating_4, rating_5)
+        VALUES (
+            p_book_id, p_rating, 1,
+            (p_rating = 1)::int, (p_rating = 2)::int, (p_rating = 3)::int,
+            (p_rating = 4)::int, (p_rating = 5)::int
+        )
+        ON CONFLICT (book_id) DO UPDATE SET
+            rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+            review_count = s.review_count + 1,
+            rating_1 = s.rating_1 + EXCLUDED.rating_1,
+            rating_2 = s.rating_2 + EXCLUDED.rating_2,
+            rating_3 = s.rating_3 + EXCLUDED.rating_3,
+            rating_4 = s.rating_4 + EXCLUDED.rating_4,
+            rating_5 = s.rating_5 + EXCLUDED.rating_5;
+    ELSE
+        -- Только UPDATE: при каскадном удалении книги её строка уже удалена
+        UPDATE book_rating_stats SET
+            rating_sum = rating_sum - p_rating,
+            review_count = review_count - 1,
+            rating_1 = rating_1 - (p_rating = 1)::int,
+            rating_2 = rating_2 - (p_rating = 2)::int,
+            rating_3 = rating_3 - (p_rating = 3)::int,
+            rating_4 = rating_4 - (p_rating = 4)::int,
+            rating_5 = rating_5 - (p_rating = 5)::int
+        WHERE book_id = p_book_id;
+    END IF;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_book_rating_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.book_id = NEW.book_id AND OLD.rating = NEW.rating THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_book_rating(OLD.book_id, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_book_rating(NEW.book_id, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_reviews_rating_stats ON reviews;
+CREATE TRIGGER update_reviews_rating_stats
+    AFTER INSERT OR DELETE OR UPDATE OF book_id, rating ON reviews
+    FOR EACH ROW EXECUTE FUNCTION update_book_rating_stats();
+
+DELETE FROM book_rating_stats;
+INSERT INTO book_rating_stats (book_id, rating_sum, review_count, rating_1, rating_2, rating_3, rating_4, rating_5)
+SELECT
+    book_id,
+    SUM(rating),
+    COUNT(*),
+    COUNT(*) FILTER (WHERE rating = 1),
+    COUNT(*) FILTER (WHERE rating = 2),
+    COUNT(*) FILTER (WHERE rating = 3),
+    COUNT(*) FILTER (WHERE rating = 4),
+    COUNT(*) FILTER (WHERE rating = 5)
+FROM reviews
+GROUP BY book_id;
+
+DROP VIEW IF EXISTS v_books_full;
+CREATE VIEW v_books_full AS
+SELECT
+    b.book_id,
+    b.title,
+    b.isbn,
+    b.publication_year,
+    b.pages_count,
+    b.language,
+    b.description,
+    b.storage_location,
+    b.acquisition_date,
+    b.price,
+    b.condition,
+    b.format,
+    b.status,
+    b.series_number,
+    p.publisher_name,
+    s.series_name,
+    COALESCE(rs.rating_sum::numeric / NULLIF(rs.review_count, 0), 0) as avg_rating,
+    COALESCE(rs.review_count, 0)::bigint as review_count
+FROM books b
+LEFT JOIN publishers p ON b.publisher_id = p.publisher_id
+LEFT JOIN series s ON b.series_id = s.series_id
+LEFT JOIN book_rating_stats rs ON b.book_id = rs.book_id;
+
+COMMIT;
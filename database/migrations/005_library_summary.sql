@@ -0,0 +1,42 @@
+-- Материализованная сводка библиотеки вместо пяти агрегатов по всем таблицам
+-- на каждый запрос. Требует 004_book_rating_stats.sql.
+
+DROP MATERIALIZED VIEW IF EXISTS library_summary;
+
+-- Сводка для /api/books/statistics/summary. Пересчитывается приложением по
+-- расписанию (REFRESH ... CONCURRENTLY требует уникального индекса)
+CREATE MATERIALIZED VIEW library_summary AS
+SELECT
+    1 as summary_id,
+    (SELECT COUNT(*) FROM books) as total_books,
+    (
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('status', status, 'count', count) ORDER BY count DESC), '[]')
+        FROM (SELECT status, COUNT(*) as count FROM books GROUP BY status) s
+    ) as books_by_status,
+    (
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('genre_name', genre_name, 'count', count) ORDER BY count DESC), '[]')
+        FROM (
+            SELECT g.genre_name, COUNT(DISTINCT bg.book_id) as count
+            FROM genres g
+            JOIN books_genres bg ON g.genre_id = bg.genre_id
+            GROUP BY g.genre_id, g.genre_name
+            ORDER BY count DESC
+            LIMIT 10
+        ) tg
+    ) as top_genres,
+    (
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('author_name', author_name, 'count', count) ORDER BY count DESC), '[]')
+        FROM (
+            SELECT CONCAT(a.first_name, ' ', a.last_name) as author_name, COUNT(DISTINCT ba.book_id) as count
+            FROM authors a
+            JOIN books_authors ba ON a.author_id = ba.author_id
+            GROUP BY a.author_id, author_name
+            ORDER BY count DESC
+            LIMIT 10
+        ) ta
+    ) as top_authors,
+    (SELECT SUM(rating_sum)::numeric / NULLIF(SUM(review_count), 0) FROM book_rating_stats) as average_rating,
+    (SELECT COALESCE(SUM(review_count), 0) FROM book_rating_stats) as total_reviews,
+    CURRENT_TIMESTAMP as refreshed_at;
+
+CREATE UNIQUE INDEX idx_library_summary ON library_summary(summary_id);
@@ -0,0 +1,139 @@
+-- Дневные корзины прогресса чтения вместо агрегации всех отзывов по EXTRACT(YEAR/MONTH)
+-- на каждый запрос. Заполнение выполняется под блокировкой reviews и books.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS reading_progress_daily (
+    reader_id INTEGER NOT NULL REFERENCES readers(reader_id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    books_read INTEGER NOT NULL DEFAULT 0,
+    pages_read BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (reader_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS reading_progress_daily_global (
+    day DATE PRIMARY KEY,
+    books_read INTEGER NOT NULL DEFAULT 0,
+    pages_read BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0
+);
+
+LOCK TABLE reviews, books IN SHARE MODE;
+
+-- Дневные корзины прочитанного (по end_date отзыва) для графиков прогресса чтения:
+-- отдельно по читателю и по всей библиотеке. Поддерживаются триггерами на reviews и books
+CREATE OR REPLACE FUNCTION apply_reading_progress(p_reader_id INTEGER, p_book_id INTEGER, p_day DATE,
+                                                  p_rating INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_pages INTEGER;
+BEGIN
+    IF p_day IS NULL THEN
+        RETURN;
+    END IF;
+    SELECT COALESCE(pages_count, 0) INTO v_pages FROM books WHERE book_id = p_book_id;
+    v_pages := COALESCE(v_pages, 0);
+
+    INSERT INTO reading_progress_daily AS p (reader_id, day, books_read, pages_read, rating_sum)
+    VALUES (p_reader_id, p_day, p_delta, v_pages * p_delta, p_rating * p_delta)
+    ON CONFLICT (reader_id, day) DO UPDATE SET
+        books_read = p.books_read + EXCLUDED.books_read,
+        pages_read = p.pages_read + EXCLUDED.pages_read,
+        rating_sum = p.rating_sum + EXCLUDED.rating_sum;
+
+    INSERT INTO reading_progress_daily_global AS p (day, books_read, pages_read, rating_sum)
+    VALUES (p_day, p_delta, v_pages * p_delta, p_rating * p_delta)
+    ON CONFLICT (day) DO UPDATE SET
+        books_read = p.books_read + EXCLUDED.books_read,
+        pages_read = p.pages_read + EXCLUDED.pages_read,
+        rating_sum = p.rating_sum + EXCLUDED.rating_sum;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION update_reading_progress()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.reader_id = NEW.reader_id AND OLD.book_id = NEW.book_id
+            AND OLD.end_date IS NOT DISTINCT FROM NEW.end_date AND OLD.rating = NEW.rating THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_reading_progress(OLD.reader_id, OLD.book_id, OLD.end_date, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_reading_progress(NEW.reader_id, NEW.book_id, NEW.end_date, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_reviews_reading_progress ON reviews;
+CREATE TRIGGER update_reviews_reading_progress
+    AFTER INSERT OR DELETE OR UPDATE OF reader_id, book_id, end_date, rating ON reviews
+    FOR EACH ROW EXECUTE FUNCTION update_reading_progress();
+
+-- Изменение числа страниц книги переносится на все корзины, где она учтена
+CREATE OR REPLACE FUNCTION update_reading_progress_pages()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF COALESCE(OLD.pages_count, 0) = COALESCE(NEW.pages_count, 0) THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE reading_progress_daily p
+    SET pages_read = p.pages_read + d.books * (COALESCE(NEW.pages_count, 0) - COALESCE(OLD.pages_count, 0))
+    FROM (
+        SELECT reader_id, end_date as day, COUNT(*) as books
+        FROM reviews
+        WHERE book_id = NEW.book_id AND end_date IS NOT NULL
+        GROUP BY reader_id, end_date
+    ) d
+    WHERE p.reader_id = d.reader_id AND p.day = d.day;
+
+    UPDATE reading_progress_daily_global p
+    SET pages_read = p.pages_read + d.books * (COALESCE(NEW.pages_count, 0) - COALESCE(OLD.pages_count, 0))
+    FROM (
+        SELECT end_date as day, COUNT(*) as books
+        FROM reviews
+        WHERE book_id = NEW.book_id AND end_date IS NOT NULL
+        GROUP BY end_date
+    ) d
+    WHERE p.day = d.day;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_books_reading_progress ON books;
+CREATE TRIGGER update_books_reading_progress AFTER UPDATE OF pages_count ON books
+    FOR EACH ROW EXECUTE FUNCTION update_reading_progress_pages();
+
+-- Отзывы удаляются до самой книги, а не каскадом после неё: триггер reviews
+-- должен еще видеть pages_count удаляемой книги
+CREATE OR REPLACE FUNCTION delete_book_reviews()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM reviews WHERE book_id = OLD.book_id;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS delete_books_reviews ON books;
+CREATE TRIGGER delete_books_reviews BEFORE DELETE ON books
+    FOR EACH ROW EXECUTE FUNCTION delete_book_reviews();
+
+DELETE FROM reading_progress_daily;
+INSERT INTO reading_progress_daily (reader_id, day, books_read, pages_read, rating_sum)
+SELECT r.reader_id, r.end_date, COUNT(*), COALESCE(SUM(b.pages_count), 0), SUM(r.rating)
+FROM reviews r
+JOIN books b ON r.book_id = b.book_id
+WHERE r.end_date IS NOT NULL
+GROUP BY r.reader_id, r.end_date;
+
+DELETE FROM reading_progress_daily_global;
+INSERT INTO reading_progress_daily_global (day, books_read, pages_read, rating_sum)
+SELECT day, SUM(books_read), SUM(pages_read), SUM(rating_sum)
+FROM reading_progress_daily
+GROUP BY day;
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Поиск авторов по нормализованной строке "фамилия имя псевдоним" (нижний регистр,
+-- ё -> е, одиночные пробелы): trigram GIN для поиска по подстроке и похожести,
+-- btree text_pattern_ops для автодополнения по префиксу.
+-- Добавление STORED-колонки переписывает таблицу authors.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE authors ADD COLUMN IF NOT EXISTS
+search_name TEXT GENERATED ALWAYS AS (
+        replace(lower(regexp_replace(trim(
+            COALESCE(last_name, '') || ' ' || COALESCE(first_name, '') || ' ' || COALESCE(pseudonym, '')
+        ), '\s+', ' ', 'g')), 'ё', 'е')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_authors_search_name ON authors USING gin (search_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_authors_search_name_prefix ON authors(search_name text_pattern_ops);
@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Модули приложения импортируют друг друга без пакета (from config import settings),
+# как при запуске из app/; benchmarks - пакет в корне репозитория
+sys.path.insert(0, str(ROOT / "app"))
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,90 @@
+import pytest
+from benchmarks.compare import comparability_warnings, compare, format_comparison
+
+
+def endpoint(p95_ms=10.0, throughput=100.0, error_rate=0.0):
+    return {"p95_ms": p95_ms, "throughput": throughput, "error_rate": error_rate}
+
+
+def run(meta=None, **endpoints):
+    return {"meta": meta or {"concurrency": 32, "dataset": {"books": 1000}, "mix": {"book_detail": 1.0},
+                             "bypass_cache": True},
+            "endpoints": endpoints}
+
+
+def single(current, base, **options):
+    [row] = compare(run(book_detail=current), run(book_detail=base), **options)
+    return row
+
+
+def test_unchanged_run_is_ok():
+    row = single(endpoint(), endpoint())
+    assert row["status"] == "ok"
+    assert row["problems"] == []
+    assert row["p95_change"] == 0.0 and row["throughput_change"] == 0.0
+
+
+def test_p95_growth_within_tolerance_is_ok():
+    assert single(endpoint(p95_ms=11.4), endpoint(p95_ms=10.0))["status"] == "ok"
+
+
+def test_p95_growth_beyond_tolerance_is_regression():
+    row = single(endpoint(p95_ms=20.0), endpoint(p95_ms=10.0))
+    assert row["status"] == "regression"
+    assert row["problems"] == ["p95 10.00 -> 20.00 ms"]
+    assert row["p95_change"] == 1.0
+
+
+def test_small_absolute_p95_growth_is_noise():
+    # +50%, но всего на 0.5 мс - меньше min_delta_ms
+    assert single(endpoint(p95_ms=1.5), endpoint(p95_ms=1.0))["status"] == "ok"
+    assert single(endpoint(p95_ms=1.5), endpoint(p95_ms=1.0), min_delta_ms=0.1)["status"] == "regression"
+
+
+def test_throughput_drop_is_regression():
+    row = single(endpoint(throughput=80.0), endpoint(throughput=100.0))
+    assert row["status"] == "regression"
+    assert row["problems"] == ["throughput 100.0 -> 80.0 rps"]
+    assert row["throughput_change"] == -0.2
+    assert single(endpoint(throughput=90.0), endpoint(throughput=100.0))["status"] == "ok"
+
+
+def test_error_rate_growth_is_regression():
+    assert single(endpoint(error_rate=0.005), endpoint())["status"] == "ok"
+    row = single(endpoint(error_rate=0.05), endpoint(error_rate=0.01))
+    assert row["status"] == "regression"
+    assert row["problems"] == ["error rate 1.00% -> 5.00%"]
+
+
+def test_tolerance_is_configurable():
+    assert single(endpoint(p95_ms=13.0), endpoint(p95_ms=10.0), tolerance=0.5)["status"] == "ok"
+    assert single(endpoint(p95_ms=13.0), endpoint(p95_ms=10.0), tolerance=0.1)["status"] == "regression"
+
+
+def test_workload_missing_from_baseline_is_new():
+    rows = compare(run(book_detail=endpoint(), login=endpoint()), run(book_detail=endpoint()))
+    assert [(row["workload"], row["status"]) for row in rows] == [("book_detail", "ok"), ("login", "new")]
+
+
+def test_zero_baseline_change_is_zero():
+    assert single(endpoint(throughput=5.0), endpoint(throughput=0.0))["throughput_change"] == 0.0
+
+
+def test_comparability_warnings():
+    assert comparability_warnings(run(), run()) == []
+    other = run(meta={"concurrency": 64, "dataset": {"books": 1000}, "mix": {"book_detail": 1.0},
+                      "bypass_cache": True})
+    assert comparability_warnings(other, run()) == ["concurrency differs from baseline: 64 vs 32"]
+
+
+def test_format_comparison():
+    rows = compare(run(book_detail=endpoint(p95_ms=20.0), login=endpoint()), run(book_detail=endpoint()))
+    lines = format_comparison(rows).splitlines()
+    assert lines[0].split() == ["workload", "status", "p95", "rps", "details"]
+    assert lines[1].split()[:4] == ["book_detail", "regression", "+100.0%", "+0.0%"]
+    assert lines[2].split() == ["login", "new", "-", "-"]
+
+
+@pytest.mark.parametrize("tolerance", [0.0, 0.15])
+def test_identical_runs_never_regress(tolerance):
+    assert single(endpoint(), endpoint(), tolerance=tolerance)["status"] == "ok"
@@ -0,0 +1,27 @@
+from benchmarks.runner import percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 11)]
+    assert percentile(values, 50) == 5.0
+    assert percentile(values, 95) == 10.0
+    assert percentile(values, 10) == 1.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([], 95) == 0.0
+
+
+def test_summarize():
+    stats = summarize([0.003, 0.001, 0.002, 0.004], errors=1, elapsed=2.0)
+    assert stats["requests"] == 4
+    assert stats["error_rate"] == 0.25
+    assert stats["throughput"] == 2.0
+    assert stats["mean_ms"] == 2.5
+    assert stats["p50_ms"] == 2.0
+    assert stats["p95_ms"] == 4.0
+    assert stats["max_ms"] == 4.0
+
+
+def test_summarize_without_requests():
+    stats = summarize([], errors=0, elapsed=1.0)
+    assert stats["requests"] == 0
+    assert stats["throughput"] == 0.0 and stats["p99_ms"] == 0.0
@@ -0,0 +1,80 @@
+from datetime import datetime
+import pytest
+from genre_tree import GenreTree
+
+
+def genre(genre_id, name, parent=None):
+    return {"genre_id": genre_id, "genre_name": name, "description": None,
+            "parent_genre_id": parent, "created_at": datetime(2024, 1, 1)}
+
+
+@pytest.fixture
+def tree():
+    # Художественная (1) -> Фэнтези (2) -> Городское фэнтези (4)
+    #                    -> Детектив (3)
+    # Научная (5)
+    # 6 <-> 7 - цикл без корня
+    return GenreTree([
+        genre(5, "Научная"),
+        genre(4, "Городское фэнтези", 2),
+        genre(2, "Фэнтези", 1),
+        genre(3, "Детектив", 1),
+        genre(1, "Художественная"),
+        genre(6, "Цикл А", 7),
+        genre(7, "Цикл Б", 6),
+    ])
+
+
+def test_euler_tour_order_follows_names(tree):
+    # Корни и дети обходятся по названию
+    assert tree.order == [5, 1, 3, 2, 4]
+    assert tree.tin == {5: 0, 1: 1, 3: 2, 2: 3, 4: 4}
+    assert tree.tout == {5: 0, 1: 4, 3: 2, 2: 4, 4: 4}
+
+
+def test_subtree_bounds_contain_exactly_descendants(tree):
+    for ancestor in tree.order:
+        inside = {g for g in tree.order if tree.tin[ancestor] <= tree.tin[g] <= tree.tout[ancestor]}
+        assert inside == set(tree.subtree_ids(ancestor))
+
+
+@pytest.mark.parametrize("genre_id, expected", [
+    (1, [1, 3, 2, 4]),
+    (2, [2, 4]),
+    (4, [4]),
+    (5, [5]),
+])
+def test_subtree_ids(tree, genre_id, expected):
+    assert tree.subtree_ids(genre_id) == expected
+
+
+def test_unknown_genre_is_its_own_subtree(tree):
+    assert tree.subtree_ids(99) == [99]
+
+
+def test_cycles_are_left_out(tree):
+    assert 6 not in tree.tin and 7 not in tree.tin
+    assert tree.subtree_ids(6) == [6]
+    assert not tree.is_descendant(6, 7)
+
+
+def test_is_descendant(tree):
+    assert tree.is_descendant(4, 1)
+    assert tree.is_descendant(4, 2)
+    assert tree.is_descendant(2, 2)
+    assert not tree.is_descendant(1, 4)
+    assert not tree.is_descendant(3, 2)
+    assert not tree.is_descendant(4, 5)
+
+
+def test_hierarchy_by_level_then_name(tree):
+    hierarchy = tree.hierarchy()
+    assert [(g["genre_id"], g["level"]) for g in hierarchy] == [(5, 0), (1, 0), (3, 1), (2, 1), (4, 2)]
+    assert hierarchy[0]["genre_name"] == "Научная"
+
+
+def test_empty_tree():
+    tree = GenreTree([])
+    assert tree.order == []
+    assert tree.hierarchy() == []
+    assert tree.subtree_ids(1) == [1]
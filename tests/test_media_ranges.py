@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+from media import parse_range
+
+SIZE = 1000
+
+
+def test_no_header_means_whole_content():
+    assert parse_range(None, SIZE) is None
+    assert parse_range("", SIZE) is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-100", (100, 100)),
+    (" bytes=0-999 ", (0, 999)),
+    # Конец за пределами содержимого обрезается до последнего байта
+    ("bytes=900-5000", (900, 999)),
+])
+def test_closed_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+def test_open_range_runs_to_the_end():
+    assert parse_range("bytes=500-", SIZE) == (500, 999)
+    assert parse_range("bytes=0-", SIZE) == (0, 999)
+
+
+def test_suffix_range_takes_last_bytes():
+    assert parse_range("bytes=-100", SIZE) == (900, 999)
+    assert parse_range("bytes=-1", SIZE) == (999, 999)
+    # Суффикс длиннее содержимого - все содержимое
+    assert parse_range("bytes=-5000", SIZE) == (0, 999)
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=1000-1100",
+    "bytes=500-100",
+    "bytes=-0",
+])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range(header, SIZE)
+    assert error.value.status_code == 416
+    assert error.value.headers == {"Content-Range": f"bytes */{SIZE}"}
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=-",
+    "bytes=0-1,5-6",
+    "items=0-10",
+    "bytes=a-b",
+])
+def test_unsupported_range(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range(header, SIZE)
+    assert error.value.status_code == 416
+    assert error.value.headers == {"Content-Range": f"bytes */{SIZE}"}
+
+
+def test_empty_content_cannot_be_ranged():
+    with pytest.raises(HTTPException) as error:
+        parse_range("bytes=-10", 0)
+    assert error.value.status_code == 416
@@ -0,0 +1,71 @@
+import base64
+import pytest
+from pagination import InvalidCursorError, Page, decode_cursor, encode_cursor, keyset_condition
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(["Война и мир", 42])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == ["Война и мир", 42]
+
+
+def test_cursor_serializes_dates_as_strings():
+    from datetime import date
+    assert decode_cursor(encode_cursor([date(2024, 1, 31), 7]), 2) == ["2024-01-31", 7]
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    "not-a-cursor",
+    base64.urlsafe_b64encode(b"\xff\xfe\x00").decode(),
+    base64.urlsafe_b64encode(b"[1, 2").decode(),
+])
+def test_garbled_cursor_is_rejected(cursor):
+    # main.py отвечает на InvalidCursorError статусом 400
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, 2)
+
+
+@pytest.mark.parametrize("cursor", [
+    encode_cursor([42]),
+    encode_cursor([1, 2, 3]),
+    base64.urlsafe_b64encode(b'{"book_id": 42}').decode(),
+    base64.urlsafe_b64encode(b'"42"').decode(),
+])
+def test_cursor_of_another_listing_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, 2)
+
+
+def test_keyset_condition_without_cursor():
+    assert keyset_condition(None, ("book_id",)) == ("TRUE", [])
+    assert keyset_condition("", ("book_id",)) == ("TRUE", [])
+
+
+def test_keyset_condition_ascending():
+    condition, params = keyset_condition(encode_cursor(["Анна Каренина", 5]), ("title", "book_id"), alias="b")
+    assert condition == "(b.title, b.book_id) > (%s, %s)"
+    assert params == ["Анна Каренина", 5]
+
+
+def test_keyset_condition_descending():
+    condition, params = keyset_condition(encode_cursor([0.5, 9]), ("rank", "book_id"), descending=True)
+    assert condition == "(rank, book_id) < (%s, %s)"
+    assert params == [0.5, 9]
+
+
+def test_keyset_condition_rejects_tampered_cursor():
+    with pytest.raises(InvalidCursorError):
+        keyset_condition(encode_cursor([5]), ("title", "book_id"))
+
+
+def test_page_points_to_last_row_of_full_page():
+    rows = [{"book_id": 1, "title": "А"}, {"book_id": 2, "title": "Б"}]
+    page = Page.from_rows(rows, 2, ("title", "book_id"))
+    assert page == rows
+    assert decode_cursor(page.next_cursor, 2) == ["Б", 2]
+
+
+def test_short_page_is_last():
+    assert Page.from_rows([{"book_id": 1}], 2, ("book_id",)).next_cursor is None
+    assert Page.from_rows([], 2, ("book_id",)).next_cursor is None
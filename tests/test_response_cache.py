@@ -0,0 +1,44 @@
+import pytest
+from response_cache import entity_tag, etag_matches, route_tags
+
+
+def test_detail_depends_on_its_entity_only():
+    assert route_tags("/api/books/5") == ("books:5", "books:*")
+    assert route_tags("/api/authors/7") == ("authors:7", "authors:*")
+    assert route_tags("/api/reviews/012") == ("reviews:12", "reviews:*")
+
+
+@pytest.mark.parametrize("path, table", [
+    ("/api/books", "books"),
+    ("/api/books/", "books"),
+    ("/api/books/batch", "books"),
+    ("/api/authors/7/books", "authors"),
+    ("/api/genres/hierarchy", "genres"),
+])
+def test_lists_depend_on_whole_tables(path, table):
+    tags = route_tags(path)
+    assert table in tags
+    assert not any(":" in tag for tag in tags)
+
+
+@pytest.mark.parametrize("path", [
+    "/api/books/statistics/summary",
+    "/api/reviews/statistics/reading-progress",
+    "/api/books/import",
+    "/api/readers/1",
+    "/health",
+])
+def test_uncached_paths(path):
+    assert route_tags(path) is None
+
+
+def test_entity_tag_matches_dependents_sql():
+    # CRUDBase.dependents собирает те же теги в SQL: 'books:' || book_id
+    assert entity_tag("books", 5) == "books:5"
+
+
+def test_etag_matches():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches(None, '"b"')
+    assert not etag_matches('"a"', '"b"')